@@ -1,27 +1,54 @@
 """FastAPI entrypoint for the Feel Forward backend."""
-from collections import defaultdict
+from contextlib import aclosing, asynccontextmanager
+import asyncio
+import json
+import os
 import time
-from typing import Callable
+from typing import Callable, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
 from models import (
     Phase0Request, Phase0Response,
     Phase1Request, Phase1Response,
     Phase2Request, Phase2Response,
     Phase3Request, Phase3Response,
+    Phase3BatchRequest, Phase3BatchResponse,
     Phase4Request, Phase4Response,
-    Reaction,
-)
-from strands.agent import (
-    FactorDiscoveryAgent,
-    PreferenceDetailAgent,
-    ScenarioBuilderAgent,
-    EmotionalReactionAgent,
-    InsightSynthesisAgent,
+    Journey, JourneyRequest,
+    Preference, Reaction, Scenario, SessionState,
 )
+from rate_limit import create_limiter
+from session_store import create_session_store, merge_preferences, merge_reactions, new_session_id
+from strands import metrics, tracing
+from strands.agent import AgentRegistry
+from strands.deadline import reset_deadline, set_deadline
+from strands.phase4 import context_stats
+from strands.pipeline import JourneyPipeline
+from strands.resilience import caller_stats
+from strands.structured import parse_stats
+from strands.utils import aclose_llm_clients
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracing.configure_tracing()
+    app.state.agents = AgentRegistry()
+    app.state.sessions = create_session_store()
+    evictor = asyncio.create_task(limiter.run_evictor())
+    yield
+    evictor.cancel()
+    await limiter.aclose()
+    await app.state.sessions.aclose()
+    if app.state.agents.prefetch:
+        await app.state.agents.prefetch.aclose()
+    # Release the pooled LLM connections on shutdown
+    await aclose_llm_clients()
+    tracing.shutdown_tracing()
+
 
 app = FastAPI(
     title="Feel Forward API",
@@ -29,6 +56,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -44,18 +72,139 @@ async def health() -> dict:
     """Return service status for health checks."""
     return {"status": "ok"}
 
+# ---- Latency budget --------------------------------------------------------
+# Default per-request budget, kept under the load balancer's 60 s idle timeout
+REQUEST_BUDGET_MS = int(os.getenv("REQUEST_BUDGET_MS", "25000"))
+
+def request_budget(header: Optional[str]) -> float:
+    """Seconds this request may take: ``X-Deadline-Ms`` if valid, capped by the default."""
+    try:
+        budget_ms = min(int(header), REQUEST_BUDGET_MS) if header else REQUEST_BUDGET_MS
+    except ValueError:
+        budget_ms = REQUEST_BUDGET_MS
+    return max(budget_ms, 0) / 1000
+
+@app.middleware("http")
+async def deadline_middleware(request: Request, call_next):
+    # Agents read the deadline from context to size their LLM timeouts
+    token = set_deadline(request_budget(request.headers.get("x-deadline-ms")))
+    try:
+        return await call_next(request)
+    finally:
+        reset_deadline(token)
+
 # ---- Rate limiting ---------------------------------------------------------
-REQUEST_LOG = defaultdict(list)
 RATE = 60
 WINDOW = 60
+limiter = create_limiter(RATE, WINDOW)
 
-def rate_limiter(request: Request) -> None:
-    ip = request.client.host
-    now = time.time()
-    REQUEST_LOG[ip] = [t for t in REQUEST_LOG[ip] if now - t < WINDOW]
-    if len(REQUEST_LOG[ip]) >= RATE:
+async def rate_limiter(request: Request) -> None:
+    with tracing.span("rate_limit") as span:
+        allowed = await limiter.ahit(request.client.host)
+        span.set_attribute("rate_limit.allowed", allowed)
+    if not allowed:
         raise HTTPException(status_code=429, detail="Rate limit exceeded")
-    REQUEST_LOG[ip].append(now)
+
+def get_agents(request: Request) -> AgentRegistry:
+    """Return the application-scoped agent registry."""
+    agents = getattr(request.app.state, "agents", None)
+    if agents is None:
+        # Lifespan did not run (e.g. a bare TestClient); build it on first use
+        agents = request.app.state.agents = AgentRegistry()
+    return agents
+
+def get_sessions(request: Request):
+    """Return the application-scoped session store."""
+    sessions = getattr(request.app.state, "sessions", None)
+    if sessions is None:
+        sessions = request.app.state.sessions = create_session_store()
+    return sessions
+
+# ---- Metrics ---------------------------------------------------------------
+async def metrics_middleware(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template so path parameters do not create new series
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - started, route, request.method, str(status))
+
+if metrics.METRICS_ENABLED:
+    app.middleware("http")(metrics_middleware)
+
+# ---- Tracing ---------------------------------------------------------------
+@app.middleware("http")
+async def tracing_middleware(request: Request, call_next):
+    # Named by path until routing has resolved the route template
+    with tracing.server_span(f"{request.method} {request.url.path}", request.headers,
+                             **{"http.method": request.method, "http.target": request.url.path}) as span:
+        response = await call_next(request)
+        route = getattr(request.scope.get("route"), "path", None)
+        if route:
+            span.update_name(f"{request.method} {route}")
+        span.set_attributes({"http.route": route or "unmatched", "http.status_code": response.status_code})
+        return response
+
+def scrape_families(agents: AgentRegistry) -> List[metrics.Family]:
+    """Read the counters kept by caches, callers and the limiter at scrape time."""
+    caches = {"phase0": agents.factors.cache, "phase0_semantic": agents.factors.semantic_cache,
+              "phase1": agents.preferences.cache}
+    cache_stats = {name: cache.stats() for name, cache in caches.items() if cache is not None}
+    callers = caller_stats()
+    parses = parse_stats()
+    limits = limiter.stats()
+    context = context_stats()
+    families = [
+        metrics.family("feelforward_cache_hits_total", "counter", "Response cache hits.",
+                       {name: s["hits"] for name, s in cache_stats.items()}, "cache"),
+        metrics.family("feelforward_cache_misses_total", "counter", "Response cache misses.",
+                       {name: s["misses"] for name, s in cache_stats.items()}, "cache"),
+        metrics.family("feelforward_llm_retries_total", "counter", "LLM attempts retried.",
+                       {name: s["retried"] for name, s in callers.items()}, "phase"),
+        metrics.family("feelforward_llm_failures_total", "counter", "LLM calls that failed after retries.",
+                       {name: s["failures"] for name, s in callers.items()}, "phase"),
+        metrics.family("feelforward_llm_breaker_open", "gauge", "1 while the phase's circuit breaker is not closed.",
+                       {name: int(s["breaker"] != "closed") for name, s in callers.items()}, "phase"),
+        metrics.family("feelforward_parse_failures_total", "counter", "LLM replies with nothing usable.",
+                       {name: s["failed"] for name, s in parses.items()}, "phase"),
+        metrics.family("feelforward_rate_limited_total", "counter", "Requests rejected by the rate limiter.",
+                       {limits["backend"]: limits["rejected"]}, "backend"),
+        metrics.family("feelforward_phase4_prompts_total", "counter", "Phase 4 prompts built, and how many were compacted.",
+                       {"built": context["prompts"], "compacted": context["compacted"]}, "kind"),
+        metrics.family("feelforward_phase4_tokens_saved_total", "counter",
+                       "Estimated prompt tokens saved by Phase 4 context budgeting.",
+                       {"phase4": context["tokens_saved"]}, "phase"),
+    ]
+    if agents.prefetch:
+        prefetch = agents.prefetch.stats()
+        families.append(metrics.family(
+            "feelforward_prefetch_items_total", "counter", "Phase 1 items prefetched and later used.",
+            {"prefetched": prefetch["items_prefetched"], "used": prefetch["items_used"]}, "kind"))
+        families.append(metrics.family(
+            "feelforward_prefetch_sessions_total", "counter", "Sessions prefetched, and skipped at the in-flight cap.",
+            {"started": prefetch["sessions"], "skipped": prefetch["skipped"]}, "kind"))
+    return families
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_endpoint(agents: AgentRegistry = Depends(get_agents)) -> PlainTextResponse:
+    """Expose the instruments in the Prometheus text format."""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(scrape_families(agents)),
+                             media_type="text/plain; version=0.0.4; charset=utf-8")
+
+async def load_session(sessions, session_id: Optional[str]) -> Optional[SessionState]:
+    """Fetch the session a request refers to; 404 if it has expired or never existed."""
+    if session_id is None:
+        return None
+    session = await sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
 
 # ---- Error handling --------------------------------------------------------
 @app.exception_handler(HTTPException)
@@ -67,42 +216,203 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
     return JSONResponse(status_code=500, content={"error": True, "errorMessage": "Internal server error"})
 
 
+def _sse(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _streaming_response(body, media_type: str) -> StreamingResponse:
+    """Stream ``body``, closing it afterwards even when the client disconnected mid-stream.
+
+    Starlette stops iterating a disconnected body without closing it, which
+    would leave the LLM stream beneath it open and counted as in flight.
+    """
+    return StreamingResponse(body, media_type=media_type, headers=SSE_HEADERS, background=BackgroundTask(body.aclose))
+
+
 # ---- Endpoints -------------------------------------------------------------
 @app.post("/phase0/factors", response_model=Phase0Response, summary="Discover decision factors", 
-          description="Identifies relevant decision variables for a given topic (e.g., job choice, housing)")
-async def phase0_factors(request: Phase0Request, _: Callable = Depends(rate_limiter)):
-    agent = FactorDiscoveryAgent()
-    factors = agent.run(request.topic)
-    return Phase0Response(factors=factors)
+          description="Identifies relevant decision variables for a given topic (e.g., job choice, housing). "
+                      "Also starts a server-side session whose id later phases can send instead of the full journey")
+async def phase0_factors(request: Phase0Request, _: Callable = Depends(rate_limiter),
+                         agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    factors = await agents.factors.arun(request.topic)
+    session_id = new_session_id()
+    await sessions.put(SessionState(session_id=session_id, topic=request.topic, factors=factors))
+    if agents.prefetch:
+        agents.prefetch.start(session_id, request.topic, factors)
+    return Phase0Response(factors=factors, session_id=session_id)
 
 
 @app.post("/phase1/preferences", response_model=Phase1Response, summary="Detail preferences",
           description="Collects detailed information about user preferences, trade-offs, and thresholds")
-async def phase1_preferences(request: Phase1Request, _: Callable = Depends(rate_limiter)):
-    agent = PreferenceDetailAgent()
-    prefs = agent.run(request.preferences, request.topic)
+async def phase1_preferences(request: Phase1Request, _: Callable = Depends(rate_limiter),
+                             agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    session = await load_session(sessions, request.session_id)
+    topic = request.topic or (session.topic if session else None)
+    if session and agents.prefetch:
+        prefs = await agents.prefetch.take(session.session_id, request.preferences, topic)
+    else:
+        prefs = await agents.preferences.arun(request.preferences, topic)
+
+    if session:
+        def store(state: SessionState) -> None:
+            state.preferences = merge_preferences(state.preferences, prefs)
+        await sessions.update(session.session_id, store)
     return Phase1Response(preferences=prefs)
 
 
+async def phase2_inputs(request: Phase2Request, sessions) -> Tuple[List[Preference], str]:
+    """Combine the request's preferences and topic with those stored in its session."""
+    session = await load_session(sessions, request.session_id)
+    preferences, topic = request.preferences, request.topic
+    if session:
+        preferences = merge_preferences(session.preferences, request.preferences)
+        topic = topic or session.topic
+    if not topic:
+        raise HTTPException(status_code=422, detail="topic is required without a session")
+    return preferences, topic
+
+
+async def store_scenarios(sessions, session_id: Optional[str], preferences: List[Preference],
+                          scenarios: List[Scenario]) -> None:
+    if session_id is None:
+        return
+
+    def store(state: SessionState) -> None:
+        state.preferences = merge_preferences(state.preferences, preferences)
+        state.scenarios = scenarios
+    await sessions.update(session_id, store)
+
+
 @app.post("/phase2/scenarios", response_model=Phase2Response, summary="Generate scenarios",
           description="Creates realistic decision scenarios based on user preferences")
-async def phase2_scenarios(request: Phase2Request, _: Callable = Depends(rate_limiter)):
-    agent = ScenarioBuilderAgent()
-    scenarios = agent.run(request.preferences, request.topic)
+async def phase2_scenarios(request: Phase2Request, _: Callable = Depends(rate_limiter),
+                           agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    preferences, topic = await phase2_inputs(request, sessions)
+    scenarios = await agents.scenarios.arun(preferences, topic)
+    await store_scenarios(sessions, request.session_id, request.preferences, scenarios)
     return Phase2Response(scenarios=scenarios)
 
 
+@app.post("/phase2/scenarios/stream", summary="Stream scenarios",
+          description="Same as /phase2/scenarios, but sends each scenario as soon as it is generated. "
+                      "Responds with NDJSON when the client accepts application/x-ndjson, otherwise Server-Sent Events")
+async def phase2_scenarios_stream(request: Phase2Request, http_request: Request,
+                                  _: Callable = Depends(rate_limiter),
+                                  agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    ndjson = "application/x-ndjson" in http_request.headers.get("accept", "")
+    preferences, topic = await phase2_inputs(request, sessions)
+
+    async def events():
+        scenarios = []
+        try:
+            async with aclosing(agents.scenarios.astream(preferences, topic)) as stream:
+                async for scenario in stream:
+                    scenarios.append(scenario)
+                    yield scenario.model_dump_json() + "\n" if ndjson else _sse(scenario.model_dump())
+            await store_scenarios(sessions, request.session_id, request.preferences, scenarios)
+        except Exception:
+            error = {"error": True, "errorMessage": "Scenario generation failed"}
+            yield json.dumps(error) + "\n" if ndjson else _sse(error, event="error")
+            return
+        if not ndjson:
+            yield _sse({}, event="done")
+
+    media_type = "application/x-ndjson" if ndjson else "text/event-stream"
+    return _streaming_response(events(), media_type)
+
+
 @app.post("/phase3/reactions", response_model=Phase3Response, summary="Log emotional reactions",
-          description="Records user's emotional and somatic responses to scenarios")
-async def phase3_reactions(request: Phase3Request, _: Callable = Depends(rate_limiter)):
-    agent = EmotionalReactionAgent()
-    status = agent.run(Reaction(**request.model_dump()))
-    return Phase3Response(status=status)
+          description="Records user's emotional and somatic responses to scenarios. With a session, the reaction "
+                      "is stored and patterns across all of the session's reactions are returned")
+async def phase3_reactions(request: Phase3Request, _: Callable = Depends(rate_limiter),
+                           agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    reaction = Reaction(**request.model_dump(exclude={"session_id"}))
+    scenario, patterns = None, None
+    if request.session_id:
+        def record(state: SessionState) -> None:
+            state.reactions = merge_reactions(state.reactions, [reaction])
+        session = await sessions.update(request.session_id, record)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        scenario = next((s for s in session.scenarios if s.id == reaction.scenario_id), None)
+        patterns = agents.reactions.summarize_patterns(session.reactions)
+
+    status = await agents.reactions.aanalyze(reaction, scenario)
+    return Phase3Response(status=status, patterns=patterns)
+
+
+@app.post("/phase3/reactions/batch", response_model=Phase3BatchResponse, summary="Log several emotional reactions",
+          description="Records reactions to several scenarios in one request and analyzes them together. "
+                      "Returns one insight per reaction, in order, plus patterns across them")
+async def phase3_reactions_batch(request: Phase3BatchRequest, _: Callable = Depends(rate_limiter),
+                                 agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    reactions = [Reaction(**r.model_dump(exclude={"scenario"})) for r in request.reactions]
+    scenarios = {r.scenario.id: r.scenario for r in request.reactions if r.scenario}
+    stored = reactions
+    if request.session_id:
+        def record(state: SessionState) -> None:
+            state.reactions = merge_reactions(state.reactions, reactions)
+        session = await sessions.update(request.session_id, record)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        scenarios = {**{s.id: s for s in session.scenarios}, **scenarios}
+        stored = session.reactions
+
+    insights = await agents.reactions.aanalyze_batch(
+        [(reaction, scenarios.get(reaction.scenario_id)) for reaction in reactions]
+    )
+    return Phase3BatchResponse(insights=insights, patterns=agents.reactions.summarize_patterns(stored))
+
+
+async def phase4_inputs(request: Phase4Request, sessions):
+    """Return reactions, preferences, scenarios and topic for the summary."""
+    session = await load_session(sessions, request.session_id)
+    if session is None:
+        return request.reactions, request.preferences, None, None
+    return (
+        merge_reactions(session.reactions, request.reactions),
+        merge_preferences(session.preferences, request.preferences),
+        session.scenarios or None,
+        session.topic,
+    )
 
 
 @app.post("/phase4/summary", response_model=Phase4Response, summary="Synthesize insights",
           description="Analyzes emotional patterns and generates insights about user preferences")
-async def phase4_summary(request: Phase4Request, _: Callable = Depends(rate_limiter)):
-    agent = InsightSynthesisAgent()
-    summary = agent.run(request.reactions, request.preferences)
+async def phase4_summary(request: Phase4Request, _: Callable = Depends(rate_limiter),
+                         agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    summary = await agents.insights.arun(*await phase4_inputs(request, sessions))
     return Phase4Response(summary=summary)
+
+
+@app.post("/phase4/summary/stream", summary="Stream synthesized insights",
+          description="Same as /phase4/summary, but relays the insight text as Server-Sent Events while it is generated")
+async def phase4_summary_stream(request: Phase4Request, _: Callable = Depends(rate_limiter),
+                                agents: AgentRegistry = Depends(get_agents), sessions=Depends(get_sessions)):
+    inputs = await phase4_inputs(request, sessions)
+
+    async def events():
+        try:
+            async with aclosing(agents.insights.astream(*inputs)) as stream:
+                async for delta in stream:
+                    yield _sse({"delta": delta})
+        except Exception:
+            yield _sse({"error": True, "errorMessage": "Insight generation failed"}, event="error")
+            return
+        yield _sse({}, event="done")
+
+    return _streaming_response(events(), "text/event-stream")
+
+
+@app.post("/journey", response_model=Journey, summary="Run the full journey",
+          description="Runs phases 0-4 server-side for API clients, given a topic, the selected preferences "
+                      "and reactions, and returns every phase's output with per-phase timings")
+async def journey(request: JourneyRequest, _: Callable = Depends(rate_limiter),
+                  agents: AgentRegistry = Depends(get_agents)):
+    return await JourneyPipeline(agents).run(request.topic, request.preferences, request.reactions)
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the deterministic agent code paths.
+
+These functions run on every request when the LLM is unavailable, so they
+are timed here at scaled input sizes (10 to 10k preferences and reactions)
+without any LLM call. Each case reports the median and fastest wall time
+of several rounds and the peak memory allocated during one run
+(``tracemalloc``). Results are compared with a stored baseline and the run
+fails when a case regresses by more than the allowed percentage.
+
+Shared and virtualised hosts slow down by half for seconds at a time, so
+every round also times a fixed :func:`reference` workload and cases are
+compared by ``relative``: their fastest round over the fastest reference
+round. Relative slowdowns worth less than ``--min-time-delta`` milliseconds
+at this host's reference speed are ignored, as the smallest cases run in
+microseconds, where a few percent is jitter.
+
+Examples::
+
+    python benchmarks/bench_agents.py                      # compare with baseline.json
+    python benchmarks/bench_agents.py --save               # record a new baseline
+    python benchmarks/bench_agents.py --sizes 10 100 -k phase4
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models import Preference, Reaction, Scenario
+from strands.phase1 import PreferenceDetailAgent
+from strands.phase2 import ScenarioBuilderAgent
+from strands.phase3 import EmotionalReactionAgent
+from strands.phase4 import InsightSynthesisAgent
+
+SIZES = [10, 100, 1000, 10000]
+BASELINE = Path(__file__).with_name("baseline.json")
+
+FACTORS = ["Base salary", "Remote work flexibility", "Team culture", "Work-life balance",
+           "Career advancement", "Commute time", "Company stability", "Learning opportunities"]
+THOUGHTS = [None, "This feels right.", "I would worry about money every month and that scares me.",
+            "Exciting, but I am not sure I could keep up the pace for long without burning out."]
+
+
+def make_preferences(n: int, rng: random.Random) -> List[Preference]:
+    """``n`` preferences, half known factors and half unknown ones."""
+    prefs = []
+    for i in range(n):
+        factor = rng.choice(FACTORS) if i % 2 else f"Custom factor {i}"
+        has_limit = rng.random() < 0.4
+        prefs.append(Preference(factor=factor, importance=rng.randint(1, 10), hasLimit=has_limit,
+                                limit="at least 3 days" if has_limit else None,
+                                tradeoff="Would trade some pay for it" if rng.random() < 0.5 else None))
+    return prefs
+
+
+def make_scenarios() -> List[Scenario]:
+    return [Scenario(id=a, title=f"The {a} path", text=f"A scenario for the {a} archetype.")
+            for a in ("ideal", "tradeoff", "tradeoff_2", "challenge", "wildcard")]
+
+
+def make_reactions(n: int, rng: random.Random, scenarios: List[Scenario]) -> List[Reaction]:
+    return [Reaction(scenario_id=scenarios[i % len(scenarios)].id, excitement=rng.randint(1, 10),
+                     anxiety=rng.randint(1, 10), freeform=rng.choice(THOUGHTS))
+            for i in range(n)]
+
+
+def build_cases(n: int) -> Dict[str, Callable[[], Any]]:
+    """Return the benchmark callables for input size ``n``."""
+    rng = random.Random(n)
+    prefs = make_preferences(n, rng)
+    scenarios = make_scenarios()
+    reactions = make_reactions(n, rng, scenarios)
+
+    phase1 = PreferenceDetailAgent()
+    phase2 = ScenarioBuilderAgent()
+    phase3 = EmotionalReactionAgent()
+    phase3._store = list(reactions)
+    phase4 = InsightSynthesisAgent()
+    return {
+        "phase1.fallback_enrichment": lambda: phase1._fallback_enrichment(prefs),
+        "phase2.fallback_scenarios": lambda: phase2._generate_fallback_scenarios(prefs, "choosing a job"),
+        "phase2.preference_summary": lambda: phase2._create_preference_summary(prefs),
+        "phase3.reaction_patterns": phase3.get_reaction_patterns,
+        "phase4.analysis_context": lambda: phase4._build_analysis_context(reactions, prefs, scenarios),
+        "phase4.fallback_insights": lambda: phase4._generate_fallback_insights(reactions, prefs),
+    }
+
+
+def reference() -> str:
+    """Fixed pure-Python workload that case timings are normalised by."""
+    return "\n".join(sorted(f"item {i}: {i * 7 % 13}" for i in range(300)))
+
+
+def measure(func: Callable[[], Any], min_time: float, min_rounds: int) -> Dict[str, float]:
+    """Time ``func`` for at least ``min_rounds`` rounds and ``min_time`` seconds."""
+    func()  # warm up caches and lazily built state
+    reference()
+    timings, reference_timings = [], []
+    started = time.perf_counter()
+    while len(timings) < min_rounds or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        reference()
+        t1 = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - t1)
+        reference_timings.append(t1 - t0)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rounds": len(timings),
+        "median_ms": round(statistics.median(timings) * 1000, 4),
+        "min_ms": round(min(timings) * 1000, 4),
+        "relative": round(min(timings) / min(reference_timings), 4),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run(sizes: List[int], keyword: Optional[str] = None, min_time: float = 0.2,
+        min_rounds: int = 10, repeat: int = 1) -> Dict[str, Dict[str, float]]:
+    """Run every case (whose name contains ``keyword``) at each size.
+
+    With ``repeat`` > 1 the whole suite runs that many times in turn; a case
+    keeps its best ``min_ms`` and ``relative`` and the median of its other
+    statistics over the passes.
+    """
+    passes: Dict[str, List[Dict[str, float]]] = {}
+    for _ in range(repeat):
+        for n in sizes:
+            for name, func in build_cases(n).items():
+                if keyword and keyword not in name:
+                    continue
+                passes.setdefault(f"{name}[{n}]", []).append(measure(func, min_time, min_rounds))
+    combine = {"rounds": sum, "min_ms": min, "relative": min}
+    return {case: {key: combine.get(key, statistics.median)([p[key] for p in stats]) for key in stats[0]}
+            for case, stats in passes.items()}
+
+
+def compare(current: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            max_time_regression: float, max_memory_regression: float,
+            min_time_delta: float = 0.05) -> List[str]:
+    """Return the cases slower or hungrier than ``baseline`` beyond the allowed percentages.
+
+    Time is compared by ``relative``; cases whose relative slowdown amounts
+    to less than ``min_time_delta`` milliseconds on this host's reference
+    timing are not reported.
+    """
+    regressions = []
+    for case, stats in current.items():
+        before = baseline.get(case)
+        if not before:
+            continue
+        # Milliseconds of the current reference round, to express the relative change on this host
+        reference_ms = stats["min_ms"] / stats["relative"] if stats["relative"] else 0.0
+        for metric, limit in (("relative", max_time_regression), ("peak_kib", max_memory_regression)):
+            if metric == "relative" and (stats["relative"] - before["relative"]) * reference_ms < min_time_delta:
+                continue
+            old, new = before[metric], stats[metric]
+            if old and (new - old) / old * 100 > limit:
+                regressions.append(f"{case} {metric} {old} -> {new} (+{(new - old) / old * 100:.0f}%)")
+    return regressions
+
+
+def print_report(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]]) -> None:
+    print(f"{'case':<40}{'rounds':>8}{'median ms':>12}{'min ms':>10}{'peak KiB':>11}{'vs base':>9}")
+    for case, stats in results.items():
+        before = baseline.get(case, {}).get("relative")
+        change = f"{(stats['relative'] - before) / before * 100:+.0f}%" if before else "-"
+        print(f"{case:<40}{stats['rounds']:>8}{stats['median_ms']:>12.3f}{stats['min_ms']:>10.3f}"
+              f"{stats['peak_kib']:>11.1f}{change:>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="input sizes to run")
+    parser.add_argument("-k", dest="keyword", help="only run cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds spent timing each case")
+    parser.add_argument("--repeat", type=int, default=3, help="passes over the suite; each case keeps its best")
+    parser.add_argument("--baseline", default=str(BASELINE), help="baseline JSON to compare against")
+    parser.add_argument("--save", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--max-time-regression", type=float, default=25.0,
+                        help="fail if a relative time regresses by more than this percent")
+    parser.add_argument("--min-time-delta", type=float, default=0.05,
+                        help="ignore time regressions smaller than this many milliseconds")
+    parser.add_argument("--max-memory-regression", type=float, default=10.0,
+                        help="fail if peak allocation regresses by more than this percent")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.keyword, args.min_time, repeat=args.repeat)
+    baseline_path = Path(args.baseline)
+    baseline = json.loads(baseline_path.read_text())["results"] if baseline_path.exists() else {}
+    print_report(results, baseline)
+
+    if args.save:
+        merged = {**baseline, **results}
+        baseline_path.write_text(json.dumps({"python": sys.version.split()[0], "results": merged}, indent=2) + "\n")
+        print(f"\n💾 Baseline written to {baseline_path}")
+        return
+    regressions = compare(results, baseline, args.max_time_regression, args.max_memory_regression,
+                          args.min_time_delta)
+    if regressions:
+        print("\n❌ Regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
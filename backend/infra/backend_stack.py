@@ -1,6 +1,9 @@
 from aws_cdk import (
     Stack,
+    aws_dynamodb as dynamodb,
+    aws_ec2 as ec2,
     aws_ecs as ecs,
+    aws_elasticache as elasticache,
     aws_ecs_patterns as ecs_patterns,
     aws_ecr as ecr,
     aws_secretsmanager as secretsmanager,
@@ -65,6 +68,41 @@ class BackendStack(Stack):
             removal_policy=RemovalPolicy.DESTROY,
         )
 
+        # Sessions must be shared: the service scales to several tasks behind the load balancer
+        sessions_table = dynamodb.Table(
+            self,
+            "FeelForwardSessions",
+            table_name="feel-forward-sessions",
+            partition_key=dynamodb.Attribute(name="session_id", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+
+        # Rate limits must be shared too, or each task lets a client through at the full rate
+        redis_security_group = ec2.SecurityGroup(
+            self,
+            "RateLimitRedisSecurityGroup",
+            vpc=cluster.vpc,
+            description="Rate-limit Redis, reachable from the API tasks only",
+        )
+        redis_subnets = elasticache.CfnSubnetGroup(
+            self,
+            "RateLimitRedisSubnets",
+            description="Private subnets of the rate-limit Redis",
+            subnet_ids=[subnet.subnet_id for subnet in cluster.vpc.private_subnets],
+        )
+        rate_limit_redis = elasticache.CfnCacheCluster(
+            self,
+            "RateLimitRedis",
+            engine="redis",
+            cache_node_type="cache.t4g.micro",
+            num_cache_nodes=1,
+            cache_subnet_group_name=redis_subnets.ref,
+            vpc_security_group_ids=[redis_security_group.security_group_id],
+        )
+        rate_limit_redis.add_dependency(redis_subnets)
+
         # Create Fargate service with load balancer
         task_definition = ecs.FargateTaskDefinition(
             self,
@@ -72,6 +110,7 @@ class BackendStack(Stack):
             cpu=256,
             memory_limit_mib=512,
         )
+        sessions_table.grant_read_write_data(task_definition.task_role)
 
         # Add container to task definition
         container = task_definition.add_container(
@@ -80,6 +119,13 @@ class BackendStack(Stack):
             port_mappings=[ecs.PortMapping(container_port=8000)],
             environment={
                 "PYTHONUNBUFFERED": "1",
+                "SESSION_STORE": "dynamodb",
+                "SESSION_DYNAMODB_TABLE": sessions_table.table_name,
+                "RATE_LIMIT_BACKEND": "redis",
+                "RATE_LIMIT_REDIS_URL": (
+                    f"redis://{rate_limit_redis.attr_redis_endpoint_address}:"
+                    f"{rate_limit_redis.attr_redis_endpoint_port}/0"
+                ),
             },
             secrets={
                 "OPENAI_API_KEY": ecs.Secret.from_secrets_manager(openai_secret),
@@ -98,6 +144,9 @@ class BackendStack(Stack):
             desired_count=1,  # Scale up to 1 task now that image is available
             assign_public_ip=True,  # Allow public IP for internet access
         )
+        redis_security_group.add_ingress_rule(
+            fargate_service.connections.security_groups[0], ec2.Port.tcp(6379), "API tasks"
+        )
 
         # Create Application Load Balancer
         lb = elbv2.ApplicationLoadBalancer(
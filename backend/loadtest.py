@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""Load-test the Feel Forward API with concurrent multi-phase user journeys.
+
+Each virtual user repeatedly walks a journey the way the frontend does:
+``/phase0/factors`` -> ``/phase1/preferences`` -> ``/phase2/scenarios`` ->
+one ``/phase3/reactions`` per scenario -> ``/phase4/summary``, carrying the
+session id between phases. Per-endpoint latency histograms, error and 429
+rates and event-loop lag are written as JSON that can be compared across
+commits.
+
+Examples::
+
+    # In-process app, rule-based fallback agents
+    python loadtest.py --users 50 --journeys 500 --output results.json
+
+    # In-process app, real LLM code paths against the local mock
+    python loadtest.py --llm mock --mock-latency-ms 400 --users 100 --duration 60
+
+    # A running server, compared with an earlier run
+    python loadtest.py --target http://localhost:8000 --compare baseline.json
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+# Upper bounds in milliseconds of the latency histogram buckets
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class LatencyRecorder:
+    """Collect per-endpoint latencies and status codes."""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, seconds: float, status: int) -> None:
+        self.samples.setdefault(endpoint, []).append(seconds * 1000)
+        counts = self.statuses.setdefault(endpoint, {})
+        counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        result = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            statuses = self.statuses[endpoint]
+            errors = sum(n for code, n in statuses.items() if code == "0" or code.startswith("5"))
+            histogram = {}
+            for bound in BUCKETS_MS:
+                histogram[f"le_{bound}"] = sum(1 for s in ordered if s <= bound)
+            histogram["le_inf"] = len(ordered)
+            result[endpoint] = {
+                "requests": len(ordered),
+                "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+                "mean_ms": round(sum(ordered) / len(ordered), 2),
+                "p50_ms": round(percentile(ordered, 50), 2),
+                "p90_ms": round(percentile(ordered, 90), 2),
+                "p95_ms": round(percentile(ordered, 95), 2),
+                "p99_ms": round(percentile(ordered, 99), 2),
+                "max_ms": round(ordered[-1], 2),
+                "error_rate": round(errors / len(ordered), 4),
+                "rate_limited_rate": round(statuses.get("429", 0) / len(ordered), 4),
+                "statuses": statuses,
+                "histogram": histogram,
+            }
+        return result
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes a task that sleeps ``interval`` seconds.
+
+    With the in-process target this is the server's own loop, so blocking
+    work in request handlers shows up directly.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags: List[float] = []
+
+    async def run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval) * 1000)
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.lags)
+        return {
+            "samples": len(ordered),
+            "p50_ms": round(percentile(ordered, 50), 2),
+            "p99_ms": round(percentile(ordered, 99), 2),
+            "max_ms": round(ordered[-1], 2) if ordered else 0.0,
+        }
+
+
+class JourneyUser:
+    """One virtual user walking complete journeys through the API."""
+
+    TOPICS = ["choosing a job", "moving to a new city", "buying a house", "changing careers"]
+
+    def __init__(self, client: httpx.AsyncClient, recorder: LatencyRecorder, rng: random.Random,
+                 think_time: float = 0.0):
+        self.client = client
+        self.recorder = recorder
+        self.rng = rng
+        self.think_time = think_time
+
+    async def post(self, endpoint: str, payload: dict) -> Optional[dict]:
+        started = time.perf_counter()
+        try:
+            resp = await self.client.post(endpoint, json=payload)
+            status = resp.status_code
+        except httpx.HTTPError:
+            status, resp = 0, None
+        self.recorder.record(endpoint, time.perf_counter() - started, status)
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0, 2 * self.think_time))
+        return resp.json() if resp is not None and status == 200 else None
+
+    async def journey(self) -> bool:
+        """Run one journey; return True if every phase succeeded."""
+        topic = self.rng.choice(self.TOPICS)
+        phase0 = await self.post("/phase0/factors", {"topic": topic})
+        if phase0 is None:
+            return False
+        session_id = phase0.get("session_id")
+        items = [item for category in phase0["factors"] for item in category["items"]]
+        selected = self.rng.sample(items, min(4, len(items)))
+        prefs = [{"factor": f, "importance": self.rng.randint(3, 10)} for f in selected]
+
+        if await self.post("/phase1/preferences", {"preferences": prefs, "session_id": session_id}) is None:
+            return False
+        phase2 = await self.post("/phase2/scenarios", {"session_id": session_id})
+        if phase2 is None:
+            return False
+        for scenario in phase2["scenarios"]:
+            reaction = {
+                "scenario_id": scenario["id"],
+                "excitement": self.rng.randint(1, 10),
+                "anxiety": self.rng.randint(1, 10),
+                "freeform": self.rng.choice([None, "This feels right.", "I would worry about money."]),
+                "session_id": session_id,
+            }
+            if await self.post("/phase3/reactions", reaction) is None:
+                return False
+        return await self.post("/phase4/summary", {"session_id": session_id}) is not None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_llm(latency_ms: float, error_rate: float, tokens_per_sec: float) -> subprocess.Popen:
+    """Run mock_llm.py under uvicorn and point the agents' OpenAI clients at it."""
+    port = _free_port()
+    env = dict(os.environ, MOCK_LLM_LATENCY_MS=str(latency_ms), MOCK_LLM_ERROR_RATE=str(error_rate),
+               MOCK_LLM_TOKENS_PER_SEC=str(tokens_per_sec), MOCK_LLM_LATENCY_DIST="lognormal")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mock_llm:app", "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        # A server that exited (port taken, import error) will never answer
+        if proc.poll() is not None:
+            raise RuntimeError(f"mock LLM server exited with code {proc.returncode}")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/mock/config", timeout=0.5)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    else:
+        proc.terminate()
+        raise RuntimeError("mock LLM server did not start")
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ["OPENAI_API_KEY"] = "mock"
+    return proc
+
+
+def _make_client(target: str, user: int, same_ip: bool) -> httpx.AsyncClient:
+    if target != "inproc":
+        return httpx.AsyncClient(base_url=target, timeout=60)
+    from api import app
+
+    # Distinct client addresses so each virtual user gets its own rate-limit bucket
+    host = "10.0.0.1" if same_ip else f"10.{user // 65536 % 256}.{user // 256 % 256}.{user % 256}"
+    transport = httpx.ASGITransport(app=app, client=(host, 50000))
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60)
+
+
+async def run_load(target: str = "inproc", users: int = 10, journeys: Optional[int] = 50,
+                   duration: Optional[float] = None, think_time: float = 0.0, same_ip: bool = False,
+                   seed: int = 0) -> Dict[str, Any]:
+    """Drive journeys until ``journeys`` complete or ``duration`` seconds pass."""
+    recorder = LatencyRecorder()
+    monitor = LoopLagMonitor()
+    lag_task = asyncio.create_task(monitor.run())
+    outcomes = {"completed": 0, "failed": 0}
+    started = time.perf_counter()
+    remaining = [journeys if journeys is not None else float("inf")]
+
+    async def user_loop(index: int) -> None:
+        rng = random.Random(seed * 100_003 + index)
+        async with _make_client(target, index, same_ip) as client:
+            user = JourneyUser(client, recorder, rng, think_time)
+            while remaining[0] > 0:
+                if duration is not None and time.perf_counter() - started >= duration:
+                    return
+                remaining[0] -= 1
+                outcomes["completed" if await user.journey() else "failed"] += 1
+
+    await asyncio.gather(*(user_loop(i) for i in range(users)))
+    elapsed = time.perf_counter() - started
+    lag_task.cancel()
+
+    total = outcomes["completed"] + outcomes["failed"]
+    return {
+        "meta": {
+            "target": target,
+            "users": users,
+            "journeys": journeys,
+            "duration": duration,
+            "think_time": think_time,
+            "same_ip": same_ip,
+            "seed": seed,
+            "llm": "mock" if os.getenv("OPENAI_BASE_URL") else ("openai" if os.getenv("OPENAI_API_KEY") else "fallback"),
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "elapsed_s": round(elapsed, 3),
+        },
+        "journeys": {
+            **outcomes,
+            "success_rate": round(outcomes["completed"] / total, 4) if total else 0.0,
+            "throughput_per_s": round(total / elapsed, 3) if elapsed else 0.0,
+        },
+        "endpoints": recorder.summary(elapsed),
+        "event_loop_lag": monitor.summary(),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Print per-endpoint latency changes; return the regressions beyond ``max_regression`` %."""
+    regressions = []
+    print(f"\n{'endpoint':<24}{'metric':<8}{'baseline':>12}{'current':>12}{'change':>10}")
+    for endpoint, stats in current["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(endpoint)
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            old, new = before[metric], stats[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"{endpoint:<24}{metric[:-3]:<8}{old:>12.2f}{new:>12.2f}{change:>9.1f}%")
+            if change > max_regression:
+                regressions.append(f"{endpoint} {metric} +{change:.1f}%")
+    return regressions
+
+
+def print_report(results: Dict[str, Any]) -> None:
+    meta, journeys = results["meta"], results["journeys"]
+    print(f"\n📈 {journeys['completed']} journeys completed, {journeys['failed']} failed "
+          f"in {meta['elapsed_s']}s ({journeys['throughput_per_s']} journeys/s, llm={meta['llm']})")
+    print(f"\n{'endpoint':<24}{'reqs':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>7}{'429%':>7}")
+    for endpoint, s in results["endpoints"].items():
+        print(f"{endpoint:<24}{s['requests']:>7}{s['p50_ms']:>9.1f}{s['p95_ms']:>9.1f}{s['p99_ms']:>9.1f}"
+              f"{s['error_rate'] * 100:>7.1f}{s['rate_limited_rate'] * 100:>7.1f}")
+    lag = results["event_loop_lag"]
+    print(f"\nEvent-loop lag: p50 {lag['p50_ms']} ms, p99 {lag['p99_ms']} ms, max {lag['max_ms']} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--target", default="inproc", help="'inproc' or a base URL such as http://localhost:8000")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--journeys", type=int, default=100, help="total journeys to run")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds instead")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause between requests (s)")
+    parser.add_argument("--same-ip", action="store_true", help="send every user from one address (exercises 429s)")
+    parser.add_argument("--llm", choices=["fallback", "mock", "env"], default="fallback",
+                        help="rule-based fallbacks, the local mock LLM, or whatever the environment configures")
+    parser.add_argument("--mock-latency-ms", type=float, default=300.0)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-tokens-per-sec", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=20.0,
+                        help="exit non-zero if any p50/p95/p99 regresses by more than this percent")
+    args = parser.parse_args()
+
+    mock = None
+    if args.llm == "fallback":
+        os.environ.pop("OPENAI_API_KEY", None)
+    elif args.llm == "mock":
+        mock = start_mock_llm(args.mock_latency_ms, args.mock_error_rate, args.mock_tokens_per_sec)
+    try:
+        results = asyncio.run(run_load(
+            target=args.target, users=args.users,
+            journeys=None if args.duration else args.journeys, duration=args.duration,
+            think_time=args.think_time, same_ip=args.same_ip, seed=args.seed,
+        ))
+    finally:
+        if mock is not None:
+            mock.terminate()
+
+    print_report(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\n❌ Regressions: " + ", ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Deterministic stand-in for the OpenAI chat-completions API.
+
+Serves ``POST /v1/chat/completions`` (plain and streaming) with
+schema-valid payloads for every Feel Forward agent, so the real agent code
+paths - pooled client, retries, JSON parsing, streaming - can be
+load-tested offline. Run it and point the backend at it::
+
+    uvicorn mock_llm:app --port 8100
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=mock uvicorn api:app
+
+Behaviour is configured with ``MOCK_LLM_*`` environment variables (see
+:class:`MockConfig`) or at runtime through ``GET/PUT /mock/config``.
+Payloads depend only on the request content and ``seed``; latency and
+injected errors come from one seeded generator, so a sequential run is
+reproducible.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from strands import phase0, phase1, phase2, phase3, phase4
+from strands.tokens import count_tokens
+
+CATEGORIES = {
+    "Work Environment": ["Remote work flexibility", "Team culture", "Office location", "Work-life balance"],
+    "Compensation": ["Base salary", "Equity/stock options", "Benefits package", "Bonus structure"],
+    "Growth & Development": ["Career advancement", "Learning opportunities", "Mentorship", "Skill building"],
+    "Stability": ["Company stability", "Job security", "Industry outlook", "Commute time"],
+}
+MOODS = ["energised", "uneasy", "curious", "relieved", "torn", "hopeful"]
+
+
+class MockConfig:
+    """Latency, error and throughput settings of the mock server.
+
+    ``latency_ms`` is the median time to first token; ``latency_dist`` is
+    ``fixed``, ``uniform`` (0-2x median), ``exponential`` or ``lognormal``
+    (spread set by ``latency_sigma``). ``error_rate`` is the share of
+    requests answered with ``error_status``. ``tokens_per_sec`` paces the
+    completion after the first token; 0 sends it at once.
+    """
+
+    FIELDS = ("latency_ms", "latency_dist", "latency_sigma", "error_rate", "error_status",
+              "tokens_per_sec", "seed")
+
+    def __init__(self, latency_ms: float = 0.0, latency_dist: str = "fixed", latency_sigma: float = 0.5,
+                 error_rate: float = 0.0, error_status: int = 500, tokens_per_sec: float = 0.0,
+                 seed: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.tokens_per_sec = tokens_per_sec
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls) -> "MockConfig":
+        return cls(
+            latency_ms=float(os.getenv("MOCK_LLM_LATENCY_MS", "0")),
+            latency_dist=os.getenv("MOCK_LLM_LATENCY_DIST", "fixed"),
+            latency_sigma=float(os.getenv("MOCK_LLM_LATENCY_SIGMA", "0.5")),
+            error_rate=float(os.getenv("MOCK_LLM_ERROR_RATE", "0")),
+            error_status=int(os.getenv("MOCK_LLM_ERROR_STATUS", "500")),
+            tokens_per_sec=float(os.getenv("MOCK_LLM_TOKENS_PER_SEC", "0")),
+            seed=int(os.getenv("MOCK_LLM_SEED", "0")),
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def sample_latency(self, rng: random.Random) -> float:
+        """Seconds before the first token."""
+        median = self.latency_ms / 1000
+        if median <= 0:
+            return 0.0
+        if self.latency_dist == "uniform":
+            return rng.uniform(0, 2 * median)
+        if self.latency_dist == "exponential":
+            return rng.expovariate(1 / median)
+        if self.latency_dist == "lognormal":
+            return rng.lognormvariate(0, self.latency_sigma) * median
+        return median
+
+
+def _content_rng(seed: int, messages: List[dict]) -> random.Random:
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+    return random.Random(seed ^ int.from_bytes(digest[:8], "big"))
+
+
+def _between(text: str, start: str, end: str) -> str:
+    head, _, tail = text.partition(start)
+    return tail.partition(end)[0] if tail else ""
+
+
+def _factors(rng: random.Random) -> dict:
+    categories = rng.sample(list(CATEGORIES), 3)
+    return {"factors": [{"category": c, "items": rng.sample(CATEGORIES[c], 3)} for c in categories]}
+
+
+def _preferences(rng: random.Random, user: str) -> dict:
+    try:
+        selected = json.loads(_between(user, "User's selected preferences:\n", "\n\nFor each"))
+    except ValueError:
+        selected = []
+    prefs = []
+    for pref in selected:
+        has_limit = rng.random() < 0.5
+        prefs.append({
+            "factor": pref.get("factor", ""),
+            "importance": rng.randint(4, 10),
+            "hasLimit": has_limit,
+            "limit": f"at least {rng.randint(2, 9)} on a 10-point scale" if has_limit else None,
+            "tradeoff": f"Would give up some {rng.choice(['pay', 'flexibility', 'prestige'])} for this",
+        })
+    return {"preferences": prefs}
+
+
+def _scenario(rng: random.Random, topic: str) -> dict:
+    mood = rng.choice(MOODS)
+    return {
+        "title": f"The {mood.title()} Path",
+        "text": f"You are weighing {topic or 'a big decision'} and one option leaves you {mood}. "
+                f"It delivers on {rng.randint(2, 4)} of your priorities but asks you to bend on the rest.",
+    }
+
+
+def _scenarios(rng: random.Random, topic: str) -> dict:
+    archetypes = ["ideal", "tradeoff", "tradeoff_2", "challenge", "wildcard"]
+    return {"scenarios": [{"id": a, **_scenario(rng, topic)} for a in archetypes]}
+
+
+def _insight(rng: random.Random) -> str:
+    return (f"Feeling {rng.choice(MOODS)} here suggests this scenario touches a priority "
+            f"you rated lower than you actually feel it.")
+
+
+def _summary(rng: random.Random) -> str:
+    sentences = [
+        "Your reactions show a consistent pull towards security over novelty.",
+        f"You felt most {rng.choice(MOODS)} when your top stated priority was at risk.",
+        "There is a gap between the importance you assigned to flexibility and how strongly you reacted to it.",
+        "Before deciding, name the one requirement you would not trade away and test every option against it.",
+    ]
+    return " ".join(rng.sample(sentences, 3))
+
+
+def generate_content(messages: List[dict], seed: int = 0) -> str:
+    """Return a schema-valid reply for whichever agent sent ``messages``."""
+    rng = _content_rng(seed, messages)
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    user = messages[-1].get("content", "") if messages else ""
+    topic = _between(user, "Topic: ", "\n")
+
+    if phase0.FACTOR_PROMPT in user:
+        return json.dumps(_factors(rng))
+    if system == phase1.SYSTEM_PROMPT:
+        return json.dumps(_preferences(rng, user))
+    if system == phase2.SYSTEM_PROMPT:
+        return json.dumps(_scenarios(rng, topic))
+    if system == phase2.SINGLE_SCENARIO_PROMPT:
+        return json.dumps(_scenario(rng, topic))
+    if system == phase3.BATCH_SYSTEM_PROMPT:
+        count = len(re.findall(r"^Reaction \d+$", user, re.MULTILINE))
+        return json.dumps({"insights": [_insight(rng) for _ in range(count)]})
+    if system == phase3.SYSTEM_PROMPT:
+        return _insight(rng)
+    if system == phase4.SYSTEM_PROMPT:
+        return _summary(rng)
+    return "OK"
+
+
+def _completion(content: str, model: str, prompt_tokens: int) -> dict:
+    completion_tokens = count_tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason: Optional[str] = None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def create_app(config: Optional[MockConfig] = None) -> FastAPI:
+    """Build a mock server; tests pass their own :class:`MockConfig`."""
+    mock = FastAPI(title="Mock LLM", docs_url=None, redoc_url=None)
+    mock.state.config = config or MockConfig.from_env()
+    mock.state.rng = random.Random(mock.state.config.seed)
+    mock.state.requests = 0
+
+    @mock.get("/mock/config")
+    async def get_config() -> dict:
+        return mock.state.config.as_dict()
+
+    @mock.put("/mock/config")
+    async def put_config(update: Dict[str, Any]) -> dict:
+        config = mock.state.config
+        for field, value in update.items():
+            if field in MockConfig.FIELDS:
+                setattr(config, field, type(getattr(config, field))(value))
+        mock.state.rng = random.Random(config.seed)
+        return config.as_dict()
+
+    @mock.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        config: MockConfig = mock.state.config
+        rng: random.Random = mock.state.rng
+        mock.state.requests += 1
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "mock")
+
+        await asyncio.sleep(config.sample_latency(rng))
+        if rng.random() < config.error_rate:
+            return JSONResponse(
+                status_code=config.error_status,
+                content={"error": {"message": "Injected mock failure", "type": "server_error"}},
+            )
+
+        content = generate_content(messages, config.seed)
+        token_delay = 1 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+        if not body.get("stream"):
+            await asyncio.sleep(count_tokens(content) * token_delay)
+            prompt_tokens = sum(count_tokens(m.get("content") or "") for m in messages)
+            return _completion(content, model, prompt_tokens)
+
+        async def stream():
+            completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            # Roughly one token per chunk, as the real API sends them
+            for piece in re.findall(r"\S*\s*", content):
+                if piece:
+                    if token_delay:
+                        await asyncio.sleep(token_delay)
+                    yield _chunk(completion_id, model, {"content": piece})
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return mock
+
+
+app = create_app()
@@ -1,7 +1,15 @@
 """Pydantic models for the Feel Forward REST API."""
 
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, model_validator
+
+
+def require_without_session(model: BaseModel, *fields: str) -> BaseModel:
+    """Reject ``model`` when it has no ``session_id`` to take the missing ``fields`` from."""
+    missing = [name for name in fields if name not in model.model_fields_set]
+    if model.session_id is None and missing:
+        raise ValueError(f"{', '.join(missing)} required without a session_id")
+    return model
 
 
 class FactorCategory(BaseModel):
@@ -17,6 +25,7 @@ class Phase0Request(BaseModel):
 
 class Phase0Response(BaseModel):
     factors: List[FactorCategory]
+    session_id: Optional[str] = None
 
 
 class Preference(BaseModel):
@@ -30,6 +39,7 @@ class Preference(BaseModel):
 class Phase1Request(BaseModel):
     preferences: List[Preference]
     topic: Optional[str] = None
+    session_id: Optional[str] = None
 
 
 class Phase1Response(BaseModel):
@@ -43,8 +53,15 @@ class Scenario(BaseModel):
 
 
 class Phase2Request(BaseModel):
-    preferences: List[Preference]
-    topic: str
+    # With a session_id, preferences are merged into the stored ones and the
+    # topic defaults to the session's topic
+    preferences: List[Preference] = []
+    topic: Optional[str] = None
+    session_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_inputs(self):
+        return require_without_session(self, "preferences", "topic")
 
 
 class Phase2Response(BaseModel):
@@ -65,17 +82,77 @@ class Phase3Request(BaseModel):
     anxiety: int
     body: Optional[str] = None
     freeform: Optional[str] = None
+    session_id: Optional[str] = None
 
 
 class Phase3Response(BaseModel):
     status: str
+    # Aggregated over every reaction stored in the session
+    patterns: Optional[Dict[str, Any]] = None
+
+
+class BatchReaction(Reaction):
+    # Optional context for LLM analysis; looked up in the session when omitted
+    scenario: Optional[Scenario] = None
+
+
+class Phase3BatchRequest(BaseModel):
+    reactions: List[BatchReaction]
+    session_id: Optional[str] = None
+
+
+class Phase3BatchResponse(BaseModel):
+    insights: List[str]
+    patterns: Dict[str, Any]
 
 
 class Phase4Request(BaseModel):
-    reactions: List[Reaction]
-    preferences: List[Preference]
+    reactions: List[Reaction] = []
+    preferences: List[Preference] = []
+    session_id: Optional[str] = None
+
+    @model_validator(mode="after")
+    def check_inputs(self):
+        return require_without_session(self, "reactions", "preferences")
 
 
 class Phase4Response(BaseModel):
     summary: str
 
+
+
+class SessionState(BaseModel):
+    """Journey data kept server-side between phase requests."""
+
+    session_id: str
+    topic: Optional[str] = None
+    factors: List[FactorCategory] = []
+    preferences: List[Preference] = []
+    scenarios: List[Scenario] = []
+    reactions: List[Reaction] = []
+
+
+class JourneyRequest(BaseModel):
+    topic: str
+    # The user's factor selections with their own importance ratings
+    preferences: List[Preference]
+    # scenario_id may name a generated scenario or be any placeholder; unknown
+    # ids are matched to scenarios by position
+    reactions: List[Reaction] = []
+
+
+class Journey(BaseModel):
+    """Result of running all five phases server-side."""
+
+    topic: str
+    factors: List[FactorCategory]
+    preferences: List[Preference]
+    scenarios: List[Scenario]
+    reactions: List[Reaction]
+    insights: List[str]
+    patterns: Dict[str, Any]
+    summary: str
+    # Wall-clock milliseconds per phase, plus "total"
+    timings: Dict[str, float]
+    # True/False when Phase 2 was started speculatively and its result was kept/discarded
+    speculative_phase2: Optional[bool] = None
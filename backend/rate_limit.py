@@ -0,0 +1,256 @@
+"""Per-client request rate limiting for the Feel Forward API.
+
+Two interchangeable backends share the ``ahit``/``run_evictor``/``stats``
+interface: :class:`TokenBucketLimiter` keeps state in-process, while
+:class:`RedisTokenBucketLimiter` keeps it in Redis so every API task
+enforces the same limit. :func:`create_limiter` picks one from the
+environment.
+"""
+from collections import OrderedDict
+import asyncio
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class TokenBucketLimiter:
+    """Token-bucket limiter allowing ``rate`` requests per ``window`` seconds per key.
+
+    Each check is O(1): the bucket is refilled lazily from the time elapsed
+    since it was last touched. Buckets are kept in least-recently-used order,
+    so idle keys can be evicted from the front without scanning, and the
+    number of tracked keys is capped at ``max_keys``.
+    """
+
+    def __init__(self, rate: int, window: float, max_keys: int = 100_000):
+        self.capacity = float(rate)
+        self.window = window
+        self.refill_rate = rate / window
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def hit(self, key: str, now: Optional[float] = None) -> bool:
+        """Consume one token for ``key``; return False if the limit is exceeded."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = _Bucket(self.capacity, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated) * self.refill_rate)
+            bucket.updated = now
+            self._buckets.move_to_end(key)
+
+        if bucket.tokens < 1:
+            self.rejected += 1
+            return False
+        bucket.tokens -= 1
+        self.allowed += 1
+        return True
+
+    async def ahit(self, key: str) -> bool:
+        """Async form of :meth:`hit`, matching the shared backend's interface."""
+        return self.hit(key)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop keys idle for a full window; their buckets would be full anyway."""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if now - bucket.updated < self.window:
+                break
+            del self._buckets[key]
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    async def run_evictor(self, interval: Optional[float] = None) -> None:
+        """Evict idle keys periodically; run as a background task."""
+        while True:
+            await asyncio.sleep(interval or self.window)
+            self.evict_idle()
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the tracked buckets."""
+        per_bucket = sys.getsizeof(_Bucket(0.0, 0.0)) + 2 * sys.getsizeof(0.0)
+        keys = sum(sys.getsizeof(k) for k in self._buckets)
+        return sys.getsizeof(self._buckets) + keys + per_bucket * len(self._buckets)
+
+    async def aclose(self) -> None:
+        """Nothing to release for in-process state."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "evicted": self.evicted,
+            "memory_bytes": self.memory_bytes(),
+        }
+
+
+# Atomic token-bucket update. Timestamps come from the caller so the script is
+# deterministic (safe under script replication); API tasks run NTP-synced clocks.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local refill_per_ms = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local ttl = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * refill_per_ms)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], ttl)
+return allowed
+"""
+
+
+# Socket timeouts of the shared backend; a hung Redis must fail open, not stall every request
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT_MS", "200")) / 1000
+
+
+class RedisTokenBucketLimiter:
+    """Token-bucket limiter whose state lives in a Redis-compatible server.
+
+    Each check runs :data:`TOKEN_BUCKET_SCRIPT` atomically on the server.
+    Checks issued concurrently on the event loop are coalesced into a single
+    pipelined round-trip of ``EVALSHA`` calls, so enforcement costs about one
+    network RTT however many requests arrive together; the script is loaded
+    once, and again only if the server answers ``NOSCRIPT``. Idle keys expire
+    on the server after one window. If Redis is unreachable or slower than
+    its socket timeout the limiter fails open.
+    """
+
+    def __init__(self, rate: int, window: float, redis_client, prefix: str = "ratelimit:"):
+        self.capacity = rate
+        self.window = window
+        self.refill_per_ms = rate / (window * 1000)
+        self.prefix = prefix
+        self._redis = redis_client
+        self._sha: Optional[str] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush: Optional[asyncio.Task] = None
+        self.allowed = 0
+        self.rejected = 0
+        self.errors = 0
+        self.round_trips = 0
+
+    @classmethod
+    def from_url(cls, rate: int, window: float, url: str, timeout: float = RATE_LIMIT_REDIS_TIMEOUT,
+                 **kwargs) -> "RedisTokenBucketLimiter":
+        import redis.asyncio as redis
+
+        client = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        return cls(rate, window, client, **kwargs)
+
+    async def ahit(self, key: str) -> bool:
+        """Consume one token for ``key``; return False if the limit is exceeded."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((key, future))
+        if self._flush is None:
+            self._flush = asyncio.ensure_future(self._flush_pending())
+        return await future
+
+    async def _flush_pending(self) -> None:
+        # Yield once so every check started in this loop iteration joins the batch
+        await asyncio.sleep(0)
+        batch, self._pending, self._flush = self._pending, [], None
+        now_ms = int(time.time() * 1000)
+        try:
+            results = await self._run_batch([key for key, _ in batch], now_ms)
+        except Exception:
+            self.errors += 1
+            results = [1] * len(batch)
+
+        for (_, future), allowed in zip(batch, results):
+            if allowed:
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            if not future.done():
+                future.set_result(bool(allowed))
+
+    async def _run_batch(self, keys: List[str], now_ms: int) -> List[Any]:
+        from redis.exceptions import NoScriptError
+
+        if self._sha is None:
+            self._sha = await self._redis.script_load(TOKEN_BUCKET_SCRIPT)
+            self.round_trips += 1
+        args = [self.capacity, self.refill_per_ms, now_ms, int(self.window * 1000)]
+        for _ in range(2):
+            # Plain EVALSHA: a registered Script would make execute() check for it first
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.evalsha(self._sha, 1, self.prefix + key, *args)
+                results = await pipe.execute(raise_on_error=False)
+            self.round_trips += 1
+            if not any(isinstance(result, NoScriptError) for result in results):
+                break
+            # The server lost its scripts (restart or failover); load it again and retry once
+            self._sha = await self._redis.script_load(TOKEN_BUCKET_SCRIPT)
+            self.round_trips += 1
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    async def run_evictor(self, interval: Optional[float] = None) -> None:
+        """Nothing to do: Redis expires idle keys itself."""
+
+    async def aclose(self) -> None:
+        await self._redis.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "redis",
+            "allowed": self.allowed,
+            "rejected": self.rejected,
+            "errors": self.errors,
+            "round_trips": self.round_trips,
+        }
+
+
+def create_limiter(rate: int, window: float):
+    """Build the limiter selected by ``RATE_LIMIT_BACKEND`` (``memory`` or ``redis``).
+
+    On ECS the service runs several tasks, each of which would let a client
+    through at the full rate with per-task buckets, so ``RATE_LIMIT_BACKEND``
+    must be set explicitly there.
+    """
+    backend = os.getenv("RATE_LIMIT_BACKEND", "").lower()
+    if not backend and os.getenv("ECS_CONTAINER_METADATA_URI_V4"):
+        raise RuntimeError(
+            "RATE_LIMIT_BACKEND is unset on ECS; set it to redis so every task enforces the same limit "
+            "(or to memory for a deliberately single-task service)"
+        )
+    if backend == "redis":
+        url = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+        return RedisTokenBucketLimiter.from_url(rate, window, url)
+    return TokenBucketLimiter(rate, window, max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")))
@@ -0,0 +1,248 @@
+"""Server-side storage of in-progress journeys, keyed by session id.
+
+Three interchangeable stores share the ``get``/``put``/``update`` interface:
+
+* :class:`InMemorySessionStore` - per-process LRU, the default; only for a
+  single API process, as other tasks cannot see its sessions.
+* :class:`SQLiteSessionStore` - a local file, survives restarts.
+* :class:`DynamoDBSessionStore` - shared by every API task; point
+  ``SESSION_DYNAMODB_ENDPOINT`` at DynamoDB Local to run it offline.
+
+:func:`create_session_store` picks one from the environment.
+"""
+from collections import OrderedDict
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional, Tuple
+
+from models import Preference, Reaction, SessionState
+
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+
+Mutation = Callable[[SessionState], None]
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+def merge_preferences(stored: List[Preference], updates: List[Preference]) -> List[Preference]:
+    """Overlay ``updates`` on ``stored`` by factor, keeping the stored order."""
+    merged = {p.factor: p for p in stored}
+    merged.update((p.factor, p) for p in updates)
+    return list(merged.values())
+
+
+def merge_reactions(stored: List[Reaction], updates: List[Reaction]) -> List[Reaction]:
+    """Overlay ``updates`` on ``stored`` by scenario id, keeping the stored order."""
+    merged = {r.scenario_id: r for r in stored}
+    merged.update((r.scenario_id, r) for r in updates)
+    return list(merged.values())
+
+
+class InMemorySessionStore:
+    """LRU-bounded session store held in this process."""
+
+    def __init__(self, max_sessions: int = 10_000, ttl: float = SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, Tuple[SessionState, float]]" = OrderedDict()
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        state, expires = entry
+        if expires < time.monotonic():
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return state.model_copy(deep=True)
+
+    async def put(self, state: SessionState) -> None:
+        self._sessions[state.session_id] = (state.model_copy(deep=True), time.monotonic() + self.ttl)
+        self._sessions.move_to_end(state.session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    async def update(self, session_id: str, mutate: Mutation) -> Optional[SessionState]:
+        """Apply ``mutate`` atomically; return the new state or None if missing."""
+        # No awaits between read and write, so this is atomic on the event loop
+        state = await self.get(session_id)
+        if state is None:
+            return None
+        mutate(state)
+        await self.put(state)
+        return state
+
+    async def aclose(self) -> None:
+        """Nothing to release for in-process state."""
+
+
+class SQLiteSessionStore:
+    """Session store backed by a local SQLite file."""
+
+    def __init__(self, path: str = "sessions.db", ttl: float = SESSION_TTL):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        return await asyncio.to_thread(self._get, session_id)
+
+    async def put(self, state: SessionState) -> None:
+        await asyncio.to_thread(self._put, state)
+
+    async def update(self, session_id: str, mutate: Mutation) -> Optional[SessionState]:
+        return await asyncio.to_thread(self._update, session_id, mutate)
+
+    async def aclose(self) -> None:
+        self._conn.close()
+
+    def _get(self, session_id: str) -> Optional[SessionState]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires >= ?", (session_id, time.time())
+            ).fetchone()
+        return SessionState.model_validate_json(row[0]) if row else None
+
+    def _put(self, state: SessionState) -> None:
+        with self._lock:
+            self._write(state)
+
+    def _update(self, session_id: str, mutate: Mutation) -> Optional[SessionState]:
+        with self._lock:
+            # BEGIN IMMEDIATE also serialises writers in other processes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM sessions WHERE id = ? AND expires >= ?", (session_id, time.time())
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                state = SessionState.model_validate_json(row[0])
+                mutate(state)
+                self._write(state)
+                self._conn.execute("COMMIT")
+                return state
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _write(self, state: SessionState) -> None:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO sessions (id, data, expires) VALUES (?, ?, ?)",
+            (state.session_id, state.model_dump_json(), time.time() + self.ttl),
+        )
+
+
+class DynamoDBSessionStore:
+    """Session store backed by a DynamoDB table shared by all API tasks.
+
+    The table needs a string partition key ``session_id``; enable DynamoDB
+    TTL on the ``expires_at`` attribute to have old sessions removed.
+    Concurrent updates use optimistic locking on a ``version`` attribute.
+    """
+
+    def __init__(self, table_name: str, endpoint_url: Optional[str] = None,
+                 region_name: Optional[str] = None, ttl: float = SESSION_TTL):
+        import boto3
+
+        self.ttl = ttl
+        self._resource = boto3.resource(
+            "dynamodb",
+            endpoint_url=endpoint_url,
+            region_name=region_name or os.getenv("AWS_REGION", "us-east-1"),
+        )
+        self._table = self._resource.Table(table_name)
+
+    def create_table(self) -> None:
+        """Create the table (for DynamoDB Local and tests)."""
+        self._resource.create_table(
+            TableName=self._table.name,
+            KeySchema=[{"AttributeName": "session_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "session_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        ).wait_until_exists()
+
+    async def get(self, session_id: str) -> Optional[SessionState]:
+        item = await asyncio.to_thread(self._get_item, session_id)
+        return SessionState.model_validate_json(item["data"]) if item else None
+
+    async def put(self, state: SessionState) -> None:
+        await asyncio.to_thread(self._put_item, state, None)
+
+    async def update(self, session_id: str, mutate: Mutation, attempts: int = 5) -> Optional[SessionState]:
+        from botocore.exceptions import ClientError
+
+        for _ in range(attempts):
+            item = await asyncio.to_thread(self._get_item, session_id)
+            if item is None:
+                return None
+            state = SessionState.model_validate_json(item["data"])
+            mutate(state)
+            try:
+                await asyncio.to_thread(self._put_item, state, int(item["version"]))
+                return state
+            except ClientError as exc:
+                if exc.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+        raise RuntimeError(f"Session {session_id} is being updated concurrently")
+
+    async def aclose(self) -> None:
+        """boto3 resources need no explicit shutdown."""
+
+    def _get_item(self, session_id: str) -> Optional[dict]:
+        item = self._table.get_item(Key={"session_id": session_id}, ConsistentRead=True).get("Item")
+        if item is None or int(item["expires_at"]) < time.time():
+            return None
+        return item
+
+    def _put_item(self, state: SessionState, expected_version: Optional[int]) -> None:
+        kwargs = {}
+        if expected_version is not None:
+            kwargs = {
+                "ConditionExpression": "version = :expected",
+                "ExpressionAttributeValues": {":expected": expected_version},
+            }
+        self._table.put_item(
+            Item={
+                "session_id": state.session_id,
+                "data": state.model_dump_json(),
+                "version": (expected_version or 0) + 1,
+                "expires_at": int(time.time() + self.ttl),
+            },
+            **kwargs,
+        )
+
+
+def create_session_store():
+    """Build the store selected by ``SESSION_STORE`` (memory, sqlite or dynamodb).
+
+    On ECS, where the service runs several tasks behind one load balancer, a
+    per-task store would answer 404 for sessions created on another task, so
+    ``SESSION_STORE`` must be set explicitly there.
+    """
+    backend = os.getenv("SESSION_STORE", "").lower()
+    if not backend and os.getenv("ECS_CONTAINER_METADATA_URI_V4"):
+        raise RuntimeError(
+            "SESSION_STORE is unset on ECS; set it to dynamodb so every task sees the same sessions "
+            "(or to memory for a deliberately single-task service)"
+        )
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_SQLITE_PATH", "sessions.db"))
+    if backend == "dynamodb":
+        return DynamoDBSessionStore(
+            os.getenv("SESSION_DYNAMODB_TABLE", "feel-forward-sessions"),
+            endpoint_url=os.getenv("SESSION_DYNAMODB_ENDPOINT"),
+        )
+    return InMemorySessionStore(max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")))
@@ -1,11 +1,54 @@
 """Agent interfaces for Feel Forward phases."""
-from .phase0 import FactorDiscoveryAgent
-from .phase1 import PreferenceDetailAgent
-from .phase2 import ScenarioBuilderAgent
+from .cache import ResponseCache
+from .phase0 import (
+    CACHE_MAX_BYTES,
+    CACHE_TTL,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    FactorDiscoveryAgent,
+)
+from .phase1 import (
+    CACHE_MAX_BYTES as PHASE1_CACHE_MAX_BYTES,
+    CACHE_TTL as PHASE1_CACHE_TTL,
+    PreferenceDetailAgent,
+)
+from .phase2 import FANOUT_ENABLED, ScenarioBuilderAgent
 from .phase3 import EmotionalReactionAgent
 from .phase4 import InsightSynthesisAgent
+from .prefetch import PREFETCH_ENABLED, Phase1Prefetcher
+
+
+class AgentRegistry:
+    """Application-scoped set of pre-built phase agents.
+
+    The agents are stateless between calls (prompts and lookup tables are
+    module-level constants), so one instance per process can serve every
+    request. Phase 0 answers and per-factor Phase 1 enrichments are memoised
+    in shared response caches, and ``prefetch`` (when enabled) enriches
+    Phase 1 preferences ahead of time.
+    """
+
+    def __init__(self):
+        semantic_cache = None
+        if SEMANTIC_CACHE_ENABLED:
+            from .semantic_cache import SemanticCache
+            semantic_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, ttl=CACHE_TTL)
+        self.factors = FactorDiscoveryAgent(
+            cache=ResponseCache(max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL),
+            semantic_cache=semantic_cache,
+        )
+        self.preferences = PreferenceDetailAgent(
+            cache=ResponseCache(max_bytes=PHASE1_CACHE_MAX_BYTES, ttl=PHASE1_CACHE_TTL),
+        )
+        self.scenarios = ScenarioBuilderAgent(fanout=FANOUT_ENABLED)
+        # Shared by every request, so it must not keep any user's reactions
+        self.reactions = EmotionalReactionAgent(record=False)
+        self.insights = InsightSynthesisAgent()
+        self.prefetch = Phase1Prefetcher(self.preferences) if PREFETCH_ENABLED else None
+
 
 __all__ = [
+    "AgentRegistry",
     "FactorDiscoveryAgent",
     "PreferenceDetailAgent",
     "ScenarioBuilderAgent",
@@ -0,0 +1,51 @@
+"""Per-request latency budgets shared by every agent call in the request.
+
+The API sets a deadline when a request arrives (see ``api.py``); agent LLM
+calls then size their timeouts from what is left of it instead of their
+hard-coded maximums, and skip the LLM entirely when too little is left.
+"""
+from contextvars import ContextVar, Token
+from typing import Optional
+import os
+import time
+
+# Below this many seconds an LLM round-trip is not worth starting
+LLM_MIN_BUDGET = float(os.getenv("LLM_MIN_BUDGET_MS", "800")) / 1000
+# Kept back from every LLM timeout for the fallback and the response itself
+DEADLINE_MARGIN = float(os.getenv("DEADLINE_MARGIN_MS", "250")) / 1000
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of calling the LLM when the request budget is nearly spent."""
+
+
+def set_deadline(budget: Optional[float]) -> Token:
+    """Give the current context ``budget`` seconds from now; None removes the deadline."""
+    return _deadline.set(None if budget is None else time.monotonic() + budget)
+
+
+def reset_deadline(token: Token) -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, or None when no deadline is set."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def llm_timeout(timeout: float) -> float:
+    """Clamp an LLM call's ``timeout`` to the remaining budget.
+
+    Raises :class:`DeadlineExceeded` when less than ``LLM_MIN_BUDGET`` would
+    be left for the call, so the caller can fall back straight away.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    left -= DEADLINE_MARGIN
+    if left < LLM_MIN_BUDGET:
+        raise DeadlineExceeded(f"{max(left, 0):.3f}s left in the request budget")
+    return min(timeout, left)
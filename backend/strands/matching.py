@@ -0,0 +1,62 @@
+"""Multi-pattern substring matching for factor lookup tables."""
+from typing import Dict, Generic, Iterable, Optional, TypeVar
+import json
+import re
+
+T = TypeVar("T")
+
+
+def _trie_pattern(keys: Iterable[str]) -> str:
+    """Build a regex equivalent to ``key1|key2|...`` that shares common prefixes.
+
+    Each trie node becomes one alternation whose branches start with distinct
+    characters, and optional tails are greedy, so the pattern matches the
+    longest key starting at a position and its cost does not grow with the
+    number of keys.
+    """
+    trie: dict = {}
+    for key in keys:
+        node = trie
+        for ch in key:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+
+class FactorMatcher(Generic[T]):
+    """Find the table entry whose key is the longest substring of a factor name.
+
+    Keys are matched case-insensitively anywhere in the text. The table is
+    compiled once into a single prefix-sharing regex, so a lookup costs one
+    scan of the text rather than one ``in`` check per key. Among matches of
+    equal length the earliest wins.
+    """
+
+    def __init__(self, table: Dict[str, T]):
+        self.table = {key.lower(): value for key, value in table.items() if key}
+        pattern = _trie_pattern(self.table)
+        # The lookahead reports a match at every start position, including overlapping ones
+        self._regex = re.compile(f"(?=({pattern}))") if pattern else None
+
+    def match(self, text: str) -> Optional[T]:
+        """Return the value for the longest key contained in ``text``, or None."""
+        if self._regex is None:
+            return None
+        best = ""
+        for found in self._regex.finditer(text.lower()):
+            if len(found.group(1)) > len(best):
+                best = found.group(1)
+        return self.table[best] if best else None
+
+    @classmethod
+    def from_json(cls, path: str) -> "FactorMatcher":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
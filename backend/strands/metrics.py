@@ -0,0 +1,244 @@
+"""Prometheus-style instrumentation of requests, LLM calls and agents.
+
+Instruments are module-level and labelled by phase or route; the API serves
+them in the Prometheus text format on ``/metrics``. Counters that already
+exist elsewhere (cache hits, breaker trips, rate-limit rejections) are not
+duplicated on the hot path: the endpoint passes them to :func:`render` as
+extra families read at scrape time.
+
+With ``METRICS_ENABLED=0`` every ``inc``/``observe`` returns before doing
+any work and ``/metrics`` is not served.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PARSE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+# (name, type, help, [(labels, value), ...]) as accepted by render()
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, *labels: str, value: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Value that goes up and down."""
+
+    kind = "gauge"
+
+    def dec(self, *labels: str, value: float = 1) -> None:
+        self.inc(*labels, value=-value)
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed observations with a running sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels: str) -> int:
+        series = self._values.get(labels)
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = _format_labels(self.labels, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            le = _format_labels(self.labels, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{le} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "feelforward_request_duration_seconds", "HTTP request latency.", ("route", "method", "status"))
+LLM_LATENCY = Histogram(
+    "feelforward_llm_duration_seconds", "LLM call latency including retries, to the last token.",
+    ("phase", "outcome"))
+LLM_TTFT = Histogram(
+    "feelforward_llm_time_to_first_token_seconds", "Time from a streamed LLM call to its first token.",
+    ("phase",))
+PARSE_LATENCY = Histogram(
+    "feelforward_parse_duration_seconds", "Time spent parsing structured LLM replies.",
+    ("phase",), buckets=PARSE_BUCKETS)
+PROMPT_TOKENS = Counter("feelforward_llm_prompt_tokens_total", "Prompt tokens reported by the LLM API.", ("phase",))
+COMPLETION_TOKENS = Counter(
+    "feelforward_llm_completion_tokens_total", "Completion tokens reported by the LLM API.", ("phase",))
+FALLBACKS = Counter("feelforward_fallback_total", "Rule-based fallback activations.", ("phase",))
+UNMATCHED = Counter(
+    "feelforward_unmatched_reactions_total", "Reactions analysed without a matching scenario.", ("phase",))
+LLM_IN_FLIGHT = Gauge("feelforward_llm_in_flight", "LLM calls currently outstanding.", ("phase",))
+
+INSTRUMENTS = (REQUEST_LATENCY, LLM_LATENCY, LLM_TTFT, PARSE_LATENCY, PROMPT_TOKENS, COMPLETION_TOKENS,
+               FALLBACKS, UNMATCHED, LLM_IN_FLIGHT)
+
+
+def record_usage(phase: str, usage: Any) -> None:
+    """Count the tokens of an OpenAI ``usage`` object, if the reply carried one."""
+    if not METRICS_ENABLED or usage is None:
+        return
+    PROMPT_TOKENS.inc(phase, value=getattr(usage, "prompt_tokens", 0) or 0)
+    COMPLETION_TOKENS.inc(phase, value=getattr(usage, "completion_tokens", 0) or 0)
+
+
+class MeteredStream:
+    """Wrap a streamed completion to time its first token and its end.
+
+    ``started`` is when the call was made; the in-flight gauge for ``phase``
+    is released once the stream is exhausted, fails or is closed with
+    :meth:`aclose`. An abandoned async generator only runs its ``finally``
+    when it is garbage collected, so consumers close the stream explicitly.
+    """
+
+    def __init__(self, stream: Any, phase: str, started: float):
+        self._stream = stream
+        self._iterator = None
+        self._phase = phase
+        self._started = started
+        self._first = True
+        self._released = False
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+    def __aiter__(self) -> "MeteredStream":
+        return self
+
+    async def __anext__(self) -> Any:
+        if self._iterator is None:
+            self._iterator = self._stream.__aiter__()
+        try:
+            chunk = await self._iterator.__anext__()
+        except StopAsyncIteration:
+            self._release("ok")
+            raise
+        except BaseException:
+            self._release("error")
+            raise
+        if self._first and chunk.choices and chunk.choices[0].delta.content:
+            LLM_TTFT.observe(time.perf_counter() - self._started, self._phase)
+            self._first = False
+        record_usage(self._phase, getattr(chunk, "usage", None))
+        return chunk
+
+    async def aclose(self) -> None:
+        """Release the call if it is still in flight and close the underlying stream."""
+        self._release("error")
+        # openai's AsyncStream has an async close(); plain async generators have aclose()
+        close = getattr(self._stream, "aclose", None) or getattr(self._stream, "close", None)
+        if close is not None:
+            await close()
+
+    def _release(self, outcome: str) -> None:
+        if self._released:
+            return
+        self._released = True
+        LLM_LATENCY.observe(time.perf_counter() - self._started, self._phase, outcome)
+        LLM_IN_FLIGHT.dec(self._phase)
+
+
+def render(extra: Iterable[Family] = ()) -> str:
+    """Return every instrument and the ``extra`` families in the text format."""
+    lines: List[str] = []
+    for metric in INSTRUMENTS:
+        lines.extend(metric.render())
+    for name, kind, help, samples in extra:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def family(name: str, kind: str, help: str, samples: Dict[str, Optional[float]], label: str) -> Family:
+    """Build a scrape-time family from ``{label_value: value}``, skipping missing values."""
+    return name, kind, help, [({label: key}, value) for key, value in samples.items() if value is not None]
+
+
+def reset() -> None:
+    """Clear every instrument (used by tests)."""
+    for metric in INSTRUMENTS:
+        metric.clear()
@@ -1,37 +1,118 @@
 """Phase 0 - Factor discovery logic."""
-from typing import List
-import json
+from typing import List, Optional
+import asyncio
+import os
 
+from . import metrics, tracing
+from .cache import ResponseCache, make_key, normalize_topic
+from .resilience import achat_completion, chat_completion
+from .structured import json_mode, parse_items
 from .utils import llm_available
-import openai
 
 from models import FactorCategory
 
+MODEL = "gpt-3.5-turbo"
+# Bump whenever FACTOR_PROMPT changes so stale cached answers are not served
+PROMPT_VERSION = "1"
+CACHE_MAX_BYTES = int(os.getenv("PHASE0_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("PHASE0_CACHE_TTL", "86400"))
+# Optional near-duplicate lookup; see strands/semantic_cache.py
+SEMANTIC_CACHE_ENABLED = os.getenv("PHASE0_SEMANTIC_CACHE", "").lower() in ("1", "true", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("PHASE0_SEMANTIC_THRESHOLD", "0.8"))
+
+FACTOR_PROMPT = (
+    "List decision factors for the topic as JSON with format: "
+    "{\"factors\": [{\"category\": str, \"items\": [str]}]}"
+)
+
 
 class FactorDiscoveryAgent:
     """Generate decision factors for a topic."""
 
+    def __init__(self, cache: Optional[ResponseCache] = None, semantic_cache=None):
+        self.cache = cache
+        # Consulted after an exact-match miss; any object with get(text)/set(text, value)
+        self.semantic_cache = semantic_cache
+
+    @tracing.traced("phase0.run", phase="phase0")
     def run(self, topic: str) -> List[FactorCategory]:
         """Return factor categories for the given topic."""
         if llm_available():
-            prompt = (
-                "List decision factors for the topic as JSON with format: "
-                "{\"factors\": [{\"category\": str, \"items\": [str]}]}"
-            )
-            messages = [
-                {"role": "user", "content": f"Topic: {topic}. {prompt}"}
-            ]
+            cached = self._cache_get(topic)
+            if cached is not None:
+                return cached
+            try:
+                resp = chat_completion(
+                    "phase0",
+                    model=MODEL, messages=self._build_messages(topic), timeout=10, **json_mode()
+                )
+                factors = self._parse_factors(resp.choices[0].message.content)
+                self._cache_set(topic, factors)
+                return factors
+            except Exception as exc:
+                return self._fallback_factors(error=exc)
+        return self._fallback_factors()
+
+    @tracing.traced("phase0.run", phase="phase0")
+    async def arun(self, topic: str) -> List[FactorCategory]:
+        """Async variant of :meth:`run` that does not block the event loop."""
+        if llm_available():
+            cached = await self._off_loop(self._cache_get, topic)
+            if cached is not None:
+                return cached
             try:
-                client = openai.OpenAI()
-                resp = client.chat.completions.create(
-                    model="gpt-3.5-turbo", messages=messages, timeout=10
+                resp = await achat_completion(
+                    "phase0",
+                    model=MODEL, messages=self._build_messages(topic), timeout=10, **json_mode()
                 )
-                text = resp.choices[0].message.content
-                data = json.loads(text)
-                return [FactorCategory(**d) for d in data["factors"]]
-            except Exception:
-                pass
-        # Fallback example factors
+                factors = self._parse_factors(resp.choices[0].message.content)
+                await self._off_loop(self._cache_set, topic, factors)
+                return factors
+            except Exception as exc:
+                return self._fallback_factors(error=exc)
+        return self._fallback_factors()
+
+    def _cache_key(self, topic: str) -> str:
+        return make_key(MODEL, PROMPT_VERSION, normalize_topic(topic))
+
+    async def _off_loop(self, func, *args):
+        # Embedding a topic is CPU work (and a custom embedder may scan every entry); keep it off the event loop
+        if self.semantic_cache is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def _cache_get(self, topic: str) -> Optional[List[FactorCategory]]:
+        with tracing.span("phase0.cache_lookup", phase="phase0") as span:
+            cached, source = None, None
+            if self.cache is not None:
+                cached = self.cache.get(self._cache_key(topic))
+                source = "exact" if cached is not None else None
+            if cached is None and self.semantic_cache is not None:
+                cached = self.semantic_cache.get(topic, version=make_key(MODEL, PROMPT_VERSION))
+                source = "semantic" if cached is not None else None
+            span.set_attributes({"cache.hit": cached is not None, "cache.source": source or "none"})
+        return list(cached) if cached is not None else None
+
+    def _cache_set(self, topic: str, factors: List[FactorCategory]) -> None:
+        # Only LLM answers are cached; the fallback is already free
+        if self.cache is not None:
+            size = sum(len(f.model_dump_json()) for f in factors)
+            self.cache.set(self._cache_key(topic), tuple(factors), size)
+        if self.semantic_cache is not None:
+            self.semantic_cache.set(topic, tuple(factors), version=make_key(MODEL, PROMPT_VERSION))
+
+    def _build_messages(self, topic: str) -> List[dict]:
+        return [
+            {"role": "user", "content": f"Topic: {topic}. {FACTOR_PROMPT}"}
+        ]
+
+    def _parse_factors(self, text: str) -> List[FactorCategory]:
+        return parse_items(text, "factors", FactorCategory.model_validate, name="phase0")
+
+    @tracing.traced_fallback("phase0")
+    def _fallback_factors(self) -> List[FactorCategory]:
+        """Fallback example factors."""
+        metrics.FALLBACKS.inc("phase0")
         return [
             FactorCategory(
                 category="Work Environment",
@@ -1,22 +1,23 @@
 """Phase 1 - Preference detailing logic."""
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import json
+import os
 
-import openai
+from . import metrics, tracing
+from .cache import ResponseCache, make_key, normalize_topic
+from .matching import FactorMatcher
+from .resilience import achat_completion, chat_completion
+from .structured import json_mode, parse_items
 from .utils import llm_available
 from models import Preference
 
-class PreferenceDetailAgent:
-    """Interview user to detail and enrich their preferences."""
+MODEL = "gpt-3.5-turbo"
+# Bump whenever SYSTEM_PROMPT changes so stale cached enrichments are not served
+PROMPT_VERSION = "2"
+CACHE_MAX_BYTES = int(os.getenv("PHASE1_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("PHASE1_CACHE_TTL", "86400"))
 
-    def run(self, preferences: List[Preference], topic: Optional[str] = None) -> List[Preference]:
-        """Enrich preferences with importance, limits, and trade-offs."""
-        if not llm_available():
-            return self._fallback_enrichment(preferences)
-        
-        try:
-            # Create a comprehensive prompt for preference detailing
-            system_prompt = """You are a preference detailing assistant helping users clarify their decision criteria.
+SYSTEM_PROMPT = """You are a preference detailing assistant helping users clarify their decision criteria.
             
 For each preference, you should:
 1. Assign an importance score (1-10) based on context
@@ -24,16 +25,163 @@ For each preference, you should:
 3. Define specific limits if applicable
 4. Identify potential trade-offs with other preferences
 
-Return a JSON array of preferences with this exact structure:
-[{
+Return a JSON object with this exact structure:
+{"preferences": [{
     "factor": "original factor name",
     "importance": 1-10,
     "hasLimit": true/false,
     "limit": "specific threshold or range if hasLimit is true, null otherwise",
     "tradeoff": "what they might sacrifice this for, or null"
-}]"""
+}]}"""
+
+# Common factors and their typical importance/limits, matched by longest substring
+FACTOR_DEFAULTS_PATH = os.getenv(
+    "PHASE1_FACTOR_DEFAULTS", os.path.join(os.path.dirname(__file__), "data", "factor_defaults.json")
+)
+FACTOR_DEFAULTS = FactorMatcher.from_json(FACTOR_DEFAULTS_PATH)
+
+# Topics sharing a class share cached enrichments; other topics are their own class
+TOPIC_CLASSES = {
+    "work": ("job", "career", "offer", "employer", "role", "position", "work", "company"),
+    "housing": ("house", "home", "apartment", "rent", "move", "moving", "city", "neighborhood"),
+    "relationship": ("partner", "relationship", "dating", "marriage", "date"),
+}
+
+
+def topic_class(topic: Optional[str]) -> str:
+    """Map a topic to the coarse class used to share enrichments across users."""
+    words = set(normalize_topic(topic or "").split())
+    for name, keywords in TOPIC_CLASSES.items():
+        if words.intersection(keywords):
+            return name
+    return normalize_topic(topic or "life decision")
+
+
+def apply_request(enrichment: Preference, pref: Preference) -> Preference:
+    """Apply what the caller stated in ``pref`` to an enrichment of it.
+
+    The caller's factor name, importance, limit settings and tradeoff win
+    wherever the request states them, whether the enrichment is fresh from
+    the LLM, cached for another user, prefetched or rule-based, so the
+    answer does not depend on which of those produced it.
+    """
+    update = {"factor": pref.factor, "importance": pref.importance}
+    if "hasLimit" in pref.model_fields_set or "limit" in pref.model_fields_set:
+        update.update(hasLimit=pref.hasLimit, limit=pref.limit)
+    if pref.tradeoff is not None:
+        update["tradeoff"] = pref.tradeoff
+    return enrichment.model_copy(update=update)
+
+
+class PreferenceDetailAgent:
+    """Interview user to detail and enrich their preferences."""
+
+    def __init__(self, cache: Optional[ResponseCache] = None):
+        # Per-(topic class, factor) enrichments; only misses are sent to the LLM
+        self.cache = cache
+
+    @tracing.traced("phase1.run", phase="phase1")
+    def run(self, preferences: List[Preference], topic: Optional[str] = None) -> List[Preference]:
+        """Enrich preferences with importance, limits, and trade-offs."""
+        if not llm_available():
+            return self._fallback_enrichment(preferences)
+        
+        cached, missing = self._cache_lookup(preferences, topic)
+        if not missing:
+            return self._merge(preferences, cached)
+        try:
+            resp = chat_completion(
+                "phase1",
+                model=MODEL,
+                messages=self._build_messages([p for _, p in missing], topic),
+                temperature=0.7,
+                timeout=30,
+                **json_mode()
+            )
+            enriched = self._parse_preferences(resp.choices[0].message.content)
+            return self._merge(preferences, {**cached, **self._cache_store(missing, enriched, topic)})
+            
+        except Exception:
+            # Keep the cache hits; only the misses need the fallback
+            return self._merge(preferences, cached)
+
+    @tracing.traced("phase1.run", phase="phase1")
+    async def arun(self, preferences: List[Preference], topic: Optional[str] = None) -> List[Preference]:
+        """Async variant of :meth:`run` that does not block the event loop."""
+        if not llm_available():
+            return self._fallback_enrichment(preferences)
+
+        cached, missing = self._cache_lookup(preferences, topic)
+        if not missing:
+            return self._merge(preferences, cached)
+        try:
+            resp = await achat_completion(
+                "phase1",
+                model=MODEL,
+                messages=self._build_messages([p for _, p in missing], topic),
+                temperature=0.7,
+                timeout=30,
+                **json_mode()
+            )
+            enriched = self._parse_preferences(resp.choices[0].message.content)
+            return self._merge(preferences, {**cached, **self._cache_store(missing, enriched, topic)})
+
+        except Exception:
+            return self._merge(preferences, cached)
+
+    def _cache_key(self, factor: str, topic: Optional[str]) -> str:
+        return make_key(MODEL, PROMPT_VERSION, topic_class(topic), normalize_topic(factor))
+
+    def _cache_lookup(self, preferences: List[Preference], topic: Optional[str]
+                      ) -> Tuple[Dict[int, Preference], List[Tuple[int, Preference]]]:
+        """Split ``preferences`` into cached enrichments and misses, both keyed by position."""
+        if self.cache is None:
+            return {}, list(enumerate(preferences))
+        with tracing.span("phase1.cache_lookup", phase="phase1") as span:
+            cached, missing = {}, []
+            for i, pref in enumerate(preferences):
+                hit = self.cache.get(self._cache_key(pref.factor, topic))
+                if hit is None:
+                    missing.append((i, pref))
+                else:
+                    cached[i] = hit
+            span.set_attributes({"cache.hits": len(cached), "cache.misses": len(missing)})
+        return cached, missing
+
+    def _cache_store(self, missing: List[Tuple[int, Preference]], enriched: List[Preference],
+                     topic: Optional[str]) -> Dict[int, Preference]:
+        """Cache the LLM's enrichments and return them keyed by position in the request.
+
+        Only enrichments matched by factor name are cached. One the LLM
+        reworded is paired by position for this request alone, as a wrong
+        pairing would otherwise be served to the whole topic class.
+        """
+        by_factor = {normalize_topic(p.factor): p for p in enriched}
+        result = {}
+        for j, (i, pref) in enumerate(missing):
+            match = by_factor.get(normalize_topic(pref.factor))
+            if match is None:
+                if len(enriched) == len(missing):
+                    result[i] = enriched[j]
+                continue
+            result[i] = match
+            if self.cache is not None:
+                self.cache.set(self._cache_key(pref.factor, topic), match, len(match.model_dump_json()))
+        return result
+
+    def _merge(self, preferences: List[Preference], enriched: Dict[int, Preference]) -> List[Preference]:
+        """Return enrichments in request order with the caller's answers applied.
+
+        Preferences without an enrichment get the rule-based one instead.
+        """
+        gaps = [pref for i, pref in enumerate(preferences) if i not in enriched]
+        filled = iter(self._fallback_enrichment(gaps) if gaps else ())
+        return [apply_request(enriched[i] if i in enriched else next(filled), pref)
+                for i, pref in enumerate(preferences)]
 
-            user_content = f"""Topic: {topic or 'life decision'}
+    def _build_messages(self, preferences: List[Preference], topic: Optional[str]) -> List[dict]:
+        """Create a comprehensive prompt for preference detailing."""
+        user_content = f"""Topic: {topic or 'life decision'}
             
 User's selected preferences:
 {json.dumps([p.dict() for p in preferences], indent=2)}
@@ -45,77 +193,35 @@ For each preference above, enrich it with:
 - Trade-offs (what might be sacrificed for this)
 
 Consider the topic context when assigning importance and defining limits.
-Return ONLY the JSON array."""
+Return ONLY the JSON object."""
 
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ]
-            
-            client = openai.OpenAI()
-            resp = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7,
-                timeout=30
-            )
-            
-            # Parse the enriched preferences
-            data = json.loads(resp.choices[0].message.content)
-            enriched_prefs = []
-            
-            for pref_data in data:
-                # Ensure we have all required fields
-                enriched_pref = Preference(
-                    factor=pref_data.get("factor", ""),
-                    importance=pref_data.get("importance", 5),
-                    hasLimit=pref_data.get("hasLimit", False),
-                    limit=pref_data.get("limit"),
-                    tradeoff=pref_data.get("tradeoff")
-                )
-                enriched_prefs.append(enriched_pref)
-            
-            return enriched_prefs
-            
-        except Exception as e:
-            # If LLM fails, use fallback
-            return self._fallback_enrichment(preferences)
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_content}
+        ]
+
+    def _parse_preferences(self, text: str) -> List[Preference]:
+        """Parse the enriched preferences returned by the LLM."""
+        return parse_items(text, "preferences", self._to_preference, name="phase1")
+
+    def _to_preference(self, pref_data: dict) -> Preference:
+        # Fill in fields the LLM left out
+        return Preference(
+            factor=pref_data.get("factor", ""),
+            importance=pref_data.get("importance", 5),
+            hasLimit=pref_data.get("hasLimit", False),
+            limit=pref_data.get("limit"),
+            tradeoff=pref_data.get("tradeoff")
+        )
     
+    @tracing.traced_fallback("phase1")
     def _fallback_enrichment(self, preferences: List[Preference]) -> List[Preference]:
         """Provide basic enrichment when LLM is unavailable."""
+        metrics.FALLBACKS.inc("phase1")
         enriched = []
         
-        # Common factors and their typical importance/limits
-        factor_defaults = {
-            # Work-related
-            "salary": {"importance": 8, "hasLimit": True, "limit": "minimum $60k"},
-            "remote work": {"importance": 7, "hasLimit": True, "limit": "at least 3 days remote"},
-            "work-life balance": {"importance": 8, "hasLimit": True, "limit": "max 45 hours/week"},
-            "team culture": {"importance": 7, "hasLimit": False},
-            "career growth": {"importance": 6, "hasLimit": False},
-            
-            # Location-related
-            "cost of living": {"importance": 8, "hasLimit": True, "limit": "max 30% of income on rent"},
-            "commute time": {"importance": 7, "hasLimit": True, "limit": "max 45 minutes"},
-            "weather": {"importance": 5, "hasLimit": False},
-            "proximity to family": {"importance": 6, "hasLimit": True, "limit": "within 2 hour flight"},
-            
-            # Relationship-related
-            "shared values": {"importance": 9, "hasLimit": False},
-            "communication style": {"importance": 8, "hasLimit": False},
-            "life goals alignment": {"importance": 9, "hasLimit": False},
-            "physical attraction": {"importance": 6, "hasLimit": False},
-        }
-        
         for i, pref in enumerate(preferences):
-            factor_lower = pref.factor.lower()
-            
-            # Look for matching defaults
-            defaults = None
-            for key, values in factor_defaults.items():
-                if key in factor_lower:
-                    defaults = values
-                    break
+            defaults = FACTOR_DEFAULTS.match(pref.factor)
             
             if defaults:
                 enriched.append(Preference(
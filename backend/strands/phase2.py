@@ -1,29 +1,19 @@
 """Phase 2 - Scenario generation."""
-from typing import List
-import json
+from contextlib import aclosing
+from functools import partial
+from typing import AsyncIterator, Callable, List, Tuple
+import asyncio
+import os
 import uuid
 
-import openai
+from . import metrics, tracing
+from .streaming import JSONArrayStreamParser
+from .resilience import achat_completion, chat_completion
+from .structured import json_mode, parse_items, parse_object
 from .utils import llm_available
 from models import Preference, Scenario
 
-
-class ScenarioBuilderAgent:
-    """Generate scenarios that test user preferences and trade-offs."""
-
-    def run(self, preferences: List[Preference], topic: str) -> List[Scenario]:
-        if llm_available():
-            return self._generate_llm_scenarios(preferences, topic)
-        else:
-            return self._generate_fallback_scenarios(preferences, topic)
-    
-    def _generate_llm_scenarios(self, preferences: List[Preference], topic: str) -> List[Scenario]:
-        """Generate scenarios using LLM with sophisticated prompting."""
-        try:
-            # Create detailed context for the LLM
-            pref_summary = self._create_preference_summary(preferences)
-            
-            system_prompt = """You are an expert scenario generator for decision-making. Create realistic scenarios that test the user's stated preferences through trade-offs and conflicts.
+SYSTEM_PROMPT = """You are an expert scenario generator for decision-making. Create realistic scenarios that test the user's stated preferences through trade-offs and conflicts.
 
 Generate exactly 5 scenarios that:
 1. One "ideal" scenario that meets most high-importance preferences
@@ -44,42 +34,203 @@ Return ONLY a JSON object with this exact structure:
   ]
 }"""
 
-            user_content = f"""Topic: {topic}
+SINGLE_SCENARIO_PROMPT = """You are an expert scenario generator for decision-making. Write ONE realistic scenario that tests the user's stated preferences.
 
-User's detailed preferences:
-{pref_summary}
+The scenario should:
+- Be realistic and specific to the topic
+- Create emotional tension through trade-offs
+- Be 2-3 sentences that paint a vivid picture
+- Have a compelling title
 
-Create 5 scenarios that will help reveal the user's true priorities through their emotional reactions."""
+Return ONLY a JSON object with this exact structure:
+{"title": "Scenario Title", "text": "Detailed scenario description..."}"""
 
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ]
-            
-            client = openai.OpenAI()
-            resp = client.chat.completions.create(
+# Fan-out mode: one small concurrent request per scenario archetype
+FANOUT_ENABLED = os.getenv("PHASE2_FANOUT", "").lower() in ("1", "true", "yes")
+FANOUT_CONCURRENCY = int(os.getenv("PHASE2_FANOUT_CONCURRENCY", "5"))
+FANOUT_SCENARIO_TIMEOUT = float(os.getenv("PHASE2_SCENARIO_TIMEOUT", "15"))
+
+# (archetype id, brief for the LLM, rule-based builder used if the LLM fails)
+ScenarioPlan = List[Tuple[str, str, Callable[[], Scenario]]]
+
+
+class ScenarioBuilderAgent:
+    """Generate scenarios that test user preferences and trade-offs."""
+
+    def __init__(self, fanout: bool = False, max_concurrency: int = FANOUT_CONCURRENCY,
+                 scenario_timeout: float = FANOUT_SCENARIO_TIMEOUT):
+        self.fanout = fanout
+        self.max_concurrency = max_concurrency
+        self.scenario_timeout = scenario_timeout
+
+    @tracing.traced("phase2.run", phase="phase2")
+    def run(self, preferences: List[Preference], topic: str) -> List[Scenario]:
+        if llm_available():
+            return self._generate_llm_scenarios(preferences, topic)
+        else:
+            return self._generate_fallback_scenarios(preferences, topic)
+
+    @tracing.traced("phase2.run", phase="phase2")
+    async def arun(self, preferences: List[Preference], topic: str) -> List[Scenario]:
+        """Async variant of :meth:`run` that does not block the event loop."""
+        if llm_available():
+            if self.fanout:
+                return await self._agenerate_fanout_scenarios(preferences, topic)
+            return await self._agenerate_llm_scenarios(preferences, topic)
+        else:
+            return self._generate_fallback_scenarios(preferences, topic)
+    
+    async def astream(self, preferences: List[Preference], topic: str) -> AsyncIterator[Scenario]:
+        """Yield scenarios one by one as soon as each is fully generated.
+
+        The LLM output is parsed incrementally, so the first scenario is
+        available long before the whole JSON document has been produced. If
+        the LLM yields nothing usable, the rule-based scenarios are yielded.
+        """
+        error = None
+        if llm_available():
+            emitted = 0
+            try:
+                stream = await achat_completion(
+                    "phase2",
+                    model="gpt-3.5-turbo",
+                    messages=self._build_messages(preferences, topic),
+                    temperature=0.8,
+                    timeout=30,
+                    stream=True,
+                    **json_mode()
+                )
+                parser = JSONArrayStreamParser("scenarios")
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        for s_data in parser.feed(chunk.choices[0].delta.content):
+                            if isinstance(s_data, dict):
+                                emitted += 1
+                                yield self._to_scenario(s_data)
+            except Exception as exc:
+                error = exc
+            # A partially streamed list is still usable; only fall back when empty
+            if emitted:
+                return
+
+        for scenario in self._generate_fallback_scenarios(preferences, topic, error=error):
+            yield scenario
+    
+    def _generate_llm_scenarios(self, preferences: List[Preference], topic: str) -> List[Scenario]:
+        """Generate scenarios using LLM with sophisticated prompting."""
+        try:
+            resp = chat_completion(
+                "phase2",
                 model="gpt-3.5-turbo",
-                messages=messages,
+                messages=self._build_messages(preferences, topic),
                 temperature=0.8,
-                timeout=30
+                timeout=30,
+                **json_mode()
             )
-            
-            data = json.loads(resp.choices[0].message.content)
-            scenarios = []
-            
-            for s_data in data["scenarios"]:
-                scenario = Scenario(
-                    id=s_data.get("id", str(uuid.uuid4())[:8]),
-                    title=s_data.get("title", "Untitled Scenario"),
-                    text=s_data.get("text", "Description not available")
-                )
-                scenarios.append(scenario)
-            
-            return scenarios
+            return self._parse_scenarios(resp.choices[0].message.content)
             
         except Exception as e:
             # Fall back to rule-based generation
             return self._generate_fallback_scenarios(preferences, topic)
+
+    async def _agenerate_llm_scenarios(self, preferences: List[Preference], topic: str) -> List[Scenario]:
+        """Async variant of :meth:`_generate_llm_scenarios`."""
+        try:
+            resp = await achat_completion(
+                "phase2",
+                model="gpt-3.5-turbo",
+                messages=self._build_messages(preferences, topic),
+                temperature=0.8,
+                timeout=30,
+                **json_mode()
+            )
+            return self._parse_scenarios(resp.choices[0].message.content)
+
+        except Exception:
+            return self._generate_fallback_scenarios(preferences, topic)
+
+    async def _agenerate_fanout_scenarios(self, preferences: List[Preference], topic: str) -> List[Scenario]:
+        """Generate each archetype with its own concurrent LLM request.
+
+        Archetypes whose request fails or times out are replaced by their
+        rule-based counterpart; the others keep the LLM result.
+        """
+        plan = self._scenario_plan(preferences, topic)
+        pref_summary = self._create_preference_summary(preferences)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def generate(archetype: str, brief: str) -> Scenario:
+            async with semaphore:
+                return await asyncio.wait_for(
+                    self._agenerate_single_scenario(archetype, brief, pref_summary, topic),
+                    self.scenario_timeout
+                )
+
+        results = await asyncio.gather(
+            *(generate(archetype, brief) for archetype, brief, _ in plan),
+            return_exceptions=True
+        )
+        failed = sum(not isinstance(result, Scenario) for result in results)
+        if failed:
+            metrics.FALLBACKS.inc("phase2", value=failed)
+            tracing.set_attributes(**{"fallback.count": failed})
+        return [
+            result if isinstance(result, Scenario) else fallback()
+            for result, (_, _, fallback) in zip(results, plan)
+        ]
+
+    async def _agenerate_single_scenario(self, archetype: str, brief: str,
+                                         pref_summary: str, topic: str) -> Scenario:
+        resp = await achat_completion(
+            "phase2",
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": SINGLE_SCENARIO_PROMPT},
+                {"role": "user", "content": f"""Topic: {topic}
+
+User's detailed preferences:
+{pref_summary}
+
+Write {brief}."""}
+            ],
+            temperature=0.8,
+            max_tokens=250,
+            timeout=self.scenario_timeout,
+            **json_mode()
+        )
+        return parse_object(
+            resp.choices[0].message.content,
+            lambda data: Scenario(id=archetype, title=data["title"], text=data["text"]),
+            name="phase2",
+        )
+
+    def _build_messages(self, preferences: List[Preference], topic: str) -> List[dict]:
+        """Create detailed context for the LLM."""
+        pref_summary = self._create_preference_summary(preferences)
+
+        user_content = f"""Topic: {topic}
+
+User's detailed preferences:
+{pref_summary}
+
+Create 5 scenarios that will help reveal the user's true priorities through their emotional reactions."""
+
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_content}
+        ]
+
+    def _parse_scenarios(self, text: str) -> List[Scenario]:
+        return parse_items(text, "scenarios", self._to_scenario, name="phase2")
+
+    def _to_scenario(self, s_data: dict) -> Scenario:
+        return Scenario(
+            id=s_data.get("id", str(uuid.uuid4())[:8]),
+            title=s_data.get("title", "Untitled Scenario"),
+            text=s_data.get("text", "Description not available")
+        )
     
     def _create_preference_summary(self, preferences: List[Preference]) -> str:
         """Create a human-readable summary of preferences for the LLM."""
@@ -98,9 +249,26 @@ Create 5 scenarios that will help reveal the user's true priorities through thei
         
         return "\n".join(summary)
     
+    @tracing.traced_fallback("phase2")
     def _generate_fallback_scenarios(self, preferences: List[Preference], topic: str) -> List[Scenario]:
         """Generate scenarios without LLM using preference-based rules."""
-        scenarios = []
+        metrics.FALLBACKS.inc("phase2")
+        return [fallback() for _, _, fallback in self._scenario_plan(preferences, topic)]
+
+    def plan_signature(self, preferences: List[Preference], topic: str) -> tuple:
+        """Summarise everything the scenarios for these preferences depend on.
+
+        That is the archetype briefs and the preference summary, which is
+        exactly what the prompts render; the summary also fixes every factor
+        and limit the rule-based scenarios mention. Scenarios generated from
+        one list can stand in for another only when their signatures are equal.
+        """
+        plan = tuple((archetype, brief) for archetype, brief, _ in self._scenario_plan(preferences, topic))
+        return plan, self._create_preference_summary(preferences)
+
+    def _scenario_plan(self, preferences: List[Preference], topic: str) -> ScenarioPlan:
+        """Decide which scenario archetypes apply to these preferences."""
+        plan = []
         
         # Sort preferences by importance
         sorted_prefs = sorted(preferences, key=lambda p: p.importance, reverse=True)
@@ -108,25 +276,32 @@ Create 5 scenarios that will help reveal the user's true priorities through thei
         medium_importance = [p for p in sorted_prefs if 5 <= p.importance < 8]
         
         # Scenario 1: Ideal (meets most high-importance preferences)
-        scenarios.append(self._create_ideal_scenario(high_importance, topic))
+        plan.append(("ideal", "an \"ideal\" scenario that meets most of their high-importance preferences",
+                     partial(self._create_ideal_scenario, high_importance, topic)))
         
         # Scenario 2: High-stakes trade-off
         if len(high_importance) >= 2:
-            scenarios.append(self._create_tradeoff_scenario(high_importance, topic))
+            pref1, pref2 = high_importance[0], high_importance[1]
+            plan.append(("tradeoff", f"a scenario that forces a trade-off between {pref1.factor} and {pref2.factor}",
+                         partial(self._create_tradeoff_scenario, high_importance, topic)))
         
         # Scenario 3: Challenge limits
         limit_prefs = [p for p in preferences if p.hasLimit and p.limit]
         if limit_prefs:
-            scenarios.append(self._create_challenge_scenario(limit_prefs, topic))
+            pref = limit_prefs[0]
+            plan.append(("challenge", f"a scenario that is appealing overall but breaks their limit on {pref.factor} ('{pref.limit}')",
+                         partial(self._create_challenge_scenario, limit_prefs, topic)))
         
         # Scenario 4: Medium preference focus
         if medium_importance:
-            scenarios.append(self._create_medium_focus_scenario(medium_importance, topic))
+            plan.append(("medium", f"a scenario that is average on their top priorities but excels at {medium_importance[0].factor}",
+                         partial(self._create_medium_focus_scenario, medium_importance, topic)))
         
         # Scenario 5: Wildcard
-        scenarios.append(self._create_wildcard_scenario(preferences, topic))
+        plan.append(("wildcard", "a \"wildcard\" scenario that is unexpected but relevant and does not fit their original criteria",
+                     partial(self._create_wildcard_scenario, preferences, topic)))
         
-        return scenarios
+        return plan
     
     def _create_ideal_scenario(self, high_prefs: List[Preference], topic: str) -> Scenario:
         """Create a scenario that meets most high-importance preferences."""
@@ -1,40 +1,173 @@
 """Phase 3 - Emotional reaction processing and pattern detection."""
-from typing import List, Optional
-import json
+from typing import List, Optional, Tuple
 
-import openai
+from . import metrics, tracing
+from .resilience import achat_completion, chat_completion
+from .structured import json_mode, parse_items
 from .utils import llm_available
 from models import Reaction, Scenario
 
+SYSTEM_PROMPT = """You are an emotional intelligence coach analyzing someone's gut reactions to decision scenarios.
+
+Provide a brief (1-2 sentence) insight about what this emotional reaction reveals about their priorities and decision-making patterns. Focus on:
+- What the intensity levels suggest about their true priorities
+- Any contradictions between stated vs. felt preferences
+- Patterns that might help them understand themselves better
+
+Be empathetic but insightful."""
+
+BATCH_SYSTEM_PROMPT = """You are an emotional intelligence coach analyzing someone's gut reactions to several decision scenarios.
+
+For EACH numbered reaction, provide a brief (1-2 sentence) insight about what it reveals about their priorities and decision-making patterns. Focus on:
+- What the intensity levels suggest about their true priorities
+- Any contradictions between stated vs. felt preferences
+- Patterns across the reactions that might help them understand themselves better
+
+Be empathetic but insightful. Return ONLY a JSON object with one insight per reaction, in the same order:
+{"insights": ["insight for reaction 1", "insight for reaction 2"]}"""
+
+ReactionPair = Tuple[Reaction, Optional[Scenario]]
+
 
 class EmotionalReactionAgent:
-    """Process and analyze emotional reactions to scenarios."""
+    """Process and analyze emotional reactions to scenarios.
 
-    def __init__(self):
+    With ``record`` (the default, for one user's session such as the CLI),
+    :meth:`run` keeps every reaction for :meth:`get_reaction_patterns`. The
+    agent shared between API requests is built with ``record=False`` so no
+    user's reactions are kept or mixed with another's.
+    """
+
+    def __init__(self, record: bool = True):
+        self.record = record
         self._store: List[Reaction] = []
 
     def run(self, reaction: Reaction, scenario: Optional[Scenario] = None) -> str:
         """Process a reaction and provide emotional pattern insights."""
-        self._store.append(reaction)
-        
-        if llm_available() and scenario:
+        if self.record:
+            self._store.append(reaction)
+        return self.analyze(reaction, scenario)
+
+    async def arun(self, reaction: Reaction, scenario: Optional[Scenario] = None) -> str:
+        """Async variant of :meth:`run` that does not block the event loop."""
+        if self.record:
+            self._store.append(reaction)
+        return await self.aanalyze(reaction, scenario)
+
+    @tracing.traced("phase3.analyze", phase="phase3")
+    def analyze(self, reaction: Reaction, scenario: Optional[Scenario] = None) -> str:
+        """Return an insight for a reaction without recording it.
+
+        Safe to call on an agent shared between requests.
+        """
+        if not scenario:
+            return self._unmatched_insight(reaction)
+        if llm_available():
             return self._analyze_reaction_with_llm(reaction, scenario)
         else:
             return self._analyze_reaction_fallback(reaction)
+
+    @tracing.traced("phase3.analyze", phase="phase3")
+    async def aanalyze(self, reaction: Reaction, scenario: Optional[Scenario] = None) -> str:
+        """Async variant of :meth:`analyze`."""
+        if not scenario:
+            return self._unmatched_insight(reaction)
+        if llm_available():
+            return await self._aanalyze_reaction_with_llm(reaction, scenario)
+        else:
+            return self._analyze_reaction_fallback(reaction)
     
+    @tracing.traced("phase3.analyze_batch", phase="phase3")
+    def analyze_batch(self, pairs: List[ReactionPair]) -> List[str]:
+        """Return one insight per ``(reaction, scenario)`` pair using a single LLM call."""
+        with_scenario = [i for i, (_, scenario) in enumerate(pairs) if scenario]
+        insights = [self._rule_insight(reaction) for reaction, _ in pairs]
+        replaced = 0
+        if llm_available() and with_scenario:
+            try:
+                resp = chat_completion(
+                    "phase3",
+                    model="gpt-3.5-turbo",
+                    messages=self._build_batch_messages([pairs[i] for i in with_scenario]),
+                    temperature=0.7,
+                    max_tokens=120 * len(with_scenario),
+                    timeout=20,
+                    **json_mode()
+                )
+                replaced = self._merge_batch_insights(insights, with_scenario, resp.choices[0].message.content)
+            except Exception:
+                pass
+        self._count_batch(len(pairs), len(with_scenario), replaced)
+        return insights
+
+    @tracing.traced("phase3.analyze_batch", phase="phase3")
+    async def aanalyze_batch(self, pairs: List[ReactionPair]) -> List[str]:
+        """Async variant of :meth:`analyze_batch`."""
+        with_scenario = [i for i, (_, scenario) in enumerate(pairs) if scenario]
+        insights = [self._rule_insight(reaction) for reaction, _ in pairs]
+        replaced = 0
+        if llm_available() and with_scenario:
+            try:
+                resp = await achat_completion(
+                    "phase3",
+                    model="gpt-3.5-turbo",
+                    messages=self._build_batch_messages([pairs[i] for i in with_scenario]),
+                    temperature=0.7,
+                    max_tokens=120 * len(with_scenario),
+                    timeout=20,
+                    **json_mode()
+                )
+                replaced = self._merge_batch_insights(insights, with_scenario, resp.choices[0].message.content)
+            except Exception:
+                pass
+        self._count_batch(len(pairs), len(with_scenario), replaced)
+        return insights
+
+    @staticmethod
+    def _count_batch(pairs: int, with_scenario: int, replaced: int) -> None:
+        """Record reactions without a scenario apart from LLM insights that fell back."""
+        if pairs > with_scenario:
+            metrics.UNMATCHED.inc("phase3", value=pairs - with_scenario)
+        if replaced < with_scenario:
+            metrics.FALLBACKS.inc("phase3", value=with_scenario - replaced)
+            tracing.set_attributes(**{"fallback.count": with_scenario - replaced})
+
     def _analyze_reaction_with_llm(self, reaction: Reaction, scenario: Scenario) -> str:
         """Use LLM to analyze the emotional reaction in context."""
         try:
-            system_prompt = """You are an emotional intelligence coach analyzing someone's gut reactions to decision scenarios.
+            resp = chat_completion(
+                "phase3",
+                model="gpt-3.5-turbo",
+                messages=self._build_messages(reaction, scenario),
+                temperature=0.7,
+                max_tokens=150,
+                timeout=10
+            )
+            
+            return resp.choices[0].message.content.strip()
+            
+        except Exception:
+            return self._analyze_reaction_fallback(reaction)
 
-Provide a brief (1-2 sentence) insight about what this emotional reaction reveals about their priorities and decision-making patterns. Focus on:
-- What the intensity levels suggest about their true priorities
-- Any contradictions between stated vs. felt preferences
-- Patterns that might help them understand themselves better
+    async def _aanalyze_reaction_with_llm(self, reaction: Reaction, scenario: Scenario) -> str:
+        """Async variant of :meth:`_analyze_reaction_with_llm`."""
+        try:
+            resp = await achat_completion(
+                "phase3",
+                model="gpt-3.5-turbo",
+                messages=self._build_messages(reaction, scenario),
+                temperature=0.7,
+                max_tokens=150,
+                timeout=10
+            )
 
-Be empathetic but insightful."""
+            return resp.choices[0].message.content.strip()
+
+        except Exception:
+            return self._analyze_reaction_fallback(reaction)
 
-            user_content = f"""Scenario: "{scenario.title}"
+    def _build_messages(self, reaction: Reaction, scenario: Scenario) -> List[dict]:
+        user_content = f"""Scenario: "{scenario.title}"
 Description: {scenario.text}
 
 Emotional Response:
@@ -45,27 +178,57 @@ Emotional Response:
 
 What does this reaction pattern reveal about their decision-making?"""
 
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ]
-            
-            client = openai.OpenAI()
-            resp = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=150,
-                timeout=10
-            )
-            
-            return resp.choices[0].message.content.strip()
-            
-        except Exception:
-            return self._analyze_reaction_fallback(reaction)
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_content}
+        ]
     
+    def _build_batch_messages(self, pairs: List[ReactionPair]) -> List[dict]:
+        blocks = []
+        for i, (reaction, scenario) in enumerate(pairs, 1):
+            blocks.append(f"""Reaction {i}
+Scenario: "{scenario.title}"
+Description: {scenario.text}
+- Excitement level: {reaction.excitement}/10
+- Anxiety level: {reaction.anxiety}/10
+- Body sensation: {reaction.body}
+- Thoughts: {reaction.freeform}""")
+        return [
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": "\n\n".join(blocks)}
+        ]
+
+    def _merge_batch_insights(self, insights: List[str], positions: List[int], text: str) -> int:
+        """Replace fallback insights with the LLM's; keep fallbacks for any it left out.
+
+        Returns how many insights were replaced.
+        """
+        # Blank entries parse to None rather than being dropped, so later insights keep their position
+        llm_insights = parse_items(text, "insights", self._to_insight, name="phase3")
+        replaced = 0
+        for position, insight in zip(positions, llm_insights):
+            if insight:
+                insights[position] = insight
+                replaced += 1
+        return replaced
+
+    @staticmethod
+    def _to_insight(item) -> Optional[str]:
+        return (item.strip() or None) if isinstance(item, str) else None
+
+    @tracing.traced_fallback("phase3")
     def _analyze_reaction_fallback(self, reaction: Reaction) -> str:
         """Analyze reaction without LLM using pattern rules."""
+        metrics.FALLBACKS.inc("phase3")
+        return self._rule_insight(reaction)
+
+    def _unmatched_insight(self, reaction: Reaction) -> str:
+        """Rule-based insight for a reaction with no scenario; not a fallback, as the LLM needs one."""
+        metrics.UNMATCHED.inc("phase3")
+        return self._rule_insight(reaction)
+
+    def _rule_insight(self, reaction: Reaction) -> str:
+        """Pick the rule-based insight for a reaction's excitement and anxiety."""
         excitement_high = reaction.excitement >= 7
         anxiety_high = reaction.anxiety >= 7
         
@@ -86,20 +249,25 @@ What does this reaction pattern reveal about their decision-making?"""
     
     def get_reaction_patterns(self) -> dict:
         """Analyze patterns across all stored reactions."""
-        if not self._store:
+        return self.summarize_patterns(self._store)
+
+    @staticmethod
+    def summarize_patterns(reactions: List[Reaction]) -> dict:
+        """Analyze patterns across the given reactions."""
+        if not reactions:
             return {}
         
-        avg_excitement = sum(r.excitement for r in self._store) / len(self._store)
-        avg_anxiety = sum(r.anxiety for r in self._store) / len(self._store)
+        avg_excitement = sum(r.excitement for r in reactions) / len(reactions)
+        avg_anxiety = sum(r.anxiety for r in reactions) / len(reactions)
         
-        high_excitement_count = sum(1 for r in self._store if r.excitement >= 7)
-        high_anxiety_count = sum(1 for r in self._store if r.anxiety >= 7)
+        high_excitement_count = sum(1 for r in reactions if r.excitement >= 7)
+        high_anxiety_count = sum(1 for r in reactions if r.anxiety >= 7)
         
         return {
             "avg_excitement": round(avg_excitement, 1),
             "avg_anxiety": round(avg_anxiety, 1),
             "high_excitement_scenarios": high_excitement_count,
             "high_anxiety_scenarios": high_anxiety_count,
-            "total_reactions": len(self._store),
+            "total_reactions": len(reactions),
             "emotional_tendency": "positive" if avg_excitement > avg_anxiety else "cautious"
         }
@@ -1,15 +1,60 @@
 """Phase 4 - Deep insight synthesis and pattern recognition."""
-from typing import List, Dict, Optional
+from contextlib import aclosing
+from typing import AsyncIterator, List, Dict, Optional, Sequence, Tuple
 import json
+import math
+import os
+import re
+import threading
 
-import openai
+from . import metrics, tracing
+from .resilience import achat_completion, chat_completion
+from .tokens import count_tokens, truncate_to_tokens
 from .utils import llm_available
 from models import Reaction, Preference, Scenario
 
+SYSTEM_PROMPT = """You are an expert decision-making coach who helps people understand their true priorities through emotional pattern analysis.
+
+Analyze the complete decision journey and provide insights that:
+1. Reveal contradictions between stated and felt preferences
+2. Identify emotional patterns that suggest hidden priorities
+3. Highlight which factors truly drive their decision-making
+4. Point out any blind spots or areas for deeper reflection
+5. Offer 1-2 specific recommendations for how to approach this decision
+
+Be insightful, empathetic, and actionable. Focus on self-awareness rather than prescriptive advice."""
+
+# Token budgets for the journey summary sent to the LLM
+CONTEXT_TOKEN_BUDGET = int(os.getenv("PHASE4_CONTEXT_TOKENS", "1200"))
+FREEFORM_TOKEN_BUDGET = int(os.getenv("PHASE4_FREEFORM_TOKENS", "80"))
+# Only one prompt in this many also measures the unbudgeted context for the savings estimate
+CONTEXT_STATS_SAMPLE = max(1, int(os.getenv("PHASE4_CONTEXT_STATS_SAMPLE", "16")))
+
+_context_stats = {"prompts": 0, "compacted": 0, "sampled": 0, "tokens_full": 0, "tokens_sent": 0}
+_context_lock = threading.Lock()
+
+
+def context_stats() -> Dict[str, int]:
+    """Return how many prompt tokens context budgeting has saved so far.
+
+    ``tokens_saved`` is extrapolated from the sampled prompts to all of them.
+    """
+    with _context_lock:
+        stats = dict(_context_stats)
+    saved = stats["tokens_full"] - stats["tokens_sent"]
+    stats["tokens_saved"] = saved * stats["prompts"] // stats["sampled"] if stats["sampled"] else 0
+    return stats
+
 
 class InsightSynthesisAgent:
     """Synthesize deep insights from the complete decision-making journey."""
 
+    def __init__(self, context_tokens: int = CONTEXT_TOKEN_BUDGET,
+                 freeform_tokens: int = FREEFORM_TOKEN_BUDGET):
+        self.context_tokens = context_tokens
+        self.freeform_tokens = freeform_tokens
+
+    @tracing.traced("phase4.run", phase="phase4")
     def run(self, reactions: List[Reaction], preferences: List[Preference], 
             scenarios: Optional[List[Scenario]] = None, topic: Optional[str] = None) -> str:
         """Generate comprehensive insights from all collected data."""
@@ -17,40 +62,65 @@ class InsightSynthesisAgent:
             return self._generate_llm_insights(reactions, preferences, scenarios, topic)
         else:
             return self._generate_fallback_insights(reactions, preferences)
+
+    @tracing.traced("phase4.run", phase="phase4")
+    async def arun(self, reactions: List[Reaction], preferences: List[Preference],
+                   scenarios: Optional[List[Scenario]] = None, topic: Optional[str] = None) -> str:
+        """Async variant of :meth:`run` that does not block the event loop."""
+        if llm_available():
+            return await self._agenerate_llm_insights(reactions, preferences, scenarios, topic)
+        else:
+            return self._generate_fallback_insights(reactions, preferences)
+    
+    async def astream(self, reactions: List[Reaction], preferences: List[Preference],
+                      scenarios: Optional[List[Scenario]] = None,
+                      topic: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the insight text incrementally as it is generated.
+
+        LLM tokens are relayed as they arrive. Without an API key, or if the
+        request fails before the first token, the fallback insights are
+        yielded one sentence at a time instead.
+        """
+        error = None
+        if llm_available():
+            started = False
+            try:
+                stream = await achat_completion(
+                    "phase4",
+                    model="gpt-3.5-turbo",
+                    messages=self._build_messages(reactions, preferences, scenarios, topic),
+                    temperature=0.7,
+                    max_tokens=500,
+                    timeout=15,
+                    stream=True
+                )
+                async with aclosing(stream):
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            started = True
+                            yield delta
+                return
+            except Exception as exc:
+                # Text already sent cannot be replaced by the fallback
+                if started:
+                    raise
+                error = exc
+
+        sentences = re.split(r"(?<=[.!?])\s+", self._generate_fallback_insights(reactions, preferences, error=error))
+        for i, sentence in enumerate(sentences):
+            yield sentence if i == len(sentences) - 1 else sentence + " "
     
     def _generate_llm_insights(self, reactions: List[Reaction], preferences: List[Preference],
                               scenarios: Optional[List[Scenario]], topic: Optional[str]) -> str:
         """Use LLM to generate sophisticated insights."""
         try:
-            # Build comprehensive context
-            analysis_data = self._build_analysis_context(reactions, preferences, scenarios)
-            
-            system_prompt = """You are an expert decision-making coach who helps people understand their true priorities through emotional pattern analysis.
-
-Analyze the complete decision journey and provide insights that:
-1. Reveal contradictions between stated and felt preferences
-2. Identify emotional patterns that suggest hidden priorities
-3. Highlight which factors truly drive their decision-making
-4. Point out any blind spots or areas for deeper reflection
-5. Offer 1-2 specific recommendations for how to approach this decision
-
-Be insightful, empathetic, and actionable. Focus on self-awareness rather than prescriptive advice."""
-
-            user_content = f"""Decision Topic: {topic or 'Important life choice'}
-
-{analysis_data}
-
-Provide deep insights about this person's decision-making patterns and what their emotional responses reveal about their true priorities."""
-
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_content}
-            ]
-            
-            client = openai.OpenAI()
-            resp = client.chat.completions.create(
+            resp = chat_completion(
+                "phase4",
                 model="gpt-3.5-turbo",
-                messages=messages,
+                messages=self._build_messages(reactions, preferences, scenarios, topic),
                 temperature=0.7,
                 max_tokens=500,
                 timeout=15
@@ -60,26 +130,141 @@ Provide deep insights about this person's decision-making patterns and what thei
             
         except Exception:
             return self._generate_fallback_insights(reactions, preferences)
+
+    async def _agenerate_llm_insights(self, reactions: List[Reaction], preferences: List[Preference],
+                                      scenarios: Optional[List[Scenario]], topic: Optional[str]) -> str:
+        """Async variant of :meth:`_generate_llm_insights`."""
+        try:
+            resp = await achat_completion(
+                "phase4",
+                model="gpt-3.5-turbo",
+                messages=self._build_messages(reactions, preferences, scenarios, topic),
+                temperature=0.7,
+                max_tokens=500,
+                timeout=15
+            )
+
+            return resp.choices[0].message.content.strip()
+
+        except Exception:
+            return self._generate_fallback_insights(reactions, preferences)
+
+    def _build_messages(self, reactions: List[Reaction], preferences: List[Preference],
+                        scenarios: Optional[List[Scenario]], topic: Optional[str]) -> List[dict]:
+        # Build comprehensive context
+        analysis_data = self._build_analysis_context(reactions, preferences, scenarios)
+
+        user_content = f"""Decision Topic: {topic or 'Important life choice'}
+
+{analysis_data}
+
+Provide deep insights about this person's decision-making patterns and what their emotional responses reveal about their true priorities."""
+
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_content}
+        ]
     
     def _build_analysis_context(self, reactions: List[Reaction], preferences: List[Preference],
                                scenarios: Optional[List[Scenario]]) -> str:
-        """Build rich context for LLM analysis."""
+        """Build rich context for LLM analysis within the token budget.
+
+        Long freeform thoughts are truncated to ``freeform_tokens`` each. If
+        the context still exceeds ``context_tokens``, the most important
+        preferences and the most intense reactions are kept and the rest are
+        summarised by count; the aggregate statistics always cover everything.
+        """
+        ranked_prefs = [i for i, p in enumerate(preferences) if p.importance >= 5]
+        context = self._render_context(reactions, preferences, scenarios, ranked_prefs,
+                                       range(len(reactions)), self.freeform_tokens)
+        tokens = count_tokens(context)
+        compacted = tokens > self.context_tokens
+        if compacted:
+            context, tokens = self._compact_context(reactions, preferences, scenarios, ranked_prefs,
+                                                    tokens / max(len(context), 1))
+
+        with _context_lock:
+            sample = _context_stats["prompts"] % CONTEXT_STATS_SAMPLE == 0
+            _context_stats["prompts"] += 1
+            _context_stats["compacted"] += compacted
+        if sample:
+            full = self._render_context(reactions, preferences, scenarios, ranked_prefs,
+                                        range(len(reactions)), freeform_tokens=None)
+            full_tokens = count_tokens(full)
+            with _context_lock:
+                _context_stats["sampled"] += 1
+                _context_stats["tokens_full"] += full_tokens
+                _context_stats["tokens_sent"] += tokens
+        return context
+
+    def _compact_context(self, reactions: List[Reaction], preferences: List[Preference],
+                         scenarios: Optional[List[Scenario]], ranked_prefs: List[int],
+                         tokens_per_char: float) -> Tuple[str, int]:
+        """Greedily keep the most important preferences and most intense reactions that fit.
+
+        Line sizes are estimated from ``tokens_per_char`` of the full render
+        rather than tokenized one by one; only the result is counted exactly,
+        and the budget shrinks by any overshoot until it fits.
+        Returns the context and its token count.
+        """
+        base = self._render_context(reactions, preferences, scenarios, [], [], self.freeform_tokens)
+        candidates = [
+            (preferences[i].importance, 0, i, len(self._preference_line(preferences[i])))
+            for i in ranked_prefs
+        ] + [
+            (max(r.excitement, r.anxiety), 1, i,
+             len("\n".join(self._reaction_lines(i, r, scenarios, self.freeform_tokens))))
+            for i, r in enumerate(reactions)
+        ]
+        candidates = [(rank, kind, i, math.ceil((chars + 1) * tokens_per_char))
+                      for rank, kind, i, chars in candidates]
+        ordered = sorted(candidates, key=lambda c: (-c[0], c[1], c[2]))
+        # A little slack for line breaks and the omission counts changing width
+        target = self.context_tokens - count_tokens(base) - 8
+        while True:
+            context = self._render_context(reactions, preferences, scenarios,
+                                           *self._select(ordered, target), self.freeform_tokens)
+            tokens = count_tokens(context)
+            if tokens <= self.context_tokens or target <= 0:
+                return context, tokens
+            target -= tokens - self.context_tokens
+
+    @staticmethod
+    def _select(ordered: List[Tuple[int, int, int, int]], budget: int) -> Tuple[List[int], List[int]]:
+        kept = ([], [])
+        # Each section may first use half the budget; the second pass hands out what is left
+        shares = [budget // 2, budget // 2]
+        for pass_ in range(2):
+            for _, kind, i, tokens in ordered:
+                if i in kept[kind]:
+                    continue
+                limit = shares[kind] if pass_ == 0 else budget
+                if tokens <= limit:
+                    shares[kind] -= tokens
+                    budget -= tokens
+                    kept[kind].append(i)
+        return sorted(kept[0]), sorted(kept[1])
+
+    def _render_context(self, reactions: List[Reaction], preferences: List[Preference],
+                        scenarios: Optional[List[Scenario]], pref_indexes: Sequence[int],
+                        reaction_indexes: Sequence[int], freeform_tokens: Optional[int]) -> str:
         context_parts = []
         
         # Preference analysis
         high_importance = [p for p in preferences if p.importance >= 8]
         medium_importance = [p for p in preferences if 5 <= p.importance < 8]
+        shown = [preferences[i] for i in pref_indexes]
         
         context_parts.append("STATED PREFERENCES:")
         context_parts.append(f"High Priority ({len(high_importance)} factors):")
-        for pref in high_importance:
-            limit_text = f" (Requirement: {pref.limit})" if pref.hasLimit and pref.limit else ""
-            context_parts.append(f"  - {pref.factor}: {pref.importance}/10{limit_text}")
+        context_parts.extend(self._preference_line(p) for p in shown if p.importance >= 8)
         
         if medium_importance:
             context_parts.append(f"\nMedium Priority ({len(medium_importance)} factors):")
-            for pref in medium_importance:
-                context_parts.append(f"  - {pref.factor}: {pref.importance}/10")
+            context_parts.extend(self._preference_line(p) for p in shown if p.importance < 8)
+        omitted = len(high_importance) + len(medium_importance) - len(shown)
+        if omitted:
+            context_parts.append(f"  ({omitted} lower-priority factors omitted)")
         
         # Emotional pattern analysis
         if reactions:
@@ -97,16 +282,35 @@ Provide deep insights about this person's decision-making patterns and what thei
             
             # Individual reaction details
             context_parts.append("\nREACTION DETAILS:")
-            for i, reaction in enumerate(reactions):
-                scenario_ref = f"Scenario {i+1}" if scenarios and i < len(scenarios) else f"Reaction {i+1}"
-                context_parts.append(f"{scenario_ref}: Excitement {reaction.excitement}/10, Anxiety {reaction.anxiety}/10")
-                if reaction.freeform:
-                    context_parts.append(f"  Thoughts: {reaction.freeform}")
+            for i in reaction_indexes:
+                context_parts.extend(self._reaction_lines(i, reactions[i], scenarios, freeform_tokens))
+            omitted = len(reactions) - len(reaction_indexes)
+            if omitted:
+                context_parts.append(f"({omitted} milder reactions omitted)")
         
         return "\n".join(context_parts)
+
+    def _preference_line(self, pref: Preference) -> str:
+        if pref.importance < 8:
+            return f"  - {pref.factor}: {pref.importance}/10"
+        limit_text = f" (Requirement: {pref.limit})" if pref.hasLimit and pref.limit else ""
+        return f"  - {pref.factor}: {pref.importance}/10{limit_text}"
+
+    def _reaction_lines(self, i: int, reaction: Reaction, scenarios: Optional[List[Scenario]],
+                        freeform_tokens: Optional[int]) -> List[str]:
+        scenario_ref = f"Scenario {i+1}" if scenarios and i < len(scenarios) else f"Reaction {i+1}"
+        lines = [f"{scenario_ref}: Excitement {reaction.excitement}/10, Anxiety {reaction.anxiety}/10"]
+        if reaction.freeform:
+            thoughts = reaction.freeform
+            if freeform_tokens is not None:
+                thoughts = truncate_to_tokens(thoughts, freeform_tokens)
+            lines.append(f"  Thoughts: {thoughts}")
+        return lines
     
+    @tracing.traced_fallback("phase4")
     def _generate_fallback_insights(self, reactions: List[Reaction], preferences: List[Preference]) -> str:
         """Generate insights without LLM using pattern analysis."""
+        metrics.FALLBACKS.inc("phase4")
         insights = []
         
         # Analyze stated vs felt priorities
@@ -0,0 +1,152 @@
+"""Server-side pipeline that runs all five phases for API clients."""
+from typing import Dict, List, Optional
+import asyncio
+import math
+import time
+
+from .agent import AgentRegistry
+from .utils import llm_available
+from models import Journey, Preference, Reaction, Scenario
+
+
+class JourneyPipeline:
+    """Run phases 0-4 in one call, overlapping them where inputs allow.
+
+    Phase 0 runs alongside everything else since the selections are already
+    known. With an LLM, Phase 1 enriches each preference with its own
+    request; once ``speculate_after`` of them have finished, Phase 2 starts
+    on the list as it stands, with the pending preferences still unenriched.
+    The speculative scenarios are kept only if the fully enriched list has
+    the same plan signature, i.e. would render the same prompt; otherwise
+    Phase 2 is rerun.
+    """
+
+    def __init__(self, agents: Optional[AgentRegistry] = None, speculate_after: float = 0.5,
+                 max_concurrency: int = 5):
+        self.agents = agents or AgentRegistry()
+        self.speculate_after = speculate_after
+        self.max_concurrency = max_concurrency
+
+    async def run(self, topic: str, preferences: List[Preference],
+                  reactions: Optional[List[Reaction]] = None) -> Journey:
+        started = time.perf_counter()
+        timings: Dict[str, float] = {}
+
+        factors_task = asyncio.create_task(self._timed(timings, "phase0", self.agents.factors.arun(topic)))
+        try:
+            enriched, scenarios, speculated = await self._preferences_and_scenarios(topic, preferences, timings)
+
+            phase_start = time.perf_counter()
+            reactions = self._match_reactions(reactions or [], scenarios)
+            by_id = {s.id: s for s in scenarios}
+            insights = await self.agents.reactions.aanalyze_batch(
+                [(reaction, by_id.get(reaction.scenario_id)) for reaction in reactions]
+            )
+            patterns = self.agents.reactions.summarize_patterns(reactions)
+            timings["phase3"] = _elapsed_ms(phase_start)
+
+            summary = await self._timed(
+                timings, "phase4", self.agents.insights.arun(reactions, enriched, scenarios, topic)
+            )
+            factors = await factors_task
+        finally:
+            # A failed or cancelled journey must not leave Phase 0 running unobserved
+            await _cancel(factors_task)
+        timings["total"] = _elapsed_ms(started)
+
+        return Journey(
+            topic=topic,
+            factors=factors,
+            preferences=enriched,
+            scenarios=scenarios,
+            reactions=reactions,
+            insights=insights,
+            patterns=patterns,
+            summary=summary,
+            timings=timings,
+            speculative_phase2=speculated,
+        )
+
+    async def _preferences_and_scenarios(self, topic: str, selections: List[Preference],
+                                         timings: Dict[str, float]):
+        if not llm_available() or len(selections) < 2:
+            # Nothing to overlap: the fallbacks are instant and one preference is one request
+            enriched = await self._timed(timings, "phase1", self.agents.preferences.arun(selections, topic))
+            scenarios = await self._timed(timings, "phase2", self.agents.scenarios.arun(enriched, topic))
+            return enriched, scenarios, None
+
+        phase1_start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def enrich(index: int, preference: Preference):
+            async with semaphore:
+                result = await self.agents.preferences.arun([preference], topic)
+            return index, result[0] if result else preference
+
+        done: Dict[int, Preference] = {}
+        quorum = max(1, math.ceil(len(selections) * self.speculate_after))
+        speculative = speculative_inputs = None
+        phase2_start = None
+        tasks = [asyncio.create_task(enrich(i, p)) for i, p in enumerate(selections)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, preference = await next_done
+                done[index] = preference
+                if speculative is None and quorum <= len(done) < len(selections):
+                    speculative_inputs = [done.get(i, p) for i, p in enumerate(selections)]
+                    phase2_start = time.perf_counter()
+                    speculative = asyncio.create_task(self.agents.scenarios.arun(speculative_inputs, topic))
+            enriched = [done[i] for i in range(len(selections))]
+            timings["phase1"] = _elapsed_ms(phase1_start)
+
+            scenarios_agent = self.agents.scenarios
+            if speculative is not None and (
+                scenarios_agent.plan_signature(speculative_inputs, topic)
+                == scenarios_agent.plan_signature(enriched, topic)
+            ):
+                scenarios = await speculative
+                timings["phase2"] = _elapsed_ms(phase2_start)
+                return enriched, scenarios, True
+
+            if speculative is not None:
+                # Wait for the cancellation to land so its LLM call settles the breaker first
+                await _cancel(speculative)
+            scenarios = await self._timed(timings, "phase2", scenarios_agent.arun(enriched, topic))
+            return enriched, scenarios, False if speculative is not None else None
+        finally:
+            await _cancel(*tasks, *([speculative] if speculative is not None else []))
+
+    def _match_reactions(self, reactions: List[Reaction], scenarios: List[Scenario]) -> List[Reaction]:
+        """Point reactions with unknown scenario ids at the scenario in the same position."""
+        ids = {s.id for s in scenarios}
+        matched = []
+        for i, reaction in enumerate(reactions):
+            if reaction.scenario_id not in ids and i < len(scenarios):
+                reaction = reaction.model_copy(update={"scenario_id": scenarios[i].id})
+            matched.append(reaction)
+        return matched
+
+    async def _timed(self, timings: Dict[str, float], phase: str, awaitable):
+        start = time.perf_counter()
+        result = await awaitable
+        timings[phase] = _elapsed_ms(start)
+        return result
+
+
+async def _cancel(*tasks: asyncio.Task) -> None:
+    """Cancel the unfinished ``tasks`` and wait until all of them have ended."""
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+async def run_journey(topic: str, preferences: List[Preference],
+                      reactions: Optional[List[Reaction]] = None,
+                      agents: Optional[AgentRegistry] = None) -> Journey:
+    """Run a complete journey; convenience wrapper around :class:`JourneyPipeline`."""
+    return await JourneyPipeline(agents).run(topic, preferences, reactions)
@@ -0,0 +1,157 @@
+"""Background Phase 1 enrichment started as soon as Phase 0 returns."""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import os
+
+from .deadline import LLM_MIN_BUDGET, remaining, set_deadline
+from .phase1 import PreferenceDetailAgent, apply_request
+from .utils import llm_available
+from models import FactorCategory, Preference
+
+PREFETCH_ENABLED = os.getenv("PHASE1_PREFETCH", "").lower() in ("1", "true", "yes")
+# Spend cap: at most this many factor items are enriched ahead of time per session
+PREFETCH_MAX_ITEMS = int(os.getenv("PHASE1_PREFETCH_MAX_ITEMS", "24"))
+PREFETCH_BATCH_SIZE = int(os.getenv("PHASE1_PREFETCH_BATCH_SIZE", "8"))
+PREFETCH_MAX_SESSIONS = int(os.getenv("PHASE1_PREFETCH_MAX_SESSIONS", "1000"))
+# Global spend cap: items being enriched ahead of time across all sessions at once
+PREFETCH_MAX_IN_FLIGHT = int(os.getenv("PHASE1_PREFETCH_MAX_IN_FLIGHT", "240"))
+
+
+class Phase1Prefetcher:
+    """Enrich every discovered factor item while the user is still choosing.
+
+    :meth:`start` launches one background task per session that enriches
+    the Phase 0 items in batches of ``batch_size`` (one LLM call each), up to
+    ``max_items`` items. Across sessions at most ``max_in_flight`` items are
+    being prefetched at once; a session that finds no room is not prefetched
+    and its Phase 1 request is answered normally. :meth:`take` then answers a Phase 1 request from
+    those results and enriches only items that were not prefetched. Work is
+    cancelled once taken, when the session is evicted (``max_sessions``
+    most recent are kept) and on shutdown. ``stats`` reports how many
+    prefetched items were actually used and how many sessions were skipped.
+
+    Cancelling a prefetch cancels its LLM calls, which their circuit breaker
+    records as failures; cancelled tasks are kept until they have finished
+    unwinding so :meth:`aclose` can wait for them.
+    """
+
+    def __init__(self, agent: PreferenceDetailAgent, max_items: int = PREFETCH_MAX_ITEMS,
+                 batch_size: int = PREFETCH_BATCH_SIZE, max_sessions: int = PREFETCH_MAX_SESSIONS,
+                 max_in_flight: int = PREFETCH_MAX_IN_FLIGHT):
+        self.agent = agent
+        self.max_items = max_items
+        self.batch_size = batch_size
+        self.max_sessions = max_sessions
+        self.max_in_flight = max_in_flight
+        self._in_flight_items = 0
+        self._tasks: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+        self._cancelling: Set[asyncio.Task] = set()
+        self.started = 0
+        self.calls = 0
+        self.items_prefetched = 0
+        self.items_used = 0
+        self.cancelled = 0
+        self.skipped = 0
+
+    def start(self, session_id: str, topic: str, factors: List[FactorCategory]) -> None:
+        """Begin enriching the items of ``factors`` for ``session_id`` in the background."""
+        if not llm_available():
+            # The rule-based fallback is instant; there is nothing to hide
+            return
+        items = list(dict.fromkeys(item for category in factors for item in category.items))
+        if not items:
+            return
+        self.cancel(session_id)
+        # Items count against the global cap until their task, even a cancelled one, has ended
+        items = items[:min(self.max_items, self.max_in_flight - self._in_flight_items)]
+        if not items:
+            self.skipped += 1
+            return
+        task = asyncio.create_task(self._enrich(items, topic))
+        self._in_flight_items += len(items)
+        task.add_done_callback(lambda _, n=len(items): self._release(n))
+        self._tasks[session_id] = task
+        self.started += 1
+        while len(self._tasks) > self.max_sessions:
+            self.cancel(next(iter(self._tasks)))
+
+    async def take(self, session_id: str, preferences: List[Preference],
+                   topic: Optional[str] = None) -> List[Preference]:
+        """Return enriched ``preferences``, reusing prefetched results where possible."""
+        task = self._tasks.pop(session_id, None)
+        cached: Dict[str, Preference] = {}
+        if task is not None:
+            # Wait for the prefetch only while this request could still afford its own LLM call
+            left = remaining()
+            try:
+                cached = await asyncio.wait_for(
+                    asyncio.shield(task), None if left is None else max(left - LLM_MIN_BUDGET, 0)
+                )
+            except Exception:
+                if not task.done():
+                    self._cancel(task)
+                # Let the cancelled LLM calls settle before this request makes its own
+                await asyncio.gather(task, return_exceptions=True)
+                cached = {}
+
+        result: Dict[int, Preference] = {}
+        missing = []
+        for i, pref in enumerate(preferences):
+            hit = cached.get(pref.factor.lower())
+            if hit is None:
+                missing.append((i, pref))
+            else:
+                # Prefetched with a placeholder importance; the submitted fields win
+                result[i] = apply_request(hit, pref)
+        if missing:
+            # The agent answers every preference, falling back per item if the LLM skips one
+            enriched = await self.agent.arun([p for _, p in missing], topic)
+            result.update(zip((i for i, _ in missing), enriched))
+        self.items_used += len(preferences) - len(missing)
+        return [result[i] for i in range(len(preferences))]
+
+    def cancel(self, session_id: str) -> None:
+        task = self._tasks.pop(session_id, None)
+        if task is not None and not task.done():
+            self._cancel(task)
+
+    async def aclose(self) -> None:
+        """Cancel every outstanding prefetch and wait until all of them have ended."""
+        for session_id in list(self._tasks):
+            self.cancel(session_id)
+        await asyncio.gather(*self._cancelling, return_exceptions=True)
+
+    def _release(self, items: int) -> None:
+        self._in_flight_items -= items
+
+    def _cancel(self, task: asyncio.Task) -> None:
+        task.cancel()
+        self.cancelled += 1
+        self._cancelling.add(task)
+        task.add_done_callback(self._cancelling.discard)
+
+    async def _enrich(self, items: List[str], topic: str) -> Dict[str, Preference]:
+        # Runs beyond the Phase 0 request, so its deadline does not apply
+        set_deadline(None)
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        self.calls += len(batches)
+        results = await asyncio.gather(*(
+            self.agent.arun([Preference(factor=item, importance=5) for item in batch], topic)
+            for batch in batches
+        ))
+        enriched = {p.factor.lower(): p for batch in results for p in batch}
+        self.items_prefetched += len(enriched)
+        return enriched
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.started,
+            "in_flight": sum(not t.done() for t in self._tasks.values()),
+            "in_flight_items": self._in_flight_items,
+            "skipped": self.skipped,
+            "llm_calls": self.calls,
+            "items_prefetched": self.items_prefetched,
+            "items_used": self.items_used,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,358 @@
+"""Retries, hedged requests and circuit breaking around LLM calls.
+
+Every agent sends its chat completions through :func:`chat_completion` or
+:func:`achat_completion`, which apply the policy of a per-phase
+:class:`ResilientCaller`:
+
+* Failed attempts are retried with exponential backoff and full jitter, but
+  only while the caller's ``timeout`` budget (already clamped to the
+  request deadline) leaves room for another round-trip, so retries never
+  extend the worst-case latency an agent already accepted. Each attempt is
+  cut off when the budget runs out, and the OpenAI clients do not retry on
+  their own.
+* With hedging enabled, a second identical request is sent once the first
+  has been outstanding longer than the recent p95 latency; whichever
+  finishes first wins.
+* A circuit breaker opens when the recent error rate spikes. While open,
+  calls raise :class:`CircuitOpenError` immediately and the agents go
+  straight to their rule-based fallbacks instead of waiting for timeouts.
+"""
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+import asyncio
+import os
+import random
+import threading
+import time
+
+import openai
+
+from . import metrics, tracing
+from .deadline import LLM_MIN_BUDGET, llm_timeout
+from .utils import LLM_TIMEOUT, get_async_llm_client, get_llm_client
+
+T = TypeVar("T")
+
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.2"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "2"))
+LLM_HEDGE = os.getenv("LLM_HEDGE", "").lower() in ("1", "true", "yes")
+# Latency samples needed before the p95 is trusted as a hedging threshold
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+# Errors worth another attempt; anything else (bad request, auth) fails at once
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the LLM while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Error-rate circuit breaker over the last ``window`` attempts.
+
+    Opens when at least ``min_calls`` outcomes are recorded and the share of
+    failures reaches ``error_rate``. After ``cooldown`` seconds one probe is
+    let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, error_rate: float = LLM_BREAKER_ERROR_RATE, window: int = LLM_BREAKER_WINDOW,
+                 min_calls: int = LLM_BREAKER_MIN_CALLS, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half-open" if self._probing else "open"
+
+    def allow(self) -> bool:
+        """Return True if a call may go ahead."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.cooldown:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release(self) -> None:
+        """Give up a half-open probe that ended without an outcome, e.g. when cancelled."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, success: bool) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                if self._probing:
+                    self._probing = False
+                    if success:
+                        self._opened_at = None
+                        self._outcomes.clear()
+                    else:
+                        self._opened_at = time.monotonic()
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._opened_at = time.monotonic()
+                self.trips += 1
+
+
+class ResilientCaller:
+    """Apply retries, optional hedging and a circuit breaker to one kind of call."""
+
+    def __init__(self, retries: int = LLM_RETRIES, backoff_base: float = LLM_BACKOFF_BASE,
+                 backoff_max: float = LLM_BACKOFF_MAX, hedge: bool = LLM_HEDGE,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self.calls = 0
+        self.retried = 0
+        self.hedged = 0
+        self.failures = 0
+
+    def p95(self) -> Optional[float]:
+        """Recent p95 latency in seconds, once enough samples exist."""
+        if len(self._latencies) < self.hedge_min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    async def acall(self, fn: Callable[[float], Awaitable[T]], timeout: float = LLM_TIMEOUT,
+                    hedge: Optional[bool] = None) -> T:
+        """Await ``fn(remaining_timeout)`` under this caller's policy."""
+        hedge = self.hedge if hedge is None else hedge
+        deadline = time.monotonic() + timeout
+        self.calls += 1
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit breaker is open")
+            probe = self.breaker.state == "half-open"
+            started = time.monotonic()
+            try:
+                with tracing.span("llm.attempt", **{"llm.attempt": attempt, "llm.hedge": hedge}):
+                    # The client's own timeout bounds each read, not the whole attempt
+                    attempt_call = self._ahedged(fn, deadline) if hedge else fn(deadline - started)
+                    result = await asyncio.wait_for(attempt_call, deadline - started)
+            except Exception as exc:
+                self.breaker.record(False)
+                delay = self._backoff(attempt)
+                if (not isinstance(exc, RETRYABLE_ERRORS) or attempt == self.retries
+                        or time.monotonic() + delay + LLM_MIN_BUDGET >= deadline):
+                    self.failures += 1
+                    raise
+                self.retried += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancellation (a caller's wait_for, a client disconnect) says nothing about the
+                # upstream; it only has to free the half-open probe slot it may be holding
+                if probe:
+                    self.breaker.release()
+                raise
+            self.breaker.record(True)
+            if not hedge:
+                self._latencies.append(time.monotonic() - started)
+            return result
+
+    def call(self, fn: Callable[[float], T], timeout: float = LLM_TIMEOUT) -> T:
+        """Synchronous form of :meth:`acall`; retries and circuit breaking only."""
+        deadline = time.monotonic() + timeout
+        self.calls += 1
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit breaker is open")
+            probe = self.breaker.state == "half-open"
+            started = time.monotonic()
+            try:
+                with tracing.span("llm.attempt", **{"llm.attempt": attempt}):
+                    result = fn(deadline - started)
+            except Exception as exc:
+                self.breaker.record(False)
+                delay = self._backoff(attempt)
+                if (not isinstance(exc, RETRYABLE_ERRORS) or attempt == self.retries
+                        or time.monotonic() + delay + LLM_MIN_BUDGET >= deadline):
+                    self.failures += 1
+                    raise
+                self.retried += 1
+                attempt += 1
+                time.sleep(delay)
+                continue
+            except BaseException:
+                # Cancellation (a caller's wait_for, a client disconnect) says nothing about the
+                # upstream; it only has to free the half-open probe slot it may be holding
+                if probe:
+                    self.breaker.release()
+                raise
+            self.breaker.record(True)
+            self._latencies.append(time.monotonic() - started)
+            return result
+
+    async def _ahedged(self, fn: Callable[[float], Awaitable[T]], deadline: float) -> T:
+        threshold = self.p95()
+        started = time.monotonic()
+        first = asyncio.ensure_future(fn(deadline - started))
+        if threshold is None or threshold >= deadline - time.monotonic():
+            result = await first
+            self._latencies.append(time.monotonic() - started)
+            return result
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if done and first.exception() is None:
+                self._latencies.append(time.monotonic() - started)
+            if not done:
+                # Raced attempts are not sampled: the winner of a race is faster than either
+                # request alone and would drag the p95 that triggers hedging down
+                self.hedged += 1
+                tracing.current_span().add_event("llm.hedged")
+                tasks.add(asyncio.ensure_future(fn(deadline - time.monotonic())))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "calls": self.calls,
+            "retried": self.retried,
+            "hedged": self.hedged,
+            "failures": self.failures,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "breaker": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "breaker_rejected": self.breaker.rejected,
+        }
+
+
+_callers: Dict[str, ResilientCaller] = {}
+_callers_lock = threading.Lock()
+
+
+def get_caller(name: str) -> ResilientCaller:
+    """Return the process-wide caller for ``name`` (one per agent phase)."""
+    caller = _callers.get(name)
+    if caller is None:
+        with _callers_lock:
+            caller = _callers.setdefault(name, ResilientCaller())
+    return caller
+
+
+def caller_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: caller.stats() for name, caller in _callers.items()}
+
+
+def reset_callers() -> None:
+    """Forget all breaker and latency state (used by tests)."""
+    _callers.clear()
+
+
+def _trace_usage(usage: Any) -> None:
+    if usage is not None:
+        tracing.set_attributes(**{"llm.prompt_tokens": getattr(usage, "prompt_tokens", None),
+                                  "llm.completion_tokens": getattr(usage, "completion_tokens", None)})
+
+
+def chat_completion(name: str, **kwargs: Any) -> Any:
+    """Create a chat completion on the pooled sync client under ``name``'s policy.
+
+    ``timeout`` is clamped to the request's remaining budget; see
+    :func:`strands.deadline.llm_timeout`.
+    """
+    timeout = llm_timeout(kwargs.pop("timeout", LLM_TIMEOUT))
+    started = time.perf_counter()
+    outcome = "error"
+    metrics.LLM_IN_FLIGHT.inc(name)
+    try:
+        with tracing.span("llm.chat_completion", phase=name, **{"llm.model": kwargs.get("model"),
+                                                                "llm.timeout": timeout}):
+            resp = get_caller(name).call(
+                lambda remaining: get_llm_client().chat.completions.create(timeout=remaining, **kwargs),
+                timeout,
+            )
+            _trace_usage(getattr(resp, "usage", None))
+        outcome = "ok"
+    finally:
+        metrics.LLM_LATENCY.observe(time.perf_counter() - started, name, outcome)
+        metrics.LLM_IN_FLIGHT.dec(name)
+    metrics.record_usage(name, getattr(resp, "usage", None))
+    return resp
+
+
+async def achat_completion(name: str, **kwargs: Any) -> Any:
+    """Create a chat completion on the pooled async client under ``name``'s policy.
+
+    Streaming requests are retried and circuit-broken but never hedged, since
+    only the stream's opening is covered by the call. They are returned
+    wrapped in :class:`strands.metrics.MeteredStream`, which times the first
+    token and keeps the call in flight until the stream ends or is closed;
+    callers close it with ``aclose()`` when they stop reading early.
+    """
+    timeout = llm_timeout(kwargs.pop("timeout", LLM_TIMEOUT))
+    stream = bool(kwargs.get("stream"))
+    if stream and metrics.METRICS_ENABLED:
+        kwargs.setdefault("stream_options", {"include_usage": True})
+    started = time.perf_counter()
+    metrics.LLM_IN_FLIGHT.inc(name)
+    try:
+        # For streams the span covers opening the stream, not reading it
+        with tracing.span("llm.chat_completion", phase=name, **{"llm.model": kwargs.get("model"),
+                                                                "llm.timeout": timeout, "llm.stream": stream}):
+            resp = await get_caller(name).acall(
+                lambda remaining: get_async_llm_client().chat.completions.create(timeout=remaining, **kwargs),
+                timeout,
+                hedge=False if stream else None,
+            )
+            _trace_usage(getattr(resp, "usage", None))
+    except BaseException:
+        metrics.LLM_LATENCY.observe(time.perf_counter() - started, name, "error")
+        metrics.LLM_IN_FLIGHT.dec(name)
+        raise
+    if stream:
+        return metrics.MeteredStream(resp, name, started)
+    metrics.LLM_LATENCY.observe(time.perf_counter() - started, name, "ok")
+    metrics.LLM_IN_FLIGHT.dec(name)
+    metrics.record_usage(name, getattr(resp, "usage", None))
+    return resp
@@ -0,0 +1,225 @@
+"""Embedding-similarity cache for near-duplicate topics."""
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .cache import normalize_topic
+
+STOPWORDS = frozenset(
+    "a an and about between for from i in into is it my of on or should the to "
+    "what whether which with".split()
+)
+
+
+def stem(word: str) -> str:
+    """Reduce a word to a crude stem so ``buy``/``buying`` and ``cities``/``city`` share a feature.
+
+    Strips plurals, then an ``-ing``/``-ed``/``-ment`` ending (undoubling a
+    final consonant) and a silent ``e``; the stems are not words, only keys.
+    """
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes", "zes")):
+        word = word[:-2]
+    elif len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix in ("ment", "ing", "ed"):
+        if len(word) > len(suffix) + 2 and word.endswith(suffix):
+            word = word[:-len(suffix)]
+            if word[-1] == word[-2] and word[-1] in "bdgmnprt":
+                word = word[:-1]
+            break
+    if len(word) > 3 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+class HashingEmbedder:
+    """Deterministic, CPU-only text embedder using the hashing trick.
+
+    Words and their character trigrams are hashed into a fixed number of
+    signed buckets, so no model download or fitting is needed and the same
+    text always maps to the same unit vector.
+
+    The similarity is lexical, not semantic: rephrasings that differ only in
+    stopwords, word forms, case or punctuation ("should I buy a house" /
+    "buying houses") score 1.0, while topics differing in one content word
+    ("buying a house" / "buying a car") score about 0.5-0.7. Synonyms
+    ("choosing a new job" / "picking a job offer", about 0.4) need a
+    model-backed embedder passed to :class:`SemanticCache`.
+    """
+
+    def __init__(self, dim: int = 128, ngram: int = 3, char_weight: float = 0.5):
+        self.dim = dim
+        self.ngram = ngram
+        self.char_weight = char_weight
+
+    def words(self, text: str) -> List[str]:
+        """Stemmed content words of ``text``, the features its embedding is built from."""
+        return [stem(w) for w in normalize_topic(text).split() if w not in STOPWORDS]
+
+    def __call__(self, text: str) -> np.ndarray:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for word in self.words(text):
+            self._add(vec, word, 1.0)
+            padded = f"<{word}>"
+            for i in range(len(padded) - self.ngram + 1):
+                self._add(vec, padded[i:i + self.ngram], self.char_weight)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _add(self, vec: np.ndarray, feature: str, weight: float) -> None:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vec[h % self.dim] += weight if h & 0x80000000 else -weight
+
+
+class SemanticCache:
+    """Nearest-neighbour cache over unit-normalised topic embeddings.
+
+    Embeddings live in one preallocated float32 matrix. When ``max_entries``
+    is reached the oldest rows are overwritten in ring-buffer order. Entries
+    expire after ``ttl`` seconds and only match lookups made with the same
+    ``version`` (e.g. the model and prompt version), like the keys of
+    ``ResponseCache``.
+
+    With an embedder that exposes ``words(text)``, as :class:`HashingEmbedder`
+    does, rows are indexed by content word and a lookup only scores the rows
+    sharing one of the query's rarest words: a few hundred microseconds at
+    100k entries. Other embedders are scanned in full, O(entries), so async
+    callers run lookups in a worker thread. Scoring runs outside the lock,
+    and a match is re-checked under it before its value is returned.
+    """
+
+    def __init__(self, embedder: Optional[Callable[[str], np.ndarray]] = None,
+                 threshold: float = 0.8, max_entries: int = 100_000, dim: int = 128,
+                 ttl: Optional[float] = 3600):
+        self.embedder = embedder or HashingEmbedder(dim=dim)
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._words: Optional[Callable[[str], Sequence[str]]] = getattr(self.embedder, "words", None)
+        self._postings: Dict[str, Set[int]] = {}
+        self._row_words: List[Tuple[str, ...]] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._expires: Optional[np.ndarray] = None
+        self._versions: Optional[np.ndarray] = None
+        self._version_ids: Dict[str, int] = {}
+        self._values: List[Any] = []
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text: str, version: str = "") -> Optional[Any]:
+        """Return the value of the most similar live topic of ``version`` above the threshold."""
+        query = self.embedder(text)
+        matches = self._search(text, query, 1, version)
+        with self._lock:
+            # The row may have been overwritten while it was scored without the lock
+            if matches and matches[0][0] >= self.threshold and self._matches(matches[0][1], query, version):
+                self.hits += 1
+                return self._values[matches[0][1]]
+            self.misses += 1
+            return None
+
+    def top_k(self, text: str, k: int = 5, version: str = "") -> List[Tuple[float, int]]:
+        """Return ``(cosine similarity, row)`` pairs of the ``k`` nearest live topics.
+
+        With a word index, only topics sharing a content word with ``text`` are ranked.
+        """
+        return self._search(text, self.embedder(text), k, version, prefix=False)
+
+    def _search(self, text: str, query: np.ndarray, k: int, version: str,
+                prefix: bool = True) -> List[Tuple[float, int]]:
+        words = self._words(text) if self._words is not None else None
+        with self._lock:
+            version_id = self._version_ids.get(version)
+            if not self._size or version_id is None:
+                return []
+            rows = self._candidates(words, prefix) if words is not None else None
+            matrix, expires, versions, size = self._matrix, self._expires, self._versions, self._size
+        # Matrix products release the GIL, so lookups from worker threads run in parallel
+        index = slice(0, size) if rows is None else rows
+        scores = matrix[index] @ query
+        stale = (expires[index] < time.monotonic()) | (versions[index] != version_id)
+        scores[stale] = -np.inf
+        k = min(k, len(scores) - int(stale.sum()))
+        if k <= 0:
+            return []
+        if k == 1:
+            best = [int(scores.argmax())]
+        else:
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+        return [(float(scores[i]), int(i) if rows is None else int(rows[i])) for i in best]
+
+    def _candidates(self, words: Sequence[str], prefix: bool) -> np.ndarray:
+        postings = sorted((self._postings.get(word, ()) for word in set(words)), key=len)
+        if prefix:
+            # A row lacking m of the query's n words scores about sqrt(1 - m/n) at most, so a row
+            # reaching the threshold holds at least one of the query's n(1 - t^2) + 1 rarest words
+            postings = postings[:int(len(postings) * (1 - max(self.threshold, 0) ** 2)) + 1]
+        rows = set().union(*postings)
+        return np.fromiter(rows, dtype=np.int64, count=len(rows))
+
+    def _matches(self, row: int, query: np.ndarray, version: str) -> bool:
+        return (self._versions[row] == self._version_ids.get(version)
+                and self._expires[row] >= time.monotonic()
+                and float(self._matrix[row] @ query) >= self.threshold)
+
+    def set(self, text: str, value: Any, version: str = "") -> None:
+        """Add ``text`` and its value to the cache under ``version``."""
+        vec = np.asarray(self.embedder(text), dtype=np.float32)
+        words = tuple(set(self._words(text))) if self._words is not None else ()
+        expires = time.monotonic() + self.ttl if self.ttl else float("inf")
+        with self._lock:
+            if self._matrix is None or (self._next >= self._matrix.shape[0]
+                                        and self._matrix.shape[0] < self.max_entries):
+                self._grow(vec.shape[0])
+            row = self._next
+            self._matrix[row] = vec
+            self._expires[row] = expires
+            self._versions[row] = self._version_ids.setdefault(version, len(self._version_ids))
+            if row < len(self._values):
+                self._unindex(row)
+                self._values[row] = value
+                self._row_words[row] = words
+            else:
+                self._values.append(value)
+                self._row_words.append(words)
+            for word in words:
+                self._postings.setdefault(word, set()).add(row)
+            self._size = max(self._size, row + 1)
+            self._next = (row + 1) % self.max_entries
+
+    def _unindex(self, row: int) -> None:
+        for word in self._row_words[row]:
+            rows = self._postings[word]
+            rows.discard(row)
+            if not rows:
+                del self._postings[word]
+
+    def _grow(self, dim: int) -> None:
+        rows = min(self._matrix.shape[0] * 2 if self._matrix is not None else 1024, self.max_entries)
+        matrix = np.zeros((rows, dim), dtype=np.float32)
+        expires = np.zeros(rows, dtype=np.float64)
+        versions = np.zeros(rows, dtype=np.int32)
+        if self._matrix is not None:
+            matrix[:self._size] = self._matrix[:self._size]
+            expires[:self._size] = self._expires[:self._size]
+            versions[:self._size] = self._versions[:self._size]
+        self._matrix, self._expires, self._versions = matrix, expires, versions
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": self._size,
+            "threshold": self.threshold,
+        }
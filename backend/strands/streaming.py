@@ -0,0 +1,78 @@
+"""Incremental parsing of JSON produced token by token by an LLM."""
+import json
+from typing import Iterator, List, Optional
+
+
+class JSONArrayStreamParser:
+    """Yield each object/array element of a JSON array as soon as it is complete.
+
+    The parser is fed arbitrary text chunks and tracks string/escape state
+    and bracket depth character by character, so it never re-scans text it
+    has already seen. It targets the array stored under ``key`` in the
+    top-level object (e.g. ``{"scenarios": [...]}``); with ``key=None`` the
+    first array encountered is used, which also covers a bare ``[...]``.
+    Any preamble before the JSON (such as a markdown fence) is skipped.
+    """
+
+    def __init__(self, key: Optional[str] = "scenarios"):
+        self.key = key
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._last_string: Optional[str] = None
+        self._key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._element: List[str] = []
+        self._element_depth: Optional[int] = None
+        self.done = False
+
+    def feed(self, chunk: str) -> Iterator[object]:
+        """Consume ``chunk`` and yield every element completed by it."""
+        for ch in chunk:
+            if self.done:
+                return
+            if self._element_depth is not None:
+                self._element.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = "".join(self._string)
+                else:
+                    self._string.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string = []
+            elif ch == ":":
+                self._key = self._last_string
+            elif ch == ",":
+                self._key = None
+            elif ch in "{[":
+                self._depth += 1
+                if self._array_depth is None and ch == "[" and self._is_target():
+                    self._array_depth = self._depth
+                elif self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._element = [ch]
+                    self._element_depth = self._depth
+            elif ch in "}]":
+                if self._element_depth is not None and self._depth == self._element_depth:
+                    text = "".join(self._element)
+                    self._element = []
+                    self._element_depth = None
+                    yield json.loads(text)
+                if self._array_depth is not None and self._depth == self._array_depth and ch == "]":
+                    self.done = True
+                self._depth -= 1
+
+    def _is_target(self) -> bool:
+        if self.key is None:
+            return True
+        # Only arrays that are the value of ``key`` directly inside the root object
+        return self._depth == 2 and self._key == self.key
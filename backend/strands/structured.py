@@ -0,0 +1,154 @@
+"""Tolerant parsing of JSON returned by the LLM into API models.
+
+Agents request JSON mode (see :func:`json_mode`) and hand the raw reply to
+:func:`parse_items` or :func:`parse_object`. These accept replies wrapped
+in markdown fences or surrounded by chatter, and when a reply is cut off
+mid-array they keep every element that arrived complete. Elements that do
+not validate are dropped individually instead of discarding the whole
+reply. Outcomes are counted per agent in :func:`parse_stats`.
+"""
+from typing import Any, Callable, Dict, List, TypeVar
+import json
+import os
+import re
+import threading
+import time
+
+from pydantic import ValidationError
+
+from . import metrics
+from .streaming import JSONArrayStreamParser
+
+T = TypeVar("T")
+
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "1").lower() in ("1", "true", "yes")
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)(?:```|$)", re.DOTALL)
+# What a malformed element can raise while being turned into a model
+_ELEMENT_ERRORS = (ValidationError, TypeError, ValueError, KeyError, AttributeError)
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a reply contains nothing usable."""
+
+
+class ParseStats:
+    """Per-agent counters of structured-output outcomes."""
+
+    def __init__(self):
+        self.replies = 0
+        self.clean = 0
+        self.salvaged = 0
+        self.failed = 0
+        self.items_dropped = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "replies": self.replies,
+            "clean": self.clean,
+            "salvaged": self.salvaged,
+            "failed": self.failed,
+            "items_dropped": self.items_dropped,
+            "failure_rate": round(self.failed / self.replies, 3) if self.replies else 0.0,
+        }
+
+
+_stats: Dict[str, ParseStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _stats_for(name: str) -> ParseStats:
+    with _stats_lock:
+        return _stats.setdefault(name, ParseStats())
+
+
+def parse_stats() -> Dict[str, Dict[str, Any]]:
+    """Return structured-output counters keyed by agent name."""
+    return {name: stats.as_dict() for name, stats in _stats.items()}
+
+
+def json_mode() -> Dict[str, Any]:
+    """Request arguments asking the model for a JSON object (``LLM_JSON_MODE``)."""
+    return {"response_format": {"type": "json_object"}} if LLM_JSON_MODE else {}
+
+
+def extract_json(text: str) -> Any:
+    """Decode the first JSON value in ``text``, ignoring fences and surrounding prose."""
+    fenced = _FENCE.search(text)
+    body = fenced.group(1) if fenced else text
+    starts = [i for i in (body.find("{"), body.find("[")) if i >= 0]
+    if not starts:
+        raise StructuredOutputError("no JSON value in reply")
+    value, _ = json.JSONDecoder().raw_decode(body, min(starts))
+    return value
+
+
+def salvage_items(text: str, key: str) -> List[Any]:
+    """Return the complete elements of the ``key`` array in a possibly truncated reply."""
+    for target in (key, None):
+        parser = JSONArrayStreamParser(target)
+        try:
+            items = list(parser.feed(text))
+        except ValueError:
+            continue
+        if items:
+            return items
+    return []
+
+
+def parse_items(text: str, key: str, build: Callable[[Any], T], name: str) -> List[T]:
+    """Parse the array under ``key`` (or a bare array) into models via ``build``.
+
+    Raises :class:`StructuredOutputError` only when no element survives.
+    """
+    started = time.perf_counter()
+    try:
+        return _parse_items(text, key, build, name)
+    finally:
+        metrics.PARSE_LATENCY.observe(time.perf_counter() - started, name)
+
+
+def _parse_items(text: str, key: str, build: Callable[[Any], T], name: str) -> List[T]:
+    stats = _stats_for(name)
+    stats.replies += 1
+    salvaged = False
+    try:
+        data = extract_json(text)
+        raw = data.get(key) if isinstance(data, dict) else data
+        if not isinstance(raw, list):
+            raise StructuredOutputError(f"no {key!r} array in reply")
+    except ValueError:
+        raw = salvage_items(text, key)
+        salvaged = True
+
+    items, dropped = [], 0
+    for element in raw:
+        try:
+            items.append(build(element))
+        except _ELEMENT_ERRORS:
+            dropped += 1
+    stats.items_dropped += dropped
+    if not items:
+        stats.failed += 1
+        raise StructuredOutputError(f"no valid {key} in reply")
+    if salvaged or dropped:
+        stats.salvaged += 1
+    else:
+        stats.clean += 1
+    return items
+
+
+def parse_object(text: str, build: Callable[[Any], T], name: str) -> T:
+    """Parse a single JSON object reply into a model via ``build``."""
+    stats = _stats_for(name)
+    stats.replies += 1
+    started = time.perf_counter()
+    try:
+        result = build(extract_json(text))
+    except _ELEMENT_ERRORS:
+        stats.failed += 1
+        raise
+    finally:
+        metrics.PARSE_LATENCY.observe(time.perf_counter() - started, name)
+    stats.clean += 1
+    return result
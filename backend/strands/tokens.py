@@ -0,0 +1,43 @@
+"""Local prompt-token counting for budgeting LLM context."""
+from functools import lru_cache
+import math
+import re
+
+# Roughly four characters per token for English text with GPT tokenizers
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    """Return the tiktoken encoding if the optional package is usable, else None."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Not installed, or its vocabulary cannot be fetched offline
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count prompt tokens exactly with tiktoken, or estimate them without it."""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Shorten ``text`` to about ``max_tokens`` tokens, cutting at a word boundary."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        cut = encoding.decode(encoding.encode(text)[:max_tokens])
+    else:
+        cut = text[:max_tokens * CHARS_PER_TOKEN]
+    # Drop the partial last word unless that would leave nothing
+    cut = re.sub(r"\s+\S*$", "", cut) or cut
+    return cut.rstrip(" ,;:") + "…"
@@ -0,0 +1,190 @@
+"""OpenTelemetry tracing of requests, agents, LLM calls and fallbacks.
+
+Every API request opens a server span (see ``api.py``); agent entry points,
+cache lookups, rate-limit checks, LLM calls and their individual attempts,
+and rule-based fallbacks open child spans carrying the phase, model, token
+counts and fallback reason. Incoming ``traceparent`` headers are honoured,
+so the spans join a trace started by the load balancer or the frontend.
+
+Spans are only recorded when ``TRACING_EXPORTER`` selects an exporter:
+
+* ``console`` - one JSON span per line on stdout
+* ``file`` - the same, appended to ``TRACING_FILE``
+* ``otlp`` - a collector at ``OTEL_EXPORTER_OTLP_ENDPOINT``
+
+Exporting needs ``opentelemetry-sdk`` (and ``opentelemetry-exporter-otlp-proto-http``
+for ``otlp``), both in ``requirements.txt``; without them an exporter
+setting only warns. Until a tracer provider is installed, or without
+``opentelemetry-api`` at all, every helper here returns at once.
+"""
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Iterator, Optional
+import inspect
+import os
+import sys
+import warnings
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:  # pragma: no cover - optional dependency
+    propagate = trace = None
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "feel-forward-api")
+
+_tracer = trace.get_tracer("feelforward") if trace is not None else None
+_provider = None
+
+
+class _NoopSpan:
+    """Stand-in span returned while nothing is being recorded."""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[dict] = None) -> None:
+        pass
+
+    def update_name(self, name: str) -> None:
+        pass
+
+    def is_recording(self) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _recording() -> bool:
+    # Until an SDK provider is installed every span would be a non-recording no-op
+    return trace is not None and not isinstance(trace.get_tracer_provider(), trace.ProxyTracerProvider)
+
+
+def _attributes(values: dict) -> dict:
+    # OpenTelemetry rejects None; drop unset attributes instead
+    return {key: value for key, value in values.items() if value is not None}
+
+
+@contextmanager
+def span(name: str, context: Any = None, kind: Any = None, **attributes: Any) -> Iterator[Any]:
+    """Open a child span of the current one; exceptions are recorded on it."""
+    if not _recording():
+        yield _NOOP_SPAN
+        return
+    with _tracer.start_as_current_span(name, context=context, kind=kind or trace.SpanKind.INTERNAL,
+                                       attributes=_attributes(attributes)) as current:
+        yield current
+
+
+def current_span() -> Any:
+    return trace.get_current_span() if _recording() else _NOOP_SPAN
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Attach attributes to the current span."""
+    current = current_span()
+    if current.is_recording():
+        current.set_attributes(_attributes(attributes))
+
+
+@contextmanager
+def server_span(name: str, headers: Any, **attributes: Any) -> Iterator[Any]:
+    """Open the root span of a request, continuing any trace in ``headers``.
+
+    When the framework has already opened a server span for the request
+    (FastAPI does once an SDK is installed), this one nests under it instead
+    of starting a second trace.
+    """
+    if not _recording():
+        yield _NOOP_SPAN
+        return
+    if trace.get_current_span().is_recording():
+        with span(name, **attributes) as current:
+            yield current
+        return
+    with span(name, context=propagate.extract(headers), kind=trace.SpanKind.SERVER, **attributes) as current:
+        yield current
+
+
+def traced(name: str, **attributes: Any) -> Callable:
+    """Decorate a sync or async function so each call runs in a span called ``name``."""
+    def decorate(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def fallback_reason(error: Optional[BaseException] = None) -> str:
+    """Why the caller is falling back: ``error`` or the one being handled, or no LLM at all."""
+    from .utils import llm_available
+
+    error = error or sys.exc_info()[1]
+    if error is not None:
+        return type(error).__name__
+    return "llm_unavailable" if not llm_available() else "llm_incomplete"
+
+
+def traced_fallback(phase: str) -> Callable:
+    """Decorate a rule-based fallback so each activation is a span with its reason.
+
+    Callers that leave their ``except`` block before falling back pass the
+    caught exception as ``error=``; it is not forwarded to the fallback.
+    """
+    def decorate(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, error: Optional[BaseException] = None, **kwargs):
+            if not _recording():
+                return func(*args, **kwargs)
+            with span(f"{phase}.fallback", phase=phase, **{"fallback.reason": fallback_reason(error)}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def configure_tracing(exporter: str = TRACING_EXPORTER) -> bool:
+    """Install an SDK tracer provider exporting to ``exporter``; return True if spans will be recorded."""
+    global _provider
+    if not exporter or trace is None or _provider is not None:
+        return _provider is not None
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+        if exporter == "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            span_exporter = OTLPSpanExporter()
+        else:
+            out = open(TRACING_FILE, "a") if exporter == "file" else sys.stdout
+            span_exporter = ConsoleSpanExporter(out=out, formatter=lambda s: s.to_json(indent=None) + "\n")
+    except ImportError as exc:
+        warnings.warn(f"TRACING_EXPORTER={exporter} needs the OpenTelemetry SDK ({exc}); tracing is off")
+        return False
+
+    _provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}))
+    _provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(_provider)
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Flush and stop the exporter installed by :func:`configure_tracing`."""
+    global _provider
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = None
@@ -1,4 +1,12 @@
+import asyncio
+import importlib.util
 import os
+import threading
+import weakref
+from typing import Optional
+
+import httpx
+import openai
 
 
 def llm_available() -> bool:
@@ -6,3 +14,86 @@ def llm_available() -> bool:
     api_key = os.getenv("OPENAI_API_KEY")
     return bool(api_key)
 
+
+# ---- Pooled LLM clients ----------------------------------------------------
+# One HTTP connection pool per process, shared by every agent.  The clients are
+# created lazily so importing the agents never requires an API key.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+
+_client: Optional[openai.OpenAI] = None
+# Async connection pools are bound to the loop that created them, so each
+# event loop gets its own client; a client goes away with its loop.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+_lock = threading.Lock()
+
+
+def _http_client_options() -> dict:
+    """Connection pool settings shared by the sync and async clients."""
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        # HTTP/2 needs the optional ``h2`` package; fall back to HTTP/1.1 keep-alive.
+        "http2": importlib.util.find_spec("h2") is not None,
+    }
+
+
+def get_llm_client() -> openai.OpenAI:
+    """Return the process-wide synchronous OpenAI client."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                # ResilientCaller is the only retry layer; SDK retries would multiply its attempts
+                _client = openai.OpenAI(
+                    max_retries=0,
+                    http_client=openai.DefaultHttpxClient(**_http_client_options())
+                )
+    return _client
+
+
+def get_async_llm_client() -> openai.AsyncOpenAI:
+    """Return the process-wide async OpenAI client for the running event loop.
+
+    A client is never replaced while its loop is alive, so switching loops
+    does not abandon an open pool. Clients of loops that have since closed
+    are dropped; their connections cannot be closed without their loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        for old_loop in [old for old in _async_clients.keys() if old.is_closed()]:
+            del _async_clients[old_loop]
+        client = _async_clients[loop] = openai.AsyncOpenAI(
+            max_retries=0,
+            http_client=openai.DefaultAsyncHttpxClient(**_http_client_options())
+        )
+    return client
+
+
+async def aclose_llm_clients() -> None:
+    """Close the pooled clients; called when the FastAPI app shuts down.
+
+    The running loop's client is closed here; clients of other loops that
+    are still running are closed on their own loop.
+    """
+    global _client
+    loop = asyncio.get_running_loop()
+    for client_loop, client in list(_async_clients.items()):
+        if client_loop is loop:
+            await client.close()
+        elif client_loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.close(), client_loop)
+    _async_clients.clear()
+    if _client is not None:
+        _client.close()
+    _client = None
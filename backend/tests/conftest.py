@@ -0,0 +1,57 @@
+import asyncio
+import inspect
+import sys
+import weakref
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import openai
+import pytest
+
+from strands import resilience, utils
+
+
+class FakeLLM:
+    """Stand-in for ``openai.AsyncOpenAI`` whose replies come from ``respond``.
+
+    ``respond(**kwargs)`` (sync or async) returns the reply text, or raises to
+    simulate an API error; by default every call answers ``content``. Each
+    request's keyword arguments are kept in ``calls``. Streaming requests
+    get the text in five-character chunks.
+    """
+
+    def __init__(self):
+        self.content = ""
+        self.respond = lambda **kwargs: self.content
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(0)
+        content = self.respond(**kwargs)
+        if inspect.isawaitable(content):
+            content = await content
+        if kwargs.get("stream"):
+            return self._stream(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def _stream(self, content):
+        for i in range(0, len(content), 5):
+            delta = SimpleNamespace(content=content[i:i + 5])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Point every agent's async LLM client at a :class:`FakeLLM`."""
+    fake = FakeLLM()
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    # Keep fake clients out of the process-wide pool used by other tests
+    monkeypatch.setattr(utils, "_async_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(utils, "_client", None)
+    monkeypatch.setattr(openai, "AsyncOpenAI", lambda *args, **kwargs: fake)
+    resilience.reset_callers()
+    yield fake
+    resilience.reset_callers()
@@ -0,0 +1,439 @@
+import asyncio
+import json
+import sys
+import weakref
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pytest
+
+from models import Preference
+from strands import resilience, utils
+from strands.agent import FactorDiscoveryAgent, ScenarioBuilderAgent
+
+
+@pytest.fixture(autouse=True)
+def fresh_llm_clients(monkeypatch):
+    # Keep fake clients out of the process-wide pool used by other tests
+    monkeypatch.setattr(utils, "_async_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(utils, "_client", None)
+    resilience.reset_callers()
+
+
+def requested_factors(kwargs):
+    """Factors listed in a Phase 1 prompt."""
+    user = kwargs["messages"][-1]["content"]
+    return [p["factor"] for p in json.loads(user[user.index("["):user.rindex("]") + 1])]
+
+
+def test_phase0_arun_uses_async_client(fake_llm):
+    fake_llm.content = json.dumps({"factors": [{"category": "Money", "items": ["Base salary"]}]})
+
+    factors = asyncio.run(FactorDiscoveryAgent().arun("choosing a job"))
+    assert factors[0].category == "Money"
+
+
+def test_phase2_arun_falls_back_on_bad_json(fake_llm):
+    fake_llm.content = "not json"
+
+    prefs = [Preference(factor="Salary", importance=9), Preference(factor="Remote work", importance=8)]
+    scenarios = asyncio.run(ScenarioBuilderAgent().arun(prefs, "choosing a job"))
+    assert [s.id for s in scenarios][0] == "ideal"
+
+
+def test_llm_client_is_pooled(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = utils.get_llm_client()
+    assert utils.get_llm_client() is client
+    asyncio.run(utils.aclose_llm_clients())
+    assert utils._client is None
+
+
+def test_async_llm_client_is_kept_per_event_loop(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    async def client():
+        return utils.get_async_llm_client()
+
+    loop = asyncio.new_event_loop()
+    try:
+        first = loop.run_until_complete(client())
+        assert asyncio.run(client()) is not first
+        # Another loop's client must not replace (and leak) this loop's pool
+        assert loop.run_until_complete(client()) is first
+        loop.run_until_complete(utils.aclose_llm_clients())
+        assert first.is_closed()
+    finally:
+        loop.close()
+
+
+def test_stream_parser_yields_each_scenario_once_complete():
+    from strands.streaming import JSONArrayStreamParser
+
+    text = '```json\n{"scenarios": [{"id": "a", "title": "x]}", "text": "say \\"{\\""}, {"id": "b"}]}\n```'
+    parser = JSONArrayStreamParser("scenarios")
+    seen = []
+    for i in range(0, len(text), 4):
+        seen.extend(parser.feed(text[i:i + 4]))
+    assert seen == [{"id": "a", "title": "x]}", "text": 'say "{"'}, {"id": "b"}]
+    assert parser.done
+
+
+def test_phase2_astream_yields_llm_scenarios(fake_llm):
+    fake_llm.content = json.dumps({"scenarios": [
+        {"id": "s1", "title": "First", "text": "One"},
+        {"id": "s2", "title": "Second", "text": "Two"},
+    ]})
+
+    async def collect():
+        prefs = [Preference(factor="Salary", importance=9)]
+        return [s.id async for s in ScenarioBuilderAgent().astream(prefs, "choosing a job")]
+
+    assert asyncio.run(collect()) == ["s1", "s2"]
+
+
+def test_phase2_fanout_replaces_only_failed_archetypes(fake_llm):
+    def respond(**kwargs):
+        brief = kwargs["messages"][-1]["content"]
+        if "wildcard" in brief:
+            raise TimeoutError
+        return json.dumps({"title": "LLM", "text": brief[-20:]})
+
+    fake_llm.respond = respond
+
+    prefs = [
+        Preference(factor="Salary", importance=9, hasLimit=True, limit="minimum $90k"),
+        Preference(factor="Remote work", importance=8),
+        Preference(factor="Team culture", importance=6),
+    ]
+    agent = ScenarioBuilderAgent(fanout=True, max_concurrency=2)
+    scenarios = asyncio.run(agent.arun(prefs, "choosing a job"))
+    assert [s.id for s in scenarios] == ["ideal", "tradeoff", "challenge", "medium", "wildcard"]
+    assert [s.title for s in scenarios[:4]] == ["LLM"] * 4
+    assert scenarios[4].title == "The Curveball Opportunity"
+
+
+def test_phase3_batch_uses_one_llm_call(fake_llm):
+    from models import Reaction, Scenario
+    from strands.agent import EmotionalReactionAgent
+
+    fake_llm.content = json.dumps({"insights": ["You light up here."]})
+
+    scenario = Scenario(id="ideal", title="Dream job", text="It has everything.")
+    pairs = [
+        (Reaction(scenario_id="ideal", excitement=9, anxiety=1), scenario),
+        (Reaction(scenario_id="other", excitement=1, anxiety=1), None),
+    ]
+    insights = asyncio.run(EmotionalReactionAgent().aanalyze_batch(pairs))
+    assert len(fake_llm.calls) == 1
+    assert insights[0] == "You light up here."
+    assert insights[1].startswith("Low emotional response")
+    assert "response_format" in fake_llm.calls[0]
+
+
+def test_phase3_batch_keeps_positions_of_a_partial_reply(fake_llm):
+    from models import Reaction, Scenario
+    from strands.agent import EmotionalReactionAgent
+
+    # Fenced with prose around it, the first insight blank and the third missing
+    fake_llm.content = 'Here you go:\n```json\n{"insights": ["", "Second reaction insight."]}\n```'
+
+    scenario = Scenario(id="ideal", title="Dream job", text="It has everything.")
+    pairs = [(Reaction(scenario_id=str(i), excitement=9, anxiety=1), scenario) for i in range(3)]
+    insights = asyncio.run(EmotionalReactionAgent().aanalyze_batch(pairs))
+    assert insights[1] == "Second reaction insight."
+    assert insights[0].startswith("Strong positive response")
+    assert insights[2].startswith("Strong positive response")
+
+
+def test_phase3_counts_reactions_without_a_scenario_apart_from_fallbacks(fake_llm):
+    from models import Reaction, Scenario
+    from strands import metrics
+    from strands.agent import EmotionalReactionAgent
+
+    fake_llm.content = json.dumps({"insights": ["Clear yes."]})
+    scenario = Scenario(id="ideal", title="Dream job", text="It has everything.")
+    pairs = [(Reaction(scenario_id="ideal", excitement=9, anxiety=1), scenario),
+             (Reaction(scenario_id="gone", excitement=2, anxiety=8), None)]
+    fallbacks, unmatched = metrics.FALLBACKS.value("phase3"), metrics.UNMATCHED.value("phase3")
+
+    insights = asyncio.run(EmotionalReactionAgent().aanalyze_batch(pairs))
+
+    assert insights[0] == "Clear yes."
+    assert metrics.FALLBACKS.value("phase3") == fallbacks
+    assert metrics.UNMATCHED.value("phase3") == unmatched + 1
+
+
+def test_shared_phase3_agent_keeps_no_reactions(monkeypatch):
+    from models import Reaction
+    from strands.agent import AgentRegistry
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    agent = AgentRegistry().reactions
+    agent.run(Reaction(scenario_id="1", excitement=9, anxiety=1))
+    asyncio.run(agent.arun(Reaction(scenario_id="2", excitement=1, anxiety=9)))
+
+    assert agent.get_all_reactions() == []
+    assert agent.get_reaction_patterns() == {}
+
+
+def test_journey_pipeline_keeps_matching_speculative_scenarios(fake_llm):
+    from models import Reaction
+    from strands.agent import AgentRegistry
+    from strands.pipeline import JourneyPipeline
+
+    async def respond(**kwargs):
+        system = kwargs["messages"][0]["content"]
+        user = kwargs["messages"][-1]["content"]
+        if "preference detailing" in system:
+            # Echo the single preference back with its importance unchanged
+            factor = next(f for f in ("Salary", "Remote work", "Team culture") if f in user)
+            importance = {"Salary": 9, "Remote work": 8, "Team culture": 4}[factor]
+            content = json.dumps([{"factor": factor, "importance": importance}])
+            await asyncio.sleep(0.01 * importance)
+        elif "scenario generator" in system:
+            content = json.dumps({"scenarios": [{"id": "s1", "title": "First", "text": "One"},
+                                                {"id": "s2", "title": "Second", "text": "Two"}]})
+        elif "several decision scenarios" in system:
+            content = json.dumps({"insights": ["Clear yes.", "Clear no."]})
+        elif "decision factors" in system:
+            content = json.dumps({"factors": [{"category": "Money", "items": ["Salary"]}]})
+        else:
+            content = "You value pay above all."
+        return content
+
+    fake_llm.respond = respond
+
+    prefs = [
+        Preference(factor="Salary", importance=9),
+        Preference(factor="Remote work", importance=8),
+        Preference(factor="Team culture", importance=4),
+    ]
+    reactions = [Reaction(scenario_id="0", excitement=9, anxiety=1),
+                 Reaction(scenario_id="1", excitement=2, anxiety=8)]
+    journey = asyncio.run(JourneyPipeline(AgentRegistry()).run("choosing a job", prefs, reactions))
+
+    assert journey.speculative_phase2 is True
+    assert [p.factor for p in journey.preferences] == ["Salary", "Remote work", "Team culture"]
+    assert [r.scenario_id for r in journey.reactions] == ["s1", "s2"]
+    assert journey.insights == ["Clear yes.", "Clear no."]
+    assert journey.summary == "You value pay above all."
+    assert set(journey.timings) == {"phase0", "phase1", "phase2", "phase3", "phase4", "total"}
+
+
+def test_journey_pipeline_reruns_phase2_when_enrichment_changes_the_prompt(fake_llm):
+    from strands.agent import AgentRegistry
+    from strands.pipeline import JourneyPipeline
+
+    prompts = []
+
+    async def respond(**kwargs):
+        system = kwargs["messages"][0]["content"]
+        user = kwargs["messages"][-1]["content"]
+        if "preference detailing" in system:
+            factor = next(f for f in ("Salary", "Remote work", "Team culture") if f in user)
+            item = {"factor": factor, "importance": {"Salary": 9, "Remote work": 8, "Team culture": 4}[factor]}
+            if factor == "Team culture":
+                # The slowest preference gains a trade-off that the scenario prompt renders
+                item["tradeoff"] = "would accept a quieter team for more pay"
+                await asyncio.sleep(0.1)
+            content = json.dumps([item])
+        elif "scenario generator" in system:
+            prompts.append(user)
+            content = json.dumps({"scenarios": [{"id": "s1", "title": "First", "text": "One"}]})
+        elif "decision factors" in system:
+            content = json.dumps({"factors": [{"category": "Money", "items": ["Salary"]}]})
+        else:
+            content = "You value pay above all."
+        return content
+
+    fake_llm.respond = respond
+
+    prefs = [
+        Preference(factor="Salary", importance=9),
+        Preference(factor="Remote work", importance=8),
+        Preference(factor="Team culture", importance=4),
+    ]
+    journey = asyncio.run(JourneyPipeline(AgentRegistry()).run("choosing a job", prefs))
+
+    assert journey.speculative_phase2 is False
+    assert "quieter team" not in prompts[0]
+    assert "quieter team" in prompts[-1]
+
+
+def test_journey_pipeline_cancels_phase0_when_a_later_phase_fails(monkeypatch):
+    from strands.agent import AgentRegistry
+    from strands.pipeline import JourneyPipeline
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    agents = AgentRegistry()
+
+    async def slow_factors(topic):
+        await asyncio.sleep(10)
+
+    async def broken(pairs):
+        raise RuntimeError("phase 3 failed")
+
+    monkeypatch.setattr(agents.factors, "arun", slow_factors)
+    monkeypatch.setattr(agents.reactions, "aanalyze_batch", broken)
+
+    async def journey():
+        with pytest.raises(RuntimeError):
+            await JourneyPipeline(agents).run("choosing a job", [Preference(factor="Salary", importance=9)])
+        return asyncio.all_tasks() - {asyncio.current_task()}
+
+    assert asyncio.run(journey()) == set()
+
+
+def test_phase1_prefetch_answers_from_background_results(fake_llm):
+    from models import FactorCategory
+    from strands.agent import PreferenceDetailAgent
+    from strands.prefetch import Phase1Prefetcher
+
+    calls = []
+
+    def respond(**kwargs):
+        factors = requested_factors(kwargs)
+        calls.append(factors)
+        # The LLM skips "Title"; it must still be answered, by the rule-based fallback
+        return json.dumps([{"factor": f, "importance": 9, "hasLimit": False} for f in factors if f != "Title"])
+
+    fake_llm.respond = respond
+
+    async def journey():
+        prefetcher = Phase1Prefetcher(PreferenceDetailAgent(), max_items=3, batch_size=2)
+        factors = [FactorCategory(category="Work", items=["Salary", "Remote work", "Team culture", "Title"])]
+        prefetcher.start("s1", "choosing a job", factors)
+        prefs = [Preference(factor="Team culture", importance=3), Preference(factor="Title", importance=4),
+                 Preference(factor="Commute", importance=2)]
+        return prefetcher, await prefetcher.take("s1", prefs, "choosing a job")
+
+    prefetcher, prefs = asyncio.run(journey())
+    assert [p.factor for p in prefs] == ["Team culture", "Title", "Commute"]
+    # Prefetched, fallback and freshly enriched items all keep the submitted importance
+    assert [p.importance for p in prefs] == [3, 4, 2]
+    assert prefs[1].tradeoff
+    # Two prefetch batches under the three-item cap, then one call for the items beyond it
+    assert sorted(map(len, calls)) == [1, 2, 2]
+    assert prefetcher.stats()["items_used"] == 1
+
+
+def test_phase1_prefetch_caps_items_in_flight_across_sessions(fake_llm):
+    from models import FactorCategory
+    from strands.agent import PreferenceDetailAgent
+    from strands.prefetch import Phase1Prefetcher
+
+    release = None
+
+    async def respond(**kwargs):
+        await release.wait()
+        return json.dumps([{"factor": f, "importance": 5} for f in requested_factors(kwargs)])
+
+    fake_llm.respond = respond
+
+    async def sessions():
+        nonlocal release
+        release = asyncio.Event()
+        prefetcher = Phase1Prefetcher(PreferenceDetailAgent(), max_items=3, max_in_flight=5)
+        factors = [FactorCategory(category="Work", items=["Salary", "Remote work", "Team culture"])]
+        for session_id in ("s1", "s2", "s3"):
+            prefetcher.start(session_id, "choosing a job", factors)
+        during = prefetcher.stats()
+        release.set()
+        await prefetcher.take("s1", [Preference(factor="Salary", importance=9)], "choosing a job")
+        await prefetcher.take("s2", [Preference(factor="Salary", importance=9)], "choosing a job")
+        return during, prefetcher.stats()
+
+    during, after = asyncio.run(sessions())
+    # The second session only gets the two items left under the cap; the third none
+    assert during["in_flight_items"] == 5
+    assert during["sessions"] == 2 and during["skipped"] == 1
+    assert after["in_flight_items"] == 0
+
+
+def test_factor_matcher_prefers_longest_key():
+    from strands.matching import FactorMatcher
+
+    matcher = FactorMatcher({"work": 1, "remote work": 2, "work-life balance": 3, "life": 4})
+    assert matcher.match("Remote work flexibility") == 2
+    # Overlapping keys: the longer one wins even though it starts later
+    assert matcher.match("Remote work-life balance") == 3
+    assert matcher.match("Salary") is None
+
+
+def test_phase1_fallback_uses_defaults_file():
+    from strands.agent import PreferenceDetailAgent
+
+    prefs = PreferenceDetailAgent()._fallback_enrichment([Preference(factor="Base salary", importance=5)])
+    assert prefs[0].limit == "minimum $60k"
+
+
+def test_phase4_context_stays_within_token_budget(monkeypatch):
+    from models import Reaction
+    from strands import phase4
+    from strands.agent import InsightSynthesisAgent
+    from strands.phase4 import context_stats
+    from strands.tokens import count_tokens
+
+    monkeypatch.setattr(phase4, "CONTEXT_STATS_SAMPLE", 1)
+
+    agent = InsightSynthesisAgent(context_tokens=400, freeform_tokens=20)
+    prefs = [Preference(factor=f"Factor {i}", importance=i % 10 + 1) for i in range(100)]
+    reactions = [Reaction(scenario_id=str(i), excitement=i % 10, anxiety=2, freeform="long thoughts " * 50)
+                 for i in range(40)]
+    before = context_stats()["tokens_saved"]
+    context = agent._build_analysis_context(reactions, prefs, None)
+
+    assert count_tokens(context) <= 400
+    assert "Factor 9: 10/10" in context
+    assert "Excitement 9/10" in context
+    assert "milder reactions omitted" in context
+    assert context_stats()["tokens_saved"] > before
+
+
+def test_phase4_context_stats_sample_the_full_render(monkeypatch):
+    from models import Reaction
+    from strands import phase4
+    from strands.agent import InsightSynthesisAgent
+
+    monkeypatch.setattr(phase4, "CONTEXT_STATS_SAMPLE", 4)
+    monkeypatch.setitem(phase4._context_stats, "prompts", 0)
+    agent = InsightSynthesisAgent(context_tokens=400, freeform_tokens=20)
+    renders = []
+    render = agent._render_context
+    monkeypatch.setattr(agent, "_render_context", 
+                        lambda *a, **kw: renders.append(kw.get("freeform_tokens", a[-1])) or render(*a, **kw))
+    reactions = [Reaction(scenario_id="1", excitement=5, anxiety=2, freeform="long thoughts " * 50)]
+
+    for _ in range(8):
+        agent._build_analysis_context(reactions, [], None)
+
+    # The unbudgeted context is rendered for two of the eight prompts only
+    assert renders.count(None) == 2
+
+
+def test_phase2_fanout_timeout_settles_half_open_breaker(fake_llm):
+    from strands.resilience import CircuitBreaker, get_caller
+
+    breaker = get_caller("phase2").breaker = CircuitBreaker(window=1, min_calls=1, cooldown=0.05)
+    breaker.record(False)
+    prefs = [Preference(factor="Salary", importance=9), Preference(factor="Remote work", importance=8)]
+    agent = ScenarioBuilderAgent(fanout=True, scenario_timeout=0.05)
+
+    async def hang(**kwargs):
+        await asyncio.sleep(10)
+
+    async def journey():
+        await asyncio.sleep(0.06)
+        # The half-open probe is one of the fan-out calls and times out
+        fake_llm.respond = hang
+        first = await agent.arun(prefs, "choosing a job")
+        assert breaker.state == "open"
+        await asyncio.sleep(0.06)
+        fake_llm.respond = lambda **kwargs: json.dumps({"title": "LLM", "text": "Recovered"})
+        return first, await agent.arun(prefs, "choosing a job")
+
+    first, second = asyncio.run(journey())
+    assert len(first) == len(second)
+    assert breaker.state == "closed"
+    assert "LLM" in [s.title for s in second]
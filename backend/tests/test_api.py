@@ -1,4 +1,5 @@
 from fastapi.testclient import TestClient
+import json
 import sys
 from pathlib import Path
 
@@ -67,3 +68,139 @@ def test_phase_flow():
     )
     assert resp.status_code == 200
     assert "summary" in resp.json()
+
+
+def test_agents_are_built_once():
+    client.post("/phase0/factors", json={"topic": "moving cities"})
+    agents = app.state.agents
+    client.post("/phase0/factors", json={"topic": "moving cities"})
+    assert app.state.agents is agents
+
+
+def test_phase4_summary_stream():
+    pref = {"factor": "Base salary", "importance": 9, "hasLimit": False}
+    reaction = {"scenario_id": "ideal", "excitement": 8, "anxiety": 3}
+    payload = {"reactions": [reaction], "preferences": [pref]}
+
+    resp = client.post("/phase4/summary/stream", json=payload)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = [e for e in resp.text.split("\n\n") if e]
+    assert events[-1].startswith("event: done")
+    streamed = "".join(json.loads(e[len("data: "):])["delta"] for e in events[:-1])
+
+    summary = client.post("/phase4/summary", json=payload).json()["summary"]
+    assert streamed == summary
+
+
+def test_phase2_scenarios_stream_ndjson():
+    pref = {"factor": "Base salary", "importance": 9, "hasLimit": True, "limit": "minimum $90k"}
+    payload = {"preferences": [pref], "topic": "choosing a new job"}
+
+    resp = client.post("/phase2/scenarios/stream", json=payload,
+                       headers={"Accept": "application/x-ndjson"})
+    assert resp.status_code == 200
+    streamed = [json.loads(line) for line in resp.text.splitlines()]
+
+    scenarios = client.post("/phase2/scenarios", json=payload).json()["scenarios"]
+    assert streamed == scenarios
+
+
+def test_phase2_scenarios_stream_ndjson_reports_errors(monkeypatch):
+    from strands.phase2 import ScenarioBuilderAgent
+
+    async def failing_astream(self, preferences, topic):
+        yield ScenarioBuilderAgent()._generate_fallback_scenarios(preferences, topic)[0]
+        raise RuntimeError("generation failed")
+
+    monkeypatch.setattr(ScenarioBuilderAgent, "astream", failing_astream)
+    payload = {"preferences": [{"factor": "Base salary", "importance": 9}], "topic": "choosing a new job"}
+
+    resp = client.post("/phase2/scenarios/stream", json=payload, headers={"Accept": "application/x-ndjson"})
+    assert resp.status_code == 200
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert len(lines) == 2 and "id" in lines[0]
+    assert lines[-1] == {"error": True, "errorMessage": "Scenario generation failed"}
+
+
+def test_session_flow_sends_only_deltas():
+    resp = client.post("/phase0/factors", json={"topic": "choosing a new job"})
+    session_id = resp.json()["session_id"]
+
+    prefs = [
+        {"factor": "Base salary", "importance": 9, "hasLimit": True, "limit": "minimum $90k"},
+        {"factor": "Remote work flexibility", "importance": 8},
+    ]
+    resp = client.post("/phase1/preferences", json={"preferences": prefs, "session_id": session_id})
+    assert resp.status_code == 200
+
+    # Topic and preferences come from the session
+    resp = client.post("/phase2/scenarios", json={"session_id": session_id})
+    assert resp.status_code == 200
+    scenarios = resp.json()["scenarios"]
+    assert scenarios[0]["id"] == "ideal"
+
+    for scenario, excitement in zip(scenarios[:2], (8, 3)):
+        resp = client.post("/phase3/reactions", json={
+            "scenario_id": scenario["id"], "excitement": excitement, "anxiety": 4, "session_id": session_id,
+        })
+        assert resp.status_code == 200
+    assert resp.json()["patterns"]["total_reactions"] == 2
+
+    resp = client.post("/phase4/summary", json={"session_id": session_id})
+    assert resp.status_code == 200
+    assert "base salary" in resp.json()["summary"]
+
+
+def test_unknown_session_is_404():
+    resp = client.post("/phase4/summary", json={"session_id": "missing"})
+    assert resp.status_code == 404
+
+
+def test_phase2_requires_topic_without_session():
+    resp = client.post("/phase2/scenarios", json={"preferences": []})
+    assert resp.status_code == 422
+
+
+def test_empty_bodies_are_rejected_without_session():
+    for path in ("/phase2/scenarios", "/phase2/scenarios/stream", "/phase4/summary", "/phase4/summary/stream"):
+        assert client.post(path, json={}).status_code == 422, path
+    assert client.post("/phase4/summary", json={"reactions": []}).status_code == 422
+
+
+def test_phase3_reactions_batch():
+    reactions = [
+        {"scenario_id": "ideal", "excitement": 9, "anxiety": 2},
+        {"scenario_id": "tradeoff", "excitement": 2, "anxiety": 8, "freeform": "too far"},
+    ]
+    resp = client.post("/phase3/reactions/batch", json={"reactions": reactions})
+    assert resp.status_code == 200
+    data = resp.json()
+    assert len(data["insights"]) == 2
+    assert data["insights"][1].startswith("High anxiety")
+    assert data["patterns"]["total_reactions"] == 2
+
+
+def test_journey_runs_all_phases():
+    resp = client.post("/journey", json={
+        "topic": "choosing a job",
+        "preferences": [{"factor": "Salary", "importance": 9}, {"factor": "Remote work", "importance": 7}],
+        "reactions": [{"scenario_id": "ideal", "excitement": 9, "anxiety": 2}],
+    })
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["scenarios"][0]["id"] == "ideal"
+    assert len(data["insights"]) == 1
+    assert data["summary"]
+    assert {"phase0", "phase1", "phase2", "phase3", "phase4", "total"} <= set(data["timings"])
+
+
+def test_request_budget_from_deadline_header():
+    from api import REQUEST_BUDGET_MS, request_budget
+
+    assert request_budget("1500") == 1.5
+    assert request_budget(None) == REQUEST_BUDGET_MS / 1000
+    assert request_budget("not a number") == REQUEST_BUDGET_MS / 1000
+    assert request_budget(str(REQUEST_BUDGET_MS * 10)) == REQUEST_BUDGET_MS / 1000
+    resp = client.post("/phase0/factors", json={"topic": "choosing a job"}, headers={"X-Deadline-Ms": "50"})
+    assert resp.status_code == 200
@@ -0,0 +1,49 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "benchmarks"))
+import bench_agents
+
+
+def test_every_case_runs_and_has_a_baseline():
+    results = bench_agents.run([10], min_time=0, min_rounds=1)
+    cases = set(bench_agents.build_cases(10))
+    assert {name.split("[")[0] for name in results} == cases
+    assert all(stats["min_ms"] >= 0 and stats["peak_kib"] >= 0 for stats in results.values())
+
+    baseline = json.loads(bench_agents.BASELINE.read_text())["results"]
+    expected = {f"{case}[{n}]" for case in cases for n in bench_agents.SIZES}
+    assert expected <= set(baseline)
+
+
+def test_compare_flags_time_and_memory_regressions():
+    baseline = {"case[10]": {"min_ms": 1.0, "relative": 10.0, "peak_kib": 100.0}}
+    assert bench_agents.compare({"case[10]": {"min_ms": 1.2, "relative": 12.0, "peak_kib": 105.0}},
+                                baseline, 25, 10) == []
+    regressions = bench_agents.compare({"case[10]": {"min_ms": 2.0, "relative": 20.0, "peak_kib": 150.0}},
+                                       baseline, 25, 10)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("case[10] relative")
+
+
+def test_compare_ignores_sub_floor_time_jitter():
+    baseline = {"case[10]": {"min_ms": 0.01, "relative": 0.1, "peak_kib": 1.0}}
+    assert bench_agents.compare({"case[10]": {"min_ms": 0.04, "relative": 0.4, "peak_kib": 1.0}},
+                                baseline, 25, 10) == []
+    assert len(bench_agents.compare({"case[10]": {"min_ms": 0.07, "relative": 0.7, "peak_kib": 1.0}},
+                                    baseline, 25, 10)) == 1
+
+
+def test_compare_discounts_a_slower_host():
+    baseline = {"case[10]": {"min_ms": 1.0, "relative": 10.0, "peak_kib": 100.0}}
+    slower_host = {"case[10]": {"min_ms": 1.5, "relative": 10.5, "peak_kib": 100.0}}
+    assert bench_agents.compare(slower_host, baseline, 25, 10) == []
+
+
+def test_compare_flags_a_regression_measured_on_a_faster_host():
+    # Faster in absolute terms, but 35% slower than the host's reference workload
+    baseline = {"case[10000]": {"min_ms": 87.2, "relative": 100.0, "peak_kib": 100.0}}
+    faster_host = {"case[10000]": {"min_ms": 69.1, "relative": 135.0, "peak_kib": 100.0}}
+    regressions = bench_agents.compare(faster_host, baseline, 25, 10)
+    assert len(regressions) == 1 and "relative" in regressions[0]
@@ -0,0 +1,226 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from strands.cache import ResponseCache, normalize_topic
+from strands.phase0 import FactorDiscoveryAgent
+from strands.semantic_cache import SemanticCache
+
+
+def test_lru_evicts_oldest_when_over_byte_cap():
+    cache = ResponseCache(max_bytes=10, ttl=None)
+    cache.set("a", "A", 4)
+    cache.set("b", "B", 4)
+    cache.get("a")
+    cache.set("c", "C", 4)
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry_counts_as_miss():
+    cache = ResponseCache(ttl=0.01)
+    cache.set("a", "A", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_normalize_topic():
+    assert normalize_topic("  Choosing a JOB! ") == normalize_topic("choosing a job")
+
+
+def test_phase0_serves_repeated_topics_from_cache(fake_llm):
+    fake_llm.content = json.dumps({"factors": [{"category": "Money", "items": ["Base salary"]}]})
+
+    agent = FactorDiscoveryAgent(cache=ResponseCache())
+    first = asyncio.run(agent.arun("Choosing a job"))
+    second = asyncio.run(agent.arun("choosing a job."))
+    assert len(fake_llm.calls) == 1
+    assert first == second
+    assert agent.cache.stats()["hits"] == 1
+
+
+def test_semantic_cache_matches_near_duplicates():
+    cache = SemanticCache()
+    cache.set("choosing a new job", "jobs")
+    cache.set("moving cities", "cities")
+    assert cache.get("Choosing new jobs") == "jobs"
+    assert cache.get("moving to a city?") == "cities"
+    assert cache.get("adopting a dog") is None
+    assert cache.top_k("moving to new cities", k=2)[0][1] == 1
+
+
+def test_semantic_cache_misses_neighbouring_topics():
+    cache = SemanticCache()
+    for topic in ("buying a house", "choosing a new job", "learning piano", "moving to Berlin"):
+        cache.set(topic, topic)
+    for near_miss in ("buying a car", "selling a house", "choosing a new school",
+                      "learning guitar", "moving to Paris"):
+        assert cache.get(near_miss) is None, near_miss
+
+
+def test_semantic_cache_threshold_separates_paraphrases_from_other_topics():
+    cache = SemanticCache()
+    for topic in ("quitting my job", "buying a house", "accepting a job offer", "learning piano",
+                  "starting a business", "moving to Berlin"):
+        cache.set(topic, topic)
+    for paraphrase, topic in (("should I quit my job?", "quitting my job"), ("should i buy the houses", "buying a house"),
+                              ("accept the job offer", "accepting a job offer"),
+                              ("learning to play the piano", "learning piano"),
+                              ("starting my own business", "starting a business"),
+                              ("should I move to Berlin", "moving to Berlin")):
+        assert cache.get(paraphrase) == topic, paraphrase
+    for other in ("keeping my job", "selling a house", "declining a job offer", "learning guitar",
+                  "closing a business", "moving to Paris"):
+        assert cache.get(other) is None, other
+
+
+def test_semantic_cache_lookups_stay_under_a_millisecond_at_100k_topics():
+    cache = SemanticCache()
+    verbs, nouns, places = [f"verb{i}ing" for i in range(50)], [f"noun{i}" for i in range(200)], range(10)
+    for verb in verbs:
+        for noun in nouns:
+            for place in places:
+                cache.set(f"{verb} a {noun} in place{place}", (verb, noun, place))
+    assert cache.stats()["entries"] == 100_000
+
+    timings = []
+    for i in range(200):
+        started = time.perf_counter()
+        hit = cache.get(f"{verbs[i % 50]} the {nouns[i % 200]}s in place{i % 10}")
+        timings.append(time.perf_counter() - started)
+        assert hit == (verbs[i % 50], nouns[i % 200], i % 10)
+    assert sorted(timings)[len(timings) // 2] < 0.001
+
+
+def test_semantic_cache_entries_expire_and_are_versioned():
+    cache = SemanticCache(ttl=0.01)
+    cache.set("buying a house", "v1", version="model-a:1")
+    assert cache.get("buying a house", version="model-a:1") == "v1"
+    assert cache.get("buying a house", version="model-a:2") is None
+    time.sleep(0.02)
+    assert cache.get("buying a house", version="model-a:1") is None
+    assert cache.top_k("buying a house", version="model-a:1") == []
+
+
+def test_phase0_serves_rephrased_topics_from_semantic_cache(fake_llm):
+    fake_llm.content = json.dumps({"factors": [{"category": "Money", "items": ["Base salary"]}]})
+
+    agent = FactorDiscoveryAgent(cache=ResponseCache(), semantic_cache=SemanticCache())
+    first = asyncio.run(agent.arun("Should I buy a house"))
+    second = asyncio.run(agent.arun("should i buy the houses?"))
+    asyncio.run(agent.arun("should I buy a car"))
+    assert len(fake_llm.calls) == 2
+    assert first == second
+    assert agent.semantic_cache.stats()["hits"] == 1
+
+
+def test_semantic_cache_overwrites_oldest_when_full():
+    cache = SemanticCache(max_entries=2)
+    for topic in ("buying a house", "moving cities", "choosing a job"):
+        cache.set(topic, topic)
+    assert cache.stats()["entries"] == 2
+    assert cache.get("buying a house") is None
+    assert cache.get("choosing a job") == "choosing a job"
+
+
+def test_phase1_sends_only_cache_misses_to_llm(fake_llm):
+    from models import Preference
+    from strands.phase1 import PreferenceDetailAgent, topic_class
+
+    sent = []
+
+    def respond(**kwargs):
+        user = kwargs["messages"][-1]["content"]
+        factors = [p["factor"] for p in json.loads(user[user.index("["):user.rindex("]") + 1])]
+        sent.append(factors)
+        return json.dumps([{"factor": f, "importance": 8, "hasLimit": True, "limit": f"{f} limit"}
+                           for f in factors])
+
+    fake_llm.respond = respond
+
+    agent = PreferenceDetailAgent(cache=ResponseCache())
+    first = [Preference(factor="Base salary", importance=9), Preference(factor="Team culture", importance=6)]
+    asyncio.run(agent.arun(first, "Choosing a new job"))
+    second = [Preference(factor="Commute", importance=5), Preference(factor="base salary", importance=3),
+              Preference(factor="Team culture", importance=2, hasLimit=False)]
+    prefs = asyncio.run(agent.arun(second, "which job offer should I take"))
+
+    assert topic_class("which job offer should I take") == "work"
+    assert sent == [["Base salary", "Team culture"], ["Commute"]]
+    assert [p.factor for p in prefs] == ["Commute", "base salary", "Team culture"]
+    assert prefs[1].limit == "Base salary limit"
+    assert agent.cache.stats()["hits"] == 2
+    # Cached enrichments came from another user; this caller's own answers win
+    assert [p.importance for p in prefs[1:]] == [3, 2]
+    assert (prefs[2].hasLimit, prefs[2].limit) == (False, None)
+
+
+def test_phase1_fills_preferences_the_llm_left_out(fake_llm):
+    from models import Preference
+    from strands.phase1 import PreferenceDetailAgent
+
+    fake_llm.content = json.dumps({"preferences": [
+        {"factor": "Base salary", "importance": 8, "hasLimit": True, "limit": "at least $80k"}]})
+
+    prefs = [Preference(factor="Base salary", importance=9), Preference(factor="Commute time", importance=6),
+             Preference(factor="Team culture", importance=4)]
+    enriched = asyncio.run(PreferenceDetailAgent().arun(prefs, "Choosing a new job"))
+
+    assert [p.factor for p in enriched] == ["Base salary", "Commute time", "Team culture"]
+    assert enriched[0].limit == "at least $80k"
+    assert all(p.tradeoff for p in enriched[1:])
+
+
+def test_phase1_answer_does_not_depend_on_cache_state(fake_llm):
+    from models import Preference
+    from strands.phase1 import PreferenceDetailAgent
+
+    fake_llm.content = json.dumps([{"factor": "Base salary", "importance": 10, "hasLimit": True,
+                                    "limit": "at least $80k"}])
+    agent = PreferenceDetailAgent(cache=ResponseCache())
+    request = [Preference(factor="Base salary", importance=3)]
+    miss = asyncio.run(agent.arun(request, "Choosing a new job"))
+    hit = asyncio.run(agent.arun(request, "Choosing a new job"))
+
+    assert len(fake_llm.calls) == 1
+    assert miss == hit
+    assert (hit[0].importance, hit[0].limit) == (3, "at least $80k")
+
+
+def test_phase1_caches_only_enrichments_matched_by_name(fake_llm):
+    from models import Preference
+    from strands.phase1 import PreferenceDetailAgent
+
+    # The LLM rewords the factor; pairing by position is not shared with other users
+    fake_llm.content = json.dumps([{"factor": "Salary", "importance": 8, "hasLimit": True, "limit": "$80k"}])
+    agent = PreferenceDetailAgent(cache=ResponseCache())
+    prefs = asyncio.run(agent.arun([Preference(factor="Base salary", importance=9)], "Choosing a new job"))
+
+    assert prefs[0].limit == "$80k"
+    assert agent.cache.stats()["entries"] == 0
+
+
+def test_phase1_keeps_cache_hits_when_the_llm_fails(fake_llm):
+    from models import Preference
+    from strands.phase1 import PreferenceDetailAgent
+
+    fake_llm.content = json.dumps([{"factor": "Base salary", "importance": 8, "hasLimit": True,
+                                    "limit": "at least $80k"}])
+    agent = PreferenceDetailAgent(cache=ResponseCache())
+    asyncio.run(agent.arun([Preference(factor="Base salary", importance=9)], "Choosing a new job"))
+
+    def fail(**kwargs):
+        raise ValueError("bad request")
+
+    fake_llm.respond = fail
+    prefs = asyncio.run(agent.arun([Preference(factor="Base salary", importance=9),
+                                    Preference(factor="Team culture", importance=6)], "Choosing a new job"))
+    assert prefs[0].limit == "at least $80k"
+    assert [p.factor for p in prefs] == ["Base salary", "Team culture"]
+    assert prefs[1].tradeoff
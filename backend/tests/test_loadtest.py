@@ -0,0 +1,63 @@
+import asyncio
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pytest
+
+import loadtest
+from loadtest import LatencyRecorder, compare, percentile, run_load
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([], 50) == 0.0
+
+
+def test_recorder_counts_errors_and_rate_limits():
+    recorder = LatencyRecorder()
+    for status in (200, 200, 429, 500):
+        recorder.record("/phase0/factors", 0.01, status)
+    stats = recorder.summary(1.0)["/phase0/factors"]
+    assert stats["requests"] == 4
+    assert stats["error_rate"] == 0.25
+    assert stats["rate_limited_rate"] == 0.25
+    assert stats["histogram"]["le_10"] == 4
+
+
+def test_run_load_completes_journeys(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    results = asyncio.run(run_load(users=2, journeys=3))
+
+    assert results["journeys"]["completed"] == 3
+    assert results["meta"]["llm"] == "fallback"
+    endpoints = results["endpoints"]
+    assert set(endpoints) == {"/phase0/factors", "/phase1/preferences", "/phase2/scenarios",
+                              "/phase3/reactions", "/phase4/summary"}
+    assert all(stats["error_rate"] == 0 for stats in endpoints.values())
+    assert endpoints["/phase3/reactions"]["requests"] >= 3
+    assert results["event_loop_lag"]["samples"] > 0
+
+
+def test_mock_llm_that_exits_fails_fast(monkeypatch):
+    # Stand in for uvicorn failing at startup, e.g. when the port is already taken
+    popen = subprocess.Popen
+    monkeypatch.setattr(loadtest.subprocess, "Popen",
+                        lambda *args, **kwargs: popen([sys.executable, "-c", "raise SystemExit(3)"]))
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="exited with code 3"):
+        loadtest.start_mock_llm(latency_ms=0, error_rate=0, tokens_per_sec=0)
+    assert time.monotonic() - started < 5
+
+
+def test_compare_flags_regressions():
+    def result(p95):
+        return {"endpoints": {"/phase0/factors": {"p50_ms": 10.0, "p95_ms": p95, "p99_ms": 30.0}}}
+
+    assert compare(result(20.0), result(20.0), max_regression=20) == []
+    assert compare(result(30.0), result(20.0), max_regression=20) == ["/phase0/factors p95_ms +50.0%"]
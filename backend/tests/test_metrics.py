@@ -0,0 +1,73 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from fastapi.testclient import TestClient
+
+from api import app
+from strands import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    latency = metrics.Histogram("test_seconds", "Test latency.", ("phase",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        latency.observe(value, "phase1")
+
+    lines = latency.render()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{phase="phase1",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{phase="phase1",le="1"} 3' in lines
+    assert 'test_seconds_bucket{phase="phase1",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{phase="phase1"} 4' in lines
+    assert latency.count("phase1") == 4
+
+
+def test_counter_and_gauge_escape_labels():
+    counter = metrics.Counter("test_total", "Test counter.", ("route",))
+    counter.inc('/a"b', value=2)
+    gauge = metrics.Gauge("test_in_flight", "Test gauge.", ("phase",))
+    gauge.inc("phase2")
+    gauge.dec("phase2")
+
+    assert 'test_total{route="/a\\"b"} 2' in counter.render()
+    assert gauge.value("phase2") == 0
+
+
+def test_metrics_endpoint_reports_requests_and_fallbacks(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    metrics.reset()
+    client = TestClient(app)
+    assert client.post("/phase0/factors", json={"topic": "choosing a job"}).status_code == 200
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert ('feelforward_request_duration_seconds_count{route="/phase0/factors",method="POST",status="200"} 1'
+            in body)
+    assert 'feelforward_fallback_total{phase="phase0"} 1' in body
+    assert 'feelforward_cache_misses_total{cache="phase0"}' in body
+    assert 'feelforward_phase4_tokens_saved_total{phase="phase4"}' in body
+    assert "# TYPE feelforward_llm_in_flight gauge" in body
+
+
+def test_abandoned_stream_leaves_flight_when_closed(fake_llm):
+    from models import Preference, Reaction
+    from strands.phase4 import InsightSynthesisAgent
+
+    fake_llm.content = "You light up at autonomy and tense up at long commutes."
+    metrics.reset()
+
+    async def read_one_delta():
+        stream = InsightSynthesisAgent().astream([Reaction(scenario_id="ideal", excitement=8, anxiety=2)],
+                                                 [Preference(factor="Salary", importance=8)])
+        first = await stream.__anext__()
+        in_flight = metrics.LLM_IN_FLIGHT.value("phase4")
+        await stream.aclose()
+        return first, in_flight, metrics.LLM_IN_FLIGHT.value("phase4")
+
+    first, during, after = asyncio.run(read_one_delta())
+    assert first == "You l"
+    assert (during, after) == (1, 0)
+    assert metrics.LLM_LATENCY.count("phase4", "error") == 1
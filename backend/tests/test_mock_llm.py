@@ -0,0 +1,91 @@
+import asyncio
+import sys
+import weakref
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import httpx
+import openai
+import pytest
+
+from mock_llm import MockConfig, create_app
+from models import Preference, Reaction
+from strands import metrics, resilience, utils
+from strands.agent import AgentRegistry
+from strands.pipeline import JourneyPipeline
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    """Point the agents' async client at an in-process mock server."""
+    config = MockConfig()
+    mock = create_app(config)
+    real_client = openai.AsyncOpenAI
+
+    def client(**kwargs):
+        transport = httpx.ASGITransport(app=mock)
+        return real_client(base_url="http://mock/v1", api_key="mock", max_retries=0,
+                                  http_client=httpx.AsyncClient(transport=transport))
+
+    monkeypatch.setenv("OPENAI_API_KEY", "mock")
+    monkeypatch.setattr(utils, "_async_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(openai, "AsyncOpenAI", client)
+    resilience.reset_callers()
+    yield mock
+    resilience.reset_callers()
+
+
+PREFS = [
+    Preference(factor="Base salary", importance=9),
+    Preference(factor="Remote work flexibility", importance=7),
+    Preference(factor="Team culture", importance=5),
+]
+
+
+def test_full_journey_runs_on_llm_paths(mock_server):
+    reactions = [Reaction(scenario_id=str(i), excitement=8 - i, anxiety=2 + i) for i in range(3)]
+    agents = AgentRegistry()
+    journey = asyncio.run(JourneyPipeline(agents).run("choosing a job", PREFS, reactions))
+
+    # The rule-based fallbacks list four items per category
+    assert [len(f.items) for f in journey.factors] == [3, 3, 3]
+    assert journey.speculative_phase2 is not None
+    assert [p.factor for p in journey.preferences] == [p.factor for p in PREFS]
+    assert [s.id for s in journey.scenarios] == ["ideal", "tradeoff", "tradeoff_2", "challenge", "wildcard"]
+    assert all(i.startswith("Feeling ") for i in journey.insights)
+    assert journey.summary.startswith(("Your", "You", "There", "Before"))
+    assert mock_server.state.requests >= 6
+
+
+def test_streaming_and_payloads_are_deterministic(mock_server):
+    async def stream():
+        return [s.title async for s in AgentRegistry().scenarios.astream(PREFS, "choosing a job")]
+
+    first, second = asyncio.run(stream()), asyncio.run(stream())
+    assert len(first) == 5 and first == second
+
+
+def test_injected_errors_send_agents_to_fallbacks(mock_server):
+    mock_server.state.config.error_rate = 1.0
+    agent = AgentRegistry().factors
+    factors = asyncio.run(agent.arun("choosing a job"))
+    assert factors == agent._fallback_factors()
+
+
+def test_llm_calls_are_instrumented(mock_server):
+    metrics.reset()
+    agents = AgentRegistry()
+    asyncio.run(agents.factors.arun("choosing a job"))
+
+    async def stream():
+        return [s async for s in agents.scenarios.astream(PREFS, "choosing a job")]
+
+    assert len(asyncio.run(stream())) == 5
+    assert metrics.LLM_LATENCY.count("phase0", "ok") == 1
+    assert metrics.LLM_LATENCY.count("phase2", "ok") == 1
+    assert metrics.LLM_TTFT.count("phase2") == 1
+    assert metrics.PARSE_LATENCY.count("phase0") == 1
+    assert metrics.PROMPT_TOKENS.value("phase0") > 0
+    assert metrics.COMPLETION_TOKENS.value("phase0") > 0
+    assert metrics.LLM_IN_FLIGHT.value("phase0") == metrics.LLM_IN_FLIGHT.value("phase2") == 0
+    assert metrics.FALLBACKS.value("phase0") == metrics.FALLBACKS.value("phase2") == 0
@@ -0,0 +1,99 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rate_limit import RedisTokenBucketLimiter, TokenBucketLimiter
+
+
+def test_bucket_rejects_after_capacity_and_refills():
+    limiter = TokenBucketLimiter(rate=3, window=3)
+    assert all(limiter.hit("1.2.3.4", now=0) for _ in range(3))
+    assert not limiter.hit("1.2.3.4", now=0)
+    assert limiter.hit("1.2.3.4", now=1)
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_idle_keys_are_evicted():
+    limiter = TokenBucketLimiter(rate=60, window=60)
+    for i in range(1000):
+        limiter.hit(f"10.0.{i // 256}.{i % 256}", now=0)
+    limiter.hit("active", now=59)
+    assert limiter.evict_idle(now=60) == 1000
+    assert limiter.stats()["keys"] == 1
+
+
+def test_key_count_is_capped():
+    limiter = TokenBucketLimiter(rate=60, window=60, max_keys=100)
+    for i in range(500):
+        limiter.hit(str(i), now=0)
+    stats = limiter.stats()
+    assert stats["keys"] == 100
+    assert stats["memory_bytes"] > 0
+
+
+def test_redis_backend_shares_limit_and_batches_round_trips():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        task_a = RedisTokenBucketLimiter(5, 60, fakeredis.FakeAsyncRedis(server=server))
+        task_b = RedisTokenBucketLimiter(5, 60, fakeredis.FakeAsyncRedis(server=server))
+        first = await asyncio.gather(*(task_a.ahit("1.2.3.4") for _ in range(3)))
+        second = await asyncio.gather(*(task_b.ahit("1.2.3.4") for _ in range(3)))
+        loaded = task_a.round_trips
+        await asyncio.gather(*(task_a.ahit(f"10.0.0.{i}") for i in range(5)))
+        return first, second, loaded, task_a.round_trips
+
+    first, second, loaded, round_trips = asyncio.run(scenario())
+    assert first == [True, True, True]
+    assert second == [True, True, False]
+    # The script is loaded once; after that a whole batch is one round-trip
+    assert loaded == 2
+    assert round_trips == 3
+
+
+def test_redis_backend_reloads_a_flushed_script():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        client = fakeredis.FakeAsyncRedis()
+        limiter = RedisTokenBucketLimiter(1, 60, client)
+        first = await limiter.ahit("1.2.3.4")
+        await client.script_flush()
+        return first, await limiter.ahit("1.2.3.4"), limiter.errors
+
+    assert asyncio.run(scenario()) == (True, False, 0)
+
+
+def test_redis_backend_fails_open_when_redis_hangs():
+    pytest.importorskip("redis")
+
+    async def scenario():
+        # Accepts connections but never answers
+        server = await asyncio.start_server(lambda reader, writer: None, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        limiter = RedisTokenBucketLimiter.from_url(1, 60, f"redis://127.0.0.1:{port}/0", timeout=0.1)
+        started = time.monotonic()
+        allowed = await limiter.ahit("1.2.3.4")
+        elapsed = time.monotonic() - started
+        server.close()
+        return allowed, elapsed, limiter.errors
+
+    allowed, elapsed, errors = asyncio.run(scenario())
+    assert allowed and errors == 1
+    assert elapsed < 1
+
+
+def test_factory_refuses_per_task_limits_on_ecs(monkeypatch):
+    from rate_limit import create_limiter
+
+    monkeypatch.delenv("RATE_LIMIT_BACKEND", raising=False)
+    monkeypatch.setenv("ECS_CONTAINER_METADATA_URI_V4", "http://169.254.170.2/v4/task")
+    with pytest.raises(RuntimeError, match="RATE_LIMIT_BACKEND"):
+        create_limiter(60, 60)
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "memory")
+    assert isinstance(create_limiter(60, 60), TokenBucketLimiter)
@@ -0,0 +1,202 @@
+import asyncio
+import sys
+import time
+import weakref
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pytest
+
+from strands.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller
+
+
+def test_retries_transient_errors_then_succeeds():
+    attempts = []
+
+    async def flaky(remaining):
+        attempts.append(remaining)
+        if len(attempts) < 3:
+            raise TimeoutError
+        return "ok"
+
+    caller = ResilientCaller(retries=2, backoff_base=0.001)
+    assert asyncio.run(caller.acall(flaky, timeout=5)) == "ok"
+    assert len(attempts) == 3
+    # Each attempt gets only what is left of the overall budget
+    assert attempts[0] <= 5 and attempts[2] < attempts[0]
+
+
+def test_non_retryable_errors_fail_at_once():
+    attempts = []
+
+    async def broken(remaining):
+        attempts.append(remaining)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(ResilientCaller(retries=3, backoff_base=0.001).acall(broken))
+    assert len(attempts) == 1
+
+
+def test_breaker_opens_on_error_spike_and_recovers_after_cooldown():
+    breaker = CircuitBreaker(error_rate=0.5, window=4, min_calls=4, cooldown=0.05)
+    caller = ResilientCaller(retries=0, breaker=breaker)
+
+    async def failing(remaining):
+        raise ConnectionError
+
+    async def healthy(remaining):
+        return "ok"
+
+    async def scenario():
+        for _ in range(4):
+            with pytest.raises(ConnectionError):
+                await caller.acall(failing)
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await caller.acall(healthy)
+        await asyncio.sleep(0.06)
+        # The half-open probe succeeds and closes the circuit
+        assert await caller.acall(healthy) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_hedged_request_beats_slow_first_attempt():
+    delays = [1.0, 0.01]
+
+    async def call(remaining):
+        await asyncio.sleep(delays.pop(0) if delays else 0.01)
+        return "done"
+
+    caller = ResilientCaller(hedge=True, hedge_min_samples=3)
+    caller._latencies.extend([0.01, 0.01, 0.02])
+    started = time.monotonic()
+    assert asyncio.run(caller.acall(call, timeout=5)) == "done"
+    assert time.monotonic() - started < 0.5
+    assert caller.stats()["hedged"] == 1
+    # The race's winner is not a latency sample for the hedging threshold
+    assert len(caller._latencies) == 3
+
+
+def test_llm_timeout_is_clamped_to_request_budget():
+    from strands import deadline
+
+    token = deadline.set_deadline(5)
+    try:
+        assert deadline.llm_timeout(30) <= 5
+        assert deadline.llm_timeout(2) == 2
+    finally:
+        deadline.reset_deadline(token)
+    assert deadline.llm_timeout(30) == 30
+
+
+def test_agents_fall_back_without_calling_llm_when_budget_is_spent(fake_llm):
+    from strands import deadline
+    from strands.phase0 import FactorDiscoveryAgent
+
+    async def run():
+        deadline.set_deadline(0.1)
+        return await FactorDiscoveryAgent().arun("choosing a job")
+
+    factors = asyncio.run(run())
+    assert factors == FactorDiscoveryAgent()._fallback_factors()
+    assert fake_llm.calls == []
+
+
+def test_cancelled_half_open_probe_does_not_wedge_the_breaker():
+    breaker = CircuitBreaker(error_rate=0.5, window=2, min_calls=2, cooldown=0.05)
+    caller = ResilientCaller(retries=0, breaker=breaker)
+
+    async def failing(remaining):
+        raise ConnectionError
+
+    async def hanging(remaining):
+        await asyncio.sleep(10)
+
+    async def healthy(remaining):
+        return "ok"
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await caller.acall(failing)
+        await asyncio.sleep(0.06)
+        # The half-open probe is cancelled by the caller's own timeout
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(caller.acall(hanging), 0.01)
+        assert breaker.state == "open"
+        await asyncio.sleep(0.06)
+        assert await caller.acall(healthy) == "ok"
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_attempts_do_not_count_against_a_closed_breaker():
+    breaker = CircuitBreaker(error_rate=0.5, window=2, min_calls=2, cooldown=10)
+    caller = ResilientCaller(retries=0, breaker=breaker)
+
+    async def hanging(remaining):
+        await asyncio.sleep(10)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(caller.acall(hanging), 0.01)
+
+    asyncio.run(scenario())
+    assert breaker.state == "closed"
+    assert caller.stats()["failures"] == 0
+
+
+def test_sdk_does_not_retry_under_the_resilient_caller(monkeypatch):
+    import httpx
+    import openai
+    from strands import resilience, utils
+
+    requests = []
+
+    def failing(request):
+        requests.append(request)
+        return httpx.Response(500, json={"error": {"message": "upstream down"}})
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(utils, "_async_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(openai, "DefaultAsyncHttpxClient",
+                        lambda **kwargs: httpx.AsyncClient(transport=httpx.MockTransport(failing)))
+    resilience.reset_callers()
+    try:
+        with pytest.raises(openai.InternalServerError):
+            asyncio.run(resilience.achat_completion("phase0", model="gpt-3.5-turbo", messages=[], timeout=5))
+    finally:
+        resilience.reset_callers()
+    assert len(requests) == resilience.LLM_RETRIES + 1
+
+
+def test_llm_call_returns_within_the_request_budget_against_a_hanging_upstream(monkeypatch):
+    import httpx
+    import openai
+    from strands import deadline, resilience, utils
+
+    async def hanging(request):
+        await asyncio.sleep(10)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.setattr(utils, "_async_clients", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(openai, "DefaultAsyncHttpxClient",
+                        lambda **kwargs: httpx.AsyncClient(transport=httpx.MockTransport(hanging)))
+    resilience.reset_callers()
+
+    async def call():
+        deadline.set_deadline(2)
+        return await resilience.achat_completion("phase0", model="gpt-3.5-turbo", messages=[], timeout=30)
+
+    started = time.monotonic()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            asyncio.run(call())
+    finally:
+        resilience.reset_callers()
+    assert time.monotonic() - started < 2
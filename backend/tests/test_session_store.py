@@ -0,0 +1,70 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from models import Reaction, SessionState
+from session_store import (
+    DynamoDBSessionStore,
+    InMemorySessionStore,
+    SQLiteSessionStore,
+    create_session_store,
+    merge_reactions,
+)
+
+
+def exercise(store):
+    async def scenario():
+        await store.put(SessionState(session_id="s1", topic="moving cities"))
+
+        def add(excitement):
+            def mutate(state):
+                state.reactions = merge_reactions(
+                    state.reactions, [Reaction(scenario_id=f"r{excitement}", excitement=excitement, anxiety=1)]
+                )
+            return mutate
+
+        await asyncio.gather(*(store.update("s1", add(i)) for i in range(5)))
+        assert await store.update("missing", add(1)) is None
+        return await store.get("s1")
+
+    state = asyncio.run(scenario())
+    assert state.topic == "moving cities"
+    assert sorted(r.excitement for r in state.reactions) == [0, 1, 2, 3, 4]
+
+
+def test_memory_store_evicts_least_recent():
+    store = InMemorySessionStore(max_sessions=2)
+    exercise(store)
+
+    async def fill():
+        for sid in ("a", "b"):
+            await store.put(SessionState(session_id=sid))
+        return await store.get("s1")
+
+    assert asyncio.run(fill()) is None
+
+
+def test_sqlite_store(tmp_path):
+    exercise(SQLiteSessionStore(str(tmp_path / "sessions.db")))
+
+
+def test_dynamodb_store(monkeypatch):
+    moto = pytest.importorskip("moto")
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "test")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "test")
+    with moto.mock_aws():
+        store = DynamoDBSessionStore("sessions", region_name="us-east-1")
+        store.create_table()
+        exercise(store)
+
+
+def test_factory_refuses_a_per_task_default_on_ecs(monkeypatch):
+    monkeypatch.delenv("SESSION_STORE", raising=False)
+    monkeypatch.setenv("ECS_CONTAINER_METADATA_URI_V4", "http://169.254.170.2/v4/task")
+    with pytest.raises(RuntimeError, match="SESSION_STORE"):
+        create_session_store()
+    monkeypatch.setenv("SESSION_STORE", "memory")
+    assert isinstance(create_session_store(), InMemorySessionStore)
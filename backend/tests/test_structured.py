@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pytest
+
+from models import FactorCategory
+from strands.phase1 import PreferenceDetailAgent
+from strands.phase2 import ScenarioBuilderAgent
+from strands.structured import StructuredOutputError, extract_json, parse_items, parse_stats
+
+
+def test_extract_json_ignores_fences_and_chatter():
+    text = 'Sure! Here you go:\n```json\n{"factors": []}\n```\nLet me know if you need more.'
+    assert extract_json(text) == {"factors": []}
+    assert extract_json('{"a": 1} trailing words') == {"a": 1}
+
+
+def test_truncated_reply_keeps_complete_scenarios():
+    text = ('{"scenarios": [{"id": "a", "title": "One", "text": "First"}, '
+            '{"id": "b", "title": "Two", "text": "Sec')
+    scenarios = ScenarioBuilderAgent()._parse_scenarios(text)
+    assert [s.id for s in scenarios] == ["a"]
+    assert parse_stats()["phase2"]["salvaged"] >= 1
+
+
+def test_invalid_elements_are_dropped_individually():
+    text = '{"factors": [{"category": "Money", "items": ["Salary"]}, {"category": "Broken"}]}'
+    factors = parse_items(text, "factors", FactorCategory.model_validate, name="test")
+    assert [f.category for f in factors] == ["Money"]
+    assert parse_stats()["test"]["items_dropped"] == 1
+
+    with pytest.raises(StructuredOutputError):
+        parse_items("I cannot help with that.", "factors", FactorCategory.model_validate, name="test")
+    assert parse_stats()["test"]["failed"] == 1
+
+
+def test_phase1_accepts_object_and_bare_array_replies():
+    agent = PreferenceDetailAgent()
+    wrapped = agent._parse_preferences('{"preferences": [{"factor": "Salary", "importance": 9}]}')
+    bare = agent._parse_preferences('[{"factor": "Salary"}]')
+    assert wrapped[0].importance == 9
+    assert bare[0].importance == 5
@@ -0,0 +1,100 @@
+import asyncio
+import inspect
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import pytest
+from fastapi.testclient import TestClient
+
+from strands import tracing
+
+
+def test_traced_preserves_sync_and_async_functions():
+    @tracing.traced("test.sync", phase="test")
+    def double(x):
+        return 2 * x
+
+    @tracing.traced("test.async", phase="test")
+    async def triple(x):
+        return 3 * x
+
+    assert double(2) == 4 and double.__name__ == "double"
+    assert asyncio.run(triple(2)) == 6 and inspect.iscoroutinefunction(triple)
+
+
+def test_fallback_reason_names_the_error_being_handled(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    assert tracing.fallback_reason() == "llm_unavailable"
+    try:
+        raise TimeoutError
+    except TimeoutError:
+        assert tracing.fallback_reason() == "TimeoutError"
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    assert tracing.fallback_reason() == "llm_incomplete"
+    assert tracing.fallback_reason(ValueError("bad reply")) == "ValueError"
+
+
+def test_configure_without_exporter_records_nothing():
+    assert tracing.configure_tracing("") is False
+    with tracing.span("test.noop", phase="test", model=None) as span:
+        span.set_attribute("key", "value")
+    tracing.set_attributes(ignored=True)
+
+
+@pytest.fixture
+def span_exporter():
+    """Record finished spans in memory; the global provider can be installed only once."""
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry import trace
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    global _EXPORTER
+    if "_EXPORTER" not in globals():
+        _EXPORTER = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(_EXPORTER))
+        trace.set_tracer_provider(provider)
+    _EXPORTER.clear()
+    return _EXPORTER
+
+
+def test_request_spans_nest_agent_and_fallback_spans(monkeypatch, span_exporter):
+    from api import app
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    assert TestClient(app).post("/phase0/factors", json={"topic": "choosing a job"}).status_code == 200
+    spans = {span.name: span for span in span_exporter.get_finished_spans()
+             if span.instrumentation_scope.name == "feelforward"}
+    root = spans["POST /phase0/factors"]
+    assert root.attributes["http.status_code"] == 200
+    assert len({span.context.trace_id for span in span_exporter.get_finished_spans()}) == 1
+    assert spans["rate_limit"].attributes["rate_limit.allowed"] is True
+    assert spans["phase0.run"].context.trace_id == root.context.trace_id
+    fallback = spans["phase0.fallback"]
+    assert fallback.parent.span_id == spans["phase0.run"].context.span_id
+    assert fallback.attributes["fallback.reason"] == "llm_unavailable"
+
+
+def test_fallback_spans_name_the_llm_error_after_leaving_except(fake_llm, span_exporter):
+    from models import Preference
+    from strands.phase0 import FactorDiscoveryAgent
+    from strands.phase2 import ScenarioBuilderAgent
+
+    def fail(**kwargs):
+        raise TimeoutError
+
+    fake_llm.respond = fail
+
+    async def stream():
+        return [s async for s in ScenarioBuilderAgent().astream([Preference(factor="Salary", importance=8)], "x")]
+
+    asyncio.run(FactorDiscoveryAgent().arun("choosing a job"))
+    asyncio.run(stream())
+    reasons = {span.name: span.attributes["fallback.reason"] for span in span_exporter.get_finished_spans()
+               if span.name.endswith(".fallback")}
+    assert reasons == {"phase0.fallback": "TimeoutError", "phase2.fallback": "TimeoutError"}